@@ -0,0 +1,446 @@
+"""Benchmarks for the ICOtest command line tool"""
+
+# -- Imports ------------------------------------------------------------------
+
+from __future__ import annotations
+
+from collections.abc import Iterable, Sequence
+from contextlib import redirect_stderr, redirect_stdout
+from csv import DictWriter
+from io import StringIO
+from itertools import product
+from logging import getLogger
+from pathlib import Path
+from statistics import median
+from subprocess import DEVNULL, run
+from sys import executable
+from time import perf_counter
+from typing import Any, NamedTuple
+
+from icotronic.can import SensorNode, StreamingConfiguration
+from icotronic.can.adc import ADCConfiguration
+from pytest import main as pytest_main
+
+from icotest.test.support.analysis import Conversion, analyze
+from icotest.test.support.sensor_node import read_streaming_data
+
+# -- Attributes ---------------------------------------------------------------
+
+STARTUP_ARGUMENTS = ["-q", "--collect-only", "--pyargs", "icotest.test"]
+"""Pytest arguments used to measure the startup time of a test run"""
+
+CHANNELS = ("first", "second", "third")
+"""Names of the measurement channels of a sensor node"""
+
+# -- Classes ------------------------------------------------------------------
+
+
+class StartupBenchmark(NamedTuple):
+    """Startup times of pytest in a separate and the current process
+
+    Attributes:
+
+        subprocess:
+            The startup times in seconds for pytest running in a new process
+
+        in_process:
+            The startup times in seconds for pytest running in the current
+            process
+
+    Examples:
+
+        Show the string representation of some example startup times
+
+        >>> StartupBenchmark(subprocess=[1.5, 1.25, 1.0],
+        ...                  in_process=[0.75, 0.25, 0.125])
+        Subprocess: 1.250 s (first: 1.500 s)
+        In-process: 0.250 s (first: 0.750 s)
+        Speedup:    5.00x
+
+    """
+
+    subprocess: list[float]
+    in_process: list[float]
+
+    def __repr__(self) -> str:
+        """Get the textual representation of the benchmark results
+
+        Returns:
+
+            A string containing the median and first startup time of both
+            execution modes
+
+        """
+
+        subprocess = median(self.subprocess)
+        in_process = median(self.in_process)
+        return "\n".join([
+            (
+                f"Subprocess: {subprocess:.3f} s "
+                f"(first: {self.subprocess[0]:.3f} s)"
+            ),
+            (
+                f"In-process: {in_process:.3f} s "
+                f"(first: {self.in_process[0]:.3f} s)"
+            ),
+            f"Speedup:    {subprocess / in_process:.2f}x",
+        ])
+
+
+class ADCResult(NamedTuple):
+    """Throughput and noise of a data stream for one ADC configuration
+
+    Attributes:
+
+        firmware:
+            The firmware version of the sensor node
+
+        adc:
+            The ADC configuration used to collect the data
+
+        expected_rate:
+            The sample rate (per channel) of the ADC configuration in values
+            per second
+
+        sample_rate:
+            The effective sample rate (per channel) of the received data in
+            values per second
+
+        loss:
+            The ratio of lost streaming messages
+
+        noise:
+            The ratio of noise to maximum value in dB for every channel
+
+    """
+
+    firmware: str
+    adc: ADCConfiguration
+    expected_rate: float
+    sample_rate: float
+    loss: float
+    noise: tuple[float, ...]
+
+    def row(self) -> dict[str, Any]:
+        """Get the result as row of a table
+
+        Returns:
+
+            A dictionary that maps column names to values
+
+        Examples:
+
+            Get the table row of an example result
+
+            >>> ADCResult(firmware="3.0.0",
+            ...           adc=ADCConfiguration(prescaler=2,
+            ...                                acquisition_time=8,
+            ...                                oversampling_rate=64),
+            ...           expected_rate=9523.8, sample_rate=9400.25,
+            ...           loss=0.0125, noise=(-70.5,)).row()
+            ... # doctest: +NORMALIZE_WHITESPACE
+            {'firmware': '3.0.0', 'prescaler': 2, 'acquisition time': 8,
+             'oversampling rate': 64, 'reference voltage': 3.3,
+             'expected rate': 9524, 'sample rate': 9400, 'loss': '1.25 %',
+             'noise first': '-70.5 dB'}
+
+        """
+
+        return {
+            "firmware": self.firmware,
+            "prescaler": self.adc.prescaler,
+            "acquisition time": self.adc.acquisition_time,
+            "oversampling rate": self.adc.oversampling_rate,
+            "reference voltage": self.adc.reference_voltage,
+            "expected rate": round(self.expected_rate),
+            "sample rate": round(self.sample_rate),
+            "loss": f"{self.loss * 100:.2f} %",
+            **{
+                f"noise {channel}": f"{noise:.1f} dB"
+                for channel, noise in zip(CHANNELS, self.noise)
+            },
+        }
+
+
+class ADCSweep(NamedTuple):
+    """Results of a sweep over multiple ADC configurations
+
+    Attributes:
+
+        results:
+            The result of every ADC configuration
+
+    Examples:
+
+        Show an example sweep as table
+
+        >>> adc = ADCConfiguration(prescaler=2, acquisition_time=8,
+        ...                        oversampling_rate=64)
+        >>> ADCSweep([
+        ...     ADCResult("3.0.0", adc, 9523.8, 9523.8, 0, (-70.5,)),
+        ...     ADCResult("3.0.0", adc, 9523.8, 9400.2, 0.0125, (-70.25,)),
+        ... ]) # doctest: +NORMALIZE_WHITESPACE +ELLIPSIS
+        firmware | prescaler | acquisition time | oversampling rate | ...
+        -------- | --------- | ---------------- | ----------------- | ...
+        3.0.0    | 2         | 8                | 64                | ...
+        3.0.0    | 2         | 8                | 64                | ...
+
+    """
+
+    results: list[ADCResult]
+
+    def __repr__(self) -> str:
+        """Get the results as textual table
+
+        Returns:
+
+            A table that contains one row per ADC configuration
+
+        """
+
+        rows = [result.row() for result in self.results]
+        if not rows:
+            return "No results"
+
+        columns = list(rows[0])
+        widths = [
+            max(len(column), *(len(str(row[column])) for row in rows))
+            for column in columns
+        ]
+        lines = [
+            " | ".join(
+                str(value).ljust(width) for value, width in zip(line, widths)
+            ).rstrip()
+            for line in [columns, ["-" * width for width in widths]] + [
+                [row[column] for column in columns] for row in rows
+            ]
+        ]
+        return "\n".join(lines)
+
+    def save(self, filepath: Path) -> None:
+        """Append the results to a CSV file
+
+        The method only writes the header, if the file does not exist yet.
+        This way the file can collect the results of multiple sweeps (e.g.
+        for different firmware versions).
+
+        Args:
+
+            filepath:
+
+                The location of the CSV file
+
+        """
+
+        rows = [result.row() for result in self.results]
+        if not rows:
+            return
+
+        header = not filepath.exists()
+        with filepath.open("a", encoding="utf-8", newline="") as file:
+            writer = DictWriter(file, fieldnames=list(rows[0]))
+            if header:
+                writer.writeheader()
+            writer.writerows(rows)
+
+
+# -- Functions ----------------------------------------------------------------
+
+
+def startup_subprocess() -> float:
+    """Measure the time it takes to collect the tests in a new process
+
+    Returns:
+
+        The runtime of the pytest process in seconds
+
+    """
+
+    start = perf_counter()
+    run(
+        [executable, "-m", "pytest"] + STARTUP_ARGUMENTS,
+        check=True,
+        stdout=DEVNULL,
+        stderr=DEVNULL,
+    )
+    return perf_counter() - start
+
+
+def startup_in_process() -> float:
+    """Measure the time it takes to collect the tests in the current process
+
+    Returns:
+
+        The runtime of pytest in seconds
+
+    """
+
+    output = StringIO()
+    start = perf_counter()
+    with redirect_stdout(output), redirect_stderr(output):
+        pytest_main(STARTUP_ARGUMENTS)
+    return perf_counter() - start
+
+
+def benchmark_startup(repetitions: int = 5) -> StartupBenchmark:
+    """Compare the startup time of pytest in a new and the current process
+
+    The benchmark only collects the tests, which means it measures the time
+    until the first test would start.
+
+    Args:
+
+        repetitions:
+
+            The number of measurements for each execution mode
+
+    Returns:
+
+        The startup times of both execution modes
+
+    """
+
+    return StartupBenchmark(
+        subprocess=[startup_subprocess() for _ in range(repetitions)],
+        in_process=[startup_in_process() for _ in range(repetitions)],
+    )
+
+
+def adc_configurations(
+    prescalers: Iterable[int],
+    acquisition_times: Iterable[int],
+    oversampling_rates: Iterable[int],
+    reference_voltages: Iterable[float],
+) -> list[ADCConfiguration]:
+    """Create all combinations of the given ADC configuration values
+
+    Args:
+
+        prescalers:
+
+            The ADC prescaler values
+
+        acquisition_times:
+
+            The acquisition times
+
+        oversampling_rates:
+
+            The oversampling rates
+
+        reference_voltages:
+
+            The reference voltages in Volt
+
+    Returns:
+
+        A list containing one ADC configuration for every combination
+
+    Examples:
+
+        Create a grid of four ADC configurations
+
+        >>> [round(adc.sample_rate()) for adc in adc_configurations(
+        ...     [2, 8], [8], [32, 64], [3.3])]
+        [19048, 9524, 6349, 3175]
+
+    """
+
+    return [
+        ADCConfiguration(
+            prescaler=prescaler,
+            acquisition_time=acquisition_time,
+            oversampling_rate=oversampling_rate,
+            reference_voltage=reference_voltage,
+        )
+        for (
+            prescaler,
+            acquisition_time,
+            oversampling_rate,
+            reference_voltage,
+        ) in product(
+            prescalers,
+            acquisition_times,
+            oversampling_rates,
+            reference_voltages,
+        )
+    ]
+
+
+async def sweep_adc(
+    node: SensorNode,
+    configurations: Sequence[ADCConfiguration],
+    channels: int = 1,
+    messages: int = 1000,
+) -> ADCSweep:
+    """Measure throughput, message loss and noise for ADC configurations
+
+    Args:
+
+        node:
+
+            The (connected or simulated) sensor node
+
+        configurations:
+
+            The ADC configurations that should be measured
+
+        channels:
+
+            The number of enabled measurement channels (starting with the
+            first channel)
+
+        messages:
+
+            The number of streaming messages collected for every
+            configuration
+
+    Returns:
+
+        The results of all ADC configurations
+
+    Examples:
+
+        Import required library code
+
+        >>> from asyncio import run
+        >>> from icotest.test.support.simulation import SimulatedNode
+
+        Sweep the oversampling rate of a simulated sensor node
+
+        >>> sweep = run(sweep_adc(SimulatedNode(maximum_rate=5000),
+        ...                       adc_configurations([2], [8], [32, 128],
+        ...                                          [3.3])))
+        >>> [round(result.loss, 1) for result in sweep.results]
+        [0.7, 0.0]
+        >>> [round(result.noise[0]) for result in sweep.results]
+        [-67, -73]
+
+    """
+
+    logger = getLogger(__name__)
+    firmware = str(await node.get_firmware_version())
+    streaming = StreamingConfiguration(
+        **{channel: index < channels for index, channel in enumerate(CHANNELS)}
+    )
+
+    results = []
+    for adc in configurations:
+        await node.set_adc_configuration(**adc)
+        collector = await read_streaming_data(node, streaming, length=messages)
+        integrity = collector.integrity()
+        statistics = analyze(
+            collector.values, [Conversion(0, 1)] * len(collector.channels)
+        )
+        result = ADCResult(
+            firmware=firmware,
+            adc=adc,
+            expected_rate=adc.sample_rate() / len(collector.channels),
+            sample_rate=integrity.sample_rate,
+            loss=integrity.loss,
+            noise=tuple(channel.noise_ratio for channel in statistics),
+        )
+        logger.info("ADC sweep: %s", result.row())
+        results.append(result)
+
+    return ADCSweep(results)
@@ -5,87 +5,1054 @@ See: https://community.silabs.com/s/article/simplicity-commander
 for more information
 """
 
+# pylint: disable=too-many-lines
+
 # -- Imports ------------------------------------------------------------------
 
-from logging import getLogger
-from os import environ, pathsep
-from pathlib import Path
-from platform import system
-from re import compile as re_compile
-from subprocess import CalledProcessError, run
-from sys import byteorder
-from typing import Sequence
+from __future__ import annotations
+
+from asyncio import CancelledError, create_subprocess_exec, wait_for
+from asyncio.subprocess import PIPE, Process
+from functools import cache
+from hashlib import sha256
+from json import dumps, loads
+from logging import getLogger
+from os import environ, pathsep
+from pathlib import Path
+from platform import system
+from re import IGNORECASE, MULTILINE, compile as re_compile
+from shutil import which
+from subprocess import CalledProcessError, SubprocessError, run
+from sys import byteorder
+from typing import AsyncIterator, NamedTuple, Sequence
+
+from platformdirs import user_cache_dir
+
+from icotest.config import settings, ConfigurationUtility
+
+# -- Functions ----------------------------------------------------------------
+
+
+def firmware_digest(filepaths: Sequence[str | Path]) -> str:
+    """Calculate a digest that identifies a sequence of firmware images
+
+    Args:
+
+        filepaths:
+
+            A sequence of filepaths that contains firmware images
+
+    Returns:
+
+        The hexadecimal SHA-256 digest of the content of all images
+
+    Examples:
+
+        Import required library code
+
+        >>> from tempfile import TemporaryDirectory
+
+        Calculate the digest of some example images
+
+        >>> with TemporaryDirectory() as directory:
+        ...     first = Path(directory) / "first.hex"
+        ...     second = Path(directory) / "second.hex"
+        ...     _ = first.write_text("first")
+        ...     _ = second.write_text("second")
+        ...     digest = firmware_digest([first, second])
+        ...     digest_reversed = firmware_digest([second, first])
+        >>> len(digest)
+        64
+        >>> digest == digest_reversed
+        False
+
+    """
+
+    digest = sha256()
+    for filepath in filepaths:
+        digest.update(Path(filepath).read_bytes())
+
+    return digest.hexdigest()
+
+
+@cache
+def commander_executable() -> str:
+    """Get the path of the Simplicity Commander executable (``commander``)
+
+    The function searches ``PATH`` and the locations specified below
+    ``COMMANDS`` → ``PATH`` in the configuration. Since the result is cached,
+    the search only happens once per process.
+
+    Returns:
+
+        The absolute path of the Simplicity Commander executable
+
+    Raises:
+
+        CommanderException:
+
+            If the executable could not be found
+
+    Examples:
+
+        Import required library code
+
+        >>> from subprocess import run
+
+        Check that running the found executable works
+
+        >>> result = run([commander_executable(), "--version"],
+        ...              capture_output=True)
+        >>> result.returncode == 0
+        True
+
+    """
+
+    path = settings.commands.path
+    operating_system = system()
+    paths = (
+        path.linux
+        if operating_system == "Linux"
+        else path.mac if operating_system == "Darwin" else path.windows
+    )
+
+    search_path = pathsep.join([environ.get("PATH", ""), *paths])
+    executable = which("commander", path=search_path)
+    if executable is None:
+        raise CommanderException(
+            "Unable to find Simplicity Commander executable “commander”. "
+            "Please install Simplicity Commander and add its location to "
+            "“PATH” or the configuration value COMMANDS → PATH."
+        )
+
+    return str(Path(executable).resolve())
+
+
+def parse_commander_version(output: str) -> CommanderInfo:
+    """Get version information from the output of ``commander --version``
+
+    Args:
+
+        output:
+
+            The standard output of the command ``commander --version``
+
+    Returns:
+
+        The version information of Simplicity Commander (without executable)
+
+    Raises:
+
+        CommanderException:
+
+            If the output does not contain the version of Simplicity Commander
+
+    Examples:
+
+        Parse some example output
+
+        >>> info = parse_commander_version('''Simplicity Commander 1v16p8b1461
+        ...
+        ... JLink DLL version: 7.94e
+        ... Qt 5.12.10 Copyright (C) 2017 The Qt Company Ltd.
+        ... EMDLL Version: 0v18p9b808
+        ... mbed TLS version: 2.16.6
+        ...
+        ... DONE''')
+        >>> info.version
+        '1v16p8b1461'
+        >>> info.components # doctest:+NORMALIZE_WHITESPACE
+        {'JLink DLL': '7.94e', 'EMDLL': '0v18p9b808', 'mbed TLS': '2.16.6'}
+
+        Parsing output without version information fails
+
+        >>> parse_commander_version("ERROR: Unknown command"
+        ...    ) # doctest: +IGNORE_EXCEPTION_DETAIL
+        Traceback (most recent call last):
+           ...
+        CommanderException: Unable to determine version of Simplicity \
+Commander from output: “ERROR: Unknown command”
+
+    """
+
+    version_match = COMMANDER_VERSION_REGEX.search(output)
+    if version_match is None:
+        raise CommanderException(
+            "Unable to determine version of Simplicity Commander from "
+            f"output: “{output.strip()}”"
+        )
+
+    components = {
+        match["name"]: match["version"]
+        for match in COMPONENT_VERSION_REGEX.finditer(output)
+    }
+
+    return CommanderInfo(
+        executable="", version=version_match["version"], components=components
+    )
+
+
+@cache
+def commander_info() -> CommanderInfo:
+    """Get information about the Simplicity Commander executable
+
+    Since ``commander --version`` takes quite some time, this function stores
+    the result in the user cache directory. The cached value will be used
+    as long as the modification time and size of the executable do not
+    change.
+
+    Returns:
+
+        The location and version information of Simplicity Commander
+
+    Raises:
+
+        CommanderException:
+
+            If the executable could not be found or the version check failed
+
+    """
+
+    executable = commander_executable()
+    status = Path(executable).stat()
+    key = {
+        "executable": executable,
+        "modified": status.st_mtime_ns,
+        "size": status.st_size,
+    }
+
+    cache_filepath = (
+        Path(
+            user_cache_dir(
+                ConfigurationUtility.app_name,
+                appauthor=ConfigurationUtility.app_author,
+            )
+        )
+        / "commander.json"
+    )
+
+    logger = getLogger(__name__)
+    try:
+        cached = loads(cache_filepath.read_text(encoding="utf-8"))
+        if cached["key"] == key:
+            logger.debug("Using cached Simplicity Commander information")
+            return CommanderInfo(
+                executable=executable,
+                version=cached["version"],
+                components=cached["components"],
+            )
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    try:
+        result = run(
+            [executable, "--version"],
+            capture_output=True,
+            check=False,
+            timeout=60,
+        )
+    except (OSError, SubprocessError) as error:
+        raise CommanderException(
+            f"Unable to execute Simplicity Commander: {error}"
+        ) from error
+
+    info = parse_commander_version(
+        result.stdout.decode(errors="replace")
+    )._replace(executable=executable)
+
+    try:
+        cache_filepath.parent.mkdir(parents=True, exist_ok=True)
+        cache_filepath.write_text(
+            dumps({
+                "key": key,
+                "version": info.version,
+                "components": info.components,
+            }),
+            encoding="utf-8",
+        )
+    except OSError as error:
+        logger.warning(
+            "Unable to store Simplicity Commander information: %s", error
+        )
+
+    return info
+
+
+# -- Classes ------------------------------------------------------------------
+
+
+class CommanderException(Exception):
+    """Describes problems regarding the execution of Simplicity Commander"""
+
+
+class CommanderReturnCodeException(CommanderException):
+    """A Simplicity Commander command did not return the success status code
+
+    Args:
+
+        message:
+            A description of the failed command
+
+        error_reasons:
+            Keys of ``Commander.error_reasons`` that describe why the command
+            might have failed
+
+    """
+
+    def __init__(
+        self, message: str, error_reasons: Sequence[str] = ()
+    ) -> None:
+
+        super().__init__(message)
+        self.error_reasons = list(error_reasons)
+
+
+class CommanderOutputMatchException(CommanderException):
+    """The Simplicity Commander output did not contain an expected value"""
+
+
+class CommanderTimeoutException(CommanderException):
+    """A Simplicity Commander command did not finish in time"""
+
+
+class CommanderInfo(NamedTuple):
+    """Information about the installed version of Simplicity Commander
+
+    Attributes:
+
+        executable:
+            The absolute path of the Simplicity Commander executable
+
+        version:
+            The version of Simplicity Commander e.g. “1v16p8b1461”
+
+        components:
+            The versions of the components used by Simplicity Commander
+            e.g. the J-Link DLL
+
+    """
+
+    executable: str
+    version: str
+    components: dict[str, str]
+
+
+# pylint: disable=too-few-public-methods
+
+
+class BaseCommander:
+    """Shared functionality of the Simplicity Commander wrappers
+
+    Args:
+
+        serial_number:
+
+            The serial number of the debug adapter (programming board) that
+            should be used by Simplicity Commander. If you do not specify a
+            serial number, then Simplicity Commander uses the (only) connected
+            debug adapter.
+
+    """
+
+    def __init__(self, serial_number: str | None = None):
+
+        self.serial_number = serial_number
+        self.logger = getLogger(
+            __name__
+            if serial_number is None
+            else f"{__name__}.{serial_number}"
+        )
+
+        self.error_reasons = {
+            "programmer not connected": (
+                "Programming board is not connected to computer"
+            ),
+            "device not connected": (
+                "Programming board is not connected to device"
+            ),
+        }
+
+    def _command_arguments(self, command: list[str]) -> list[str]:
+        """Get the arguments for a Simplicity Commander command
+
+        Args:
+
+            command:
+
+                The Simplicity Commander subcommand including all necessary
+                arguments
+
+        Returns:
+
+            The arguments that execute the given subcommand using the
+            selected debug adapter
+
+        Examples:
+
+            Get the arguments for the default and a specific debug adapter
+
+            >>> Commander()._command_arguments(["adapter", "dbgmode", "OUT"])
+            ['adapter', 'dbgmode', 'OUT']
+
+            >>> Commander("440123456")._command_arguments(["device", "info"])
+            ['device', 'info', '--serialno', '440123456']
+
+        """
+
+        serial_number = self.serial_number
+        return command + (
+            [] if serial_number is None else ["--serialno", serial_number]
+        )
+
+    def _command_line(self, command: list[str]) -> list[str]:
+        """Get the full command line for a Simplicity Commander command
+
+        Args:
+
+            command:
+
+                The Simplicity Commander subcommand including all necessary
+                arguments
+
+        Returns:
+
+            The command line (including the path to the executable) that
+            executes the given subcommand using the selected debug adapter
+
+        """
+
+        return [commander_executable()] + self._command_arguments(command)
+
+    def _check_possible_error_reasons(
+        self, possible_error_reasons: list[str] | None
+    ) -> None:
+        """Check that the given error reasons are known
+
+        Args:
+
+            possible_error_reasons:
+                A list of dictionary keys that describe why a command might
+                have failed
+
+        Raises:
+
+            ValueError:
+
+                If ``possible_error_reasons`` is not contained in the
+                list of possible error reasons
+
+        Examples:
+
+            Check some error reasons
+
+            >>> commander = Commander()
+            >>> commander._check_possible_error_reasons(
+            ...     ["programmer not connected"])
+            >>> commander._check_possible_error_reasons(["nope"])
+            Traceback (most recent call last):
+               ...
+            ValueError: “nope” is not a valid possible error reason
+
+        """
+
+        if possible_error_reasons:
+            for reason in possible_error_reasons:
+                if reason not in self.error_reasons:
+                    raise ValueError(
+                        f"“{reason}” is not a valid possible error reason"
+                    )
+
+    def _return_code_message(
+        self,
+        description: str,
+        returncode: int,
+        output: Sequence[str],
+        possible_error_reasons: list[str] | None = None,
+    ) -> str:
+        """Describe an unsuccessful Commander command
+
+        Args:
+
+            description:
+                A textual description of the purpose of the command
+
+            returncode:
+                The (unconverted) return code of the command
+
+            output:
+                The standard output and standard error of the command
+
+            possible_error_reasons:
+                A list of dictionary keys that describe why the command might
+                have failed
+
+        Returns:
+
+            An error message that describes the failed command
+
+        Examples:
+
+            Describe a failed command
+
+            >>> commander = Commander()
+            >>> print(commander._return_code_message(
+            ...     "enable debug mode", 1, ("", "No adapter"),
+            ...     ["programmer not connected"]))
+            Execution of Simplicity Commander command to enable debug mode \
+failed with return code “1”
+            <BLANKLINE>
+            Simplicity Commander output:
+            <BLANKLINE>
+            <BLANKLINE>
+            No adapter
+            <BLANKLINE>
+            Possible error reasons:
+            <BLANKLINE>
+            • Programming board is not connected to computer
+
+        """
+
+        # Since Windows seems to return the exit code as unsigned number we
+        # need to convert it first to the “real” signed number.
+        if system() == "Windows":
+            returncode = int.from_bytes(
+                returncode.to_bytes(4, byteorder),
+                byteorder,
+                signed=True,
+            )
+        error_message = (
+            "Execution of Simplicity Commander command to "
+            f"{description} failed with return code "
+            f"“{returncode}”"
+        )
+        combined_output = "\n".join(output) if any(output) else ""
+        if combined_output:
+            error_message += (
+                "\n\nSimplicity Commander output:\n\n"
+                f"{combined_output.rstrip()}"
+            )
+
+        if possible_error_reasons:
+            error_reasons = "\n".join([
+                f"• {self.error_reasons[reason]}"
+                for reason in possible_error_reasons
+            ])
+            error_message += f"\n\nPossible error reasons:\n\n{error_reasons}"
+
+        return error_message
+
+    @staticmethod
+    def _check_output(
+        output: str, description: str, regex_output: str | None
+    ) -> None:
+        """Check that the output of a Commander command matches a regex
+
+        Args:
+
+            output:
+                The standard output of the command
+
+            description:
+                A textual description of the purpose of the command
+
+            regex_output:
+                An optional regular expression that has to match part of the
+                standard output of the command
+
+        Raises:
+
+            CommanderOutputMatchException:
+
+                If the standard output did not match the optional regular
+                expression specified in ``regex_output``
+
+        """
+
+        if (
+            regex_output is not None
+            and re_compile(regex_output).search(output) is None
+        ):
+            error_message = (
+                "Output of Simplicity Commander command to "
+                f"{description}:\n{output}\n"
+                "did not match the expected regular expression "
+                f"“{regex_output}”"
+            )
+            raise CommanderOutputMatchException(error_message)
+
+    @staticmethod
+    def _firmware_file_error(filepaths: Sequence[str | Path]) -> str | None:
+        """Check that the given firmware images exist
+
+        Args:
+
+            filepaths:
+
+                A sequence of filepaths that contains firmware images
+
+        Returns:
+
+            A description of the first invalid firmware image or ``None``,
+            if all firmware images exist
+
+        Examples:
+
+            Check a non existent file
+
+            >>> Commander._firmware_file_error(["nothing here"])
+            'Firmware file “nothing here” does not exist'
+
+        """
+
+        for filepath in filepaths:
+            firmware_filepath = Path(filepath)
+
+            if not firmware_filepath.exists():
+                return f"Firmware file “{filepath}” does not exist"
+
+            if not firmware_filepath.is_file():
+                return f"“{filepath}” is not a file"
+
+        return None
+
+    @staticmethod
+    def _verify_command(chip: str, filepath: str | Path) -> list[str]:
+        """Get the Commander command to compare flash content with an image
+
+        Args:
+
+            chip:
+
+                The identifier of the chip on the PCB e.g. “BGM121A256V2”
+
+            filepath:
+
+                The filepath of the firmware image
+
+        Returns:
+
+            The Simplicity Commander subcommand to verify the flash content
+
+        Examples:
+
+            Get the command to verify the flash content of an STU
+
+            >>> Commander._verify_command("BGM111A256V2", "stu.hex")
+            ['verify', 'stu.hex', '-d', 'BGM111A256V2']
+
+        """
+
+        return ["verify", f"{filepath}", "-d", f"{chip}"]
+
+    @staticmethod
+    def _power_usage_command(seconds: float) -> list[str]:
+        """Get the Commander command to measure the power usage
+
+        Args:
+
+            seconds:
+
+                The amount of seconds the power usage should be measured for
+
+        Returns:
+
+            The Simplicity Commander subcommand to measure the power usage
+
+        Examples:
+
+            Get the command for a measurement that takes half a second
+
+            >>> Commander._power_usage_command(0.5)
+            ['aem', 'measure', '--windowlength', '500']
+
+        """
+
+        return [
+            "aem",
+            "measure",
+            "--windowlength",
+            str(round(seconds * 1000)),
+        ]
+
+    @staticmethod
+    def _parse_power_usage(output: str) -> float | None:
+        """Extract the power usage from the output of Simplicity Commander
+
+        Args:
+
+            output:
+
+                The output of the command to measure the power usage
+
+        Returns:
+
+            The measured power usage in milliwatts or ``None``, if the output
+            does not contain the power usage
+
+        Examples:
+
+            Parse the power usage of some example output
+
+            >>> Commander._parse_power_usage(
+            ...     "Current [mA] : 9.12345\\nPower   [mW] : 30.48591")
+            30.48591
+
+            >>> Commander._parse_power_usage("Nothing here") is None
+            True
+
+        """
+
+        regex = r"Power\s*\[mW\]\s*:\s*(?P<milliwatts>\d+\.\d+)"
+        pattern_match = re_compile(regex).search(output)
+        if pattern_match is None:
+            return None
+
+        return float(pattern_match["milliwatts"])
+
+    @staticmethod
+    def _parse_power_samples(text: str) -> list[tuple[float, float]]:
+        """Extract power samples from the output of ``commander aem dump``
+
+        Every sample line is expected to contain the sample time in seconds,
+        the current in milliamperes and the voltage in volts. Lines that do
+        not look like a sample (e.g. header lines) are ignored.
+
+        Args:
+
+            text:
+
+                Output of the AEM dump command that contains complete lines
+
+        Returns:
+
+            A list containing the time (in seconds) and the power usage (in
+            milliwatts) of each sample
+
+        Examples:
+
+            Parse some example output
+
+            >>> Commander._parse_power_samples(
+            ...     "Time [s], Current [mA], Voltage [V]\\n"
+            ...     "0.0001, 10.0, 3.3\\n"
+            ...     "0.0002, 20.0, 3.0\\n")
+            [(0.0001, 33.0), (0.0002, 60.0)]
+
+        """
+
+        return [
+            (float(time), float(current) * float(voltage))
+            for time, current, voltage in POWER_SAMPLE_REGEX.findall(text)
+        ]
+
+
+# pylint: enable=too-few-public-methods
+
+
+class Commander(BaseCommander):
+    """Wrapper for the Simplicity Commander commandline tool"""
+
+    def _run_command(
+        self,
+        command: list[str],
+        description: str,
+        possible_error_reasons: list[str] | None = None,
+        regex_output: str | None = None,
+    ) -> str:
+        """Run a Simplicity Commander command
+
+        Args:
+
+            command:
+                The Simplicity Commander subcommand including all necessary
+                arguments
+
+            description:
+                A textual description of the purpose of the command
+                e.g. “enable debug mode”
+
+            possible_error_reasons:
+                A list of dictionary keys that describe why the command might
+                have failed
+
+            regex_output:
+                An optional regular expression that has to match part of the
+                standard output of the command
+
+        Raises:
+
+            CommanderReturnCodeException:
+
+                If the command returned unsuccessfully
+
+        Returns:
+
+            The standard output of the command
+
+        """
+
+        self._check_possible_error_reasons(possible_error_reasons)
+
+        try:
+            command_line = self._command_line(command)
+            self.logger.info("Running command: “%s”", " ".join(command_line))
+            result = run(
+                command_line,
+                capture_output=True,
+                check=True,
+                text=True,
+            )
+        except CalledProcessError as error:
+            raise CommanderReturnCodeException(
+                self._return_code_message(
+                    description,
+                    error.returncode,
+                    (error.stdout or "", error.stderr or ""),
+                    possible_error_reasons,
+                ),
+                possible_error_reasons or [],
+            ) from error
+
+        self._check_output(result.stdout, description, regex_output)
+
+        return result.stdout
+
+    def enable_debug_mode(self) -> None:
+        """Enable debug mode for external device
+
+        Examples:
+
+            Import required library code
+
+            >>> from icotronic.config import settings
+
+            Enable debug mode of STH programming board
+
+            >>> commander = Commander()
+            >>> commander.enable_debug_mode()
+
+        """
+
+        error_reasons = ["programmer not connected"]
+        self._run_command(
+            command="adapter dbgmode OUT".split(),
+            description="enable debug mode",
+            possible_error_reasons=error_reasons,
+            regex_output="Setting debug mode to OUT",
+        )
+
+    def unlock_device(self, chip: str) -> None:
+        """Unlock device for debugging
+
+        Warning:
+            Calling this method will erase the flash of the device!
+
+        Args:
+
+            chip:
+
+                The identifier of the chip on the PCB e.g. “BGM121A256V2”
+
+        """
+
+        self._run_command(
+            command="device unlock".split() + ["-d", f"{chip}"],
+            description="unlock device",
+            possible_error_reasons=[
+                "device not connected",
+                "programmer not connected",
+            ],
+            regex_output="Chip successfully unlocked",
+        )
+
+    def verify_flash(self, chip: str, filepath: str | Path) -> bool:
+        """Check if the flash memory of the device contains an image
+
+        Args:
+
+            chip:
+
+                The identifier of the chip on the PCB e.g. “BGM121A256V2”
+
+            filepath:
+
+                The filepath of the firmware image
+
+        Returns:
+
+            ``True``, if the flash memory contains the image or ``False``
+            otherwise
+
+        """
+
+        try:
+            self._run_command(
+                command=self._verify_command(chip, filepath),
+                description="verify firmware",
+            )
+        except CommanderReturnCodeException:
+            return False
+
+        return True
+
+    def upload_flash(
+        self,
+        chip: str,
+        filepaths: Sequence[str | Path],
+        incremental: bool = False,
+    ) -> bool:
+        """Upload code into the flash memory of the device
+
+        Args:
+
+            chip:
+
+                The identifier of the chip on the PCB e.g. “BGM121A256V2”
+
+            filepaths:
+
+                A sequence of filepaths that contains images that should be
+                uploaded to the device in the given order
 
-from icotest.config import settings
+            incremental:
 
-# -- Classes ------------------------------------------------------------------
+                Skip the (time consuming) upload, if the flash memory of the
+                device already contains all of the given images
 
+        Returns:
 
-class CommanderException(Exception):
-    """Describes problems regarding the execution of Simplicity Commander"""
+            ``True``, if the images were uploaded or ``False``, if the upload
+            was skipped, since the device already contains all images
+
+        Raises:
 
+            CommanderException:
 
-class CommanderReturnCodeException(CommanderException):
-    """A Simplicity Commander command did not return the success status code"""
+                If ``filepath`` does not exist or does not point to a valid
+                file
 
+        Examples:
 
-class CommanderOutputMatchException(CommanderException):
-    """The Simplicity Commander output did not contain an expected value"""
+            Trying to upload a non existent file causes an error
+
+            >>> commander = Commander()
+            >>> # We assume the following file does not exist on your machine
+            >>> filepath = "nothing here"
+            >>> commander.upload_flash("BGM121A256V2",
+            ...     [filepath])  # doctest: +IGNORE_EXCEPTION_DETAIL
+            Traceback (most recent call last):
+               ...
+            CommanderException: Firmware file “nothing here” does not exist
 
+            Trying to upload a directory instead of a file results in an error
 
-class Commander:
-    """Wrapper for the Simplicity Commander commandline tool"""
+            >>> commander.upload_flash("BGM121A256V2",
+            ...     [Path.home()]) # doctest: +IGNORE_EXCEPTION_DETAIL
+            Traceback (most recent call last):
+               ...
+            CommanderException: “...” is not a file
 
-    def __init__(self):
+        """
 
-        self._add_path_to_environment()
+        if error_message := self._firmware_file_error(filepaths):
+            raise CommanderException(error_message)
 
-        self.error_reasons = {
-            "programmer not connected": (
-                "Programming board is not connected to computer"
-            ),
-            "device not connected": (
-                "Programming board is not connected to device"
-            ),
-        }
+        # Set debug mode to out, to make sure we flash the STH (connected via
+        # debug cable) and not another microcontroller connected to the
+        # programmer board.
+        self.enable_debug_mode()
+
+        logger = self.logger
+        logger.info("Firmware digest: %s", firmware_digest(filepaths))
+        if incremental and all(
+            self.verify_flash(chip, filepath) for filepath in filepaths
+        ):
+            logger.info("Firmware is up to date, skipping upload")
+            return False
+
+        # Unlock device (triggers flash erase)
+        self.unlock_device(chip)
+
+        for filepath in filepaths:
+            self._run_command(
+                command=[
+                    "flash",
+                    f"{filepath}",
+                    "-d",
+                    f"{chip}",
+                ],
+                description="upload firmware",
+            )
+            logger.info("Uploaded firmware: %s", filepath)
+
+        return True
+
+    def read_power_usage(self, seconds: float = 1) -> float:
+        """Read the power usage of the connected hardware
+
+        Args:
+
+            seconds:
+
+                The amount of seconds the power usage should be measured for
+
+        Returns:
+
+            The measured power usage in milliwatts
+
+        Raises:
 
-    def _add_path_to_environment(self) -> None:
-        """Add path to Simplicity Commander (``commander``) to ``PATH``
+            CommanderOutputMatchException:
 
-        After calling this method you should be able to call ``commander``
-        without its path prefix, if you installed it somewhere in the
-        locations specified below ``COMMANDS`` → ``PATH`` in the configuration.
+                If the function was not able to extract the power usage from
+                the output of Simplicity Commander
 
         Examples:
 
-            Check that adding the commander path to the environment works
+            Import required library code
 
-            >>> commander = Commander()
+            >>> from icotronic.config import settings
+
+            Measure power usage of connected STH
 
-            >>> from subprocess import run
-            >>> result = run("commander --version".split(),
-            ...              capture_output=True)
-            >>> result.returncode == 0
+            >>> commander = Commander()
+            >>> commander.read_power_usage() > 0
             True
 
         """
 
-        path = settings.commands.path
-        operating_system = system()
-        paths = (
-            path.linux
-            if operating_system == "Linux"
-            else path.mac if operating_system == "Darwin" else path.windows
+        output = self._run_command(
+            command=self._power_usage_command(seconds),
+            description="read power usage",
+            possible_error_reasons=["programmer not connected"],
         )
 
-        environ["PATH"] += pathsep + pathsep.join(paths)
+        milliwatts = self._parse_power_usage(output)
+        if milliwatts is None:
+            raise CommanderOutputMatchException(
+                "Unable to extract power usage "
+                "from Simplicity Commander output"
+            )
+
+        return milliwatts
 
-    def _run_command(
+
+class AsyncCommander(BaseCommander):
+    """Asynchronous wrapper for the Simplicity Commander commandline tool
+
+    In contrast to ``Commander`` the methods of this class do not block the
+    event loop while Simplicity Commander is running. This way you can, for
+    example, read the power usage while you communicate with a node via CAN.
+
+    """
+
+    async def _run_command(
         self,
         command: list[str],
         description: str,
         possible_error_reasons: list[str] | None = None,
         regex_output: str | None = None,
+        timeout: float | None = None,
     ) -> str:
         """Run a Simplicity Commander command
 
@@ -107,21 +1074,25 @@ class Commander:
                 An optional regular expression that has to match part of the
                 standard output of the command
 
-        Raises:
-
-            ValueError:
+            timeout:
+                The maximum amount of seconds the command is allowed to run;
+                ``None`` means the command can run for an unlimited amount of
+                time
 
-                If ``possible_error_reasons`` is not contained in the
-                list of possible error reasons
+        Raises:
 
             CommanderReturnCodeException:
 
                 If the command returned unsuccessfully
 
-            CommanderOutputMatchException:
+            CommanderTimeoutException:
 
-                If the standard output did not match the optional regular
-                expression specified in ``regex_output``
+                If the command did not finish in ``timeout`` seconds
+
+            CancelledError:
+
+                If the calling task was cancelled (after the command was
+                stopped)
 
         Returns:
 
@@ -129,101 +1100,97 @@ class Commander:
 
         """
 
-        if possible_error_reasons:
-            for reason in possible_error_reasons:
-                if reason not in self.error_reasons:
-                    raise ValueError(
-                        f"“{reason}” is not a valid possible error reason"
-                    )
+        self._check_possible_error_reasons(possible_error_reasons)
 
+        command_line = self._command_line(command)
+        self.logger.info("Running command: “%s”", " ".join(command_line))
+        process = await create_subprocess_exec(
+            *command_line, stdout=PIPE, stderr=PIPE
+        )
         try:
-            getLogger().info(
-                "Running command: “commander %s”", " ".join(command)
-            )
-            result = run(
-                ["commander"] + command,
-                capture_output=True,
-                check=True,
-                text=True,
-            )
-        except CalledProcessError as error:
-            # Since Windows seems to return the exit code as unsigned number we
-            # need to convert it first to the “real” signed number.
-            returncode = (
-                int.from_bytes(
-                    error.returncode.to_bytes(4, byteorder),
-                    byteorder,
-                    signed=True,
-                )
-                if system() == "Windows"
-                else error.returncode
+            stdout_bytes, stderr_bytes = await wait_for(
+                process.communicate(), timeout
             )
-            error_message = (
+        except TimeoutError as error:
+            await self._stop_process(process)
+            raise CommanderTimeoutException(
                 "Execution of Simplicity Commander command to "
-                f"{description} failed with return code "
-                f"“{returncode}”"
-            )
-            combined_output = (
-                "\n".join((error.stdout, error.stderr))
-                if error.stdout or error.stderr
-                else ""
+                f"{description} did not finish in {timeout} seconds"
+            ) from error
+        except CancelledError:
+            await self._stop_process(process)
+            raise
+
+        stdout = stdout_bytes.decode(errors="replace")
+        stderr = stderr_bytes.decode(errors="replace")
+
+        assert process.returncode is not None
+        if process.returncode != 0:
+            raise CommanderReturnCodeException(
+                self._return_code_message(
+                    description,
+                    process.returncode,
+                    (stdout, stderr),
+                    possible_error_reasons,
+                ),
+                possible_error_reasons or [],
             )
-            if combined_output:
-                error_message += (
-                    "\n\nSimplicity Commander output:\n\n"
-                    f"{combined_output.rstrip()}"
-                )
-
-            if possible_error_reasons:
-                error_reasons = "\n".join([
-                    f"• {self.error_reasons[reason]}"
-                    for reason in possible_error_reasons
-                ])
-                error_message += (
-                    f"\n\nPossible error reasons:\n\n{error_reasons}"
-                )
-
-            raise CommanderReturnCodeException(error_message) from error
 
-        if (
-            regex_output is not None
-            and re_compile(regex_output).search(result.stdout) is None
-        ):
-            error_message = (
-                "Output of Simplicity Commander command to "
-                f"{description}:\n{result.stdout}\n"
-                "did not match the expected regular expression "
-                f"“{regex_output}”"
-            )
-            raise CommanderOutputMatchException(error_message)
+        self._check_output(stdout, description, regex_output)
 
-        return result.stdout
+        return stdout
 
-    def enable_debug_mode(self) -> None:
+    @staticmethod
+    async def _stop_process(process: Process) -> None:
+        """Stop a running Simplicity Commander process
+
+        Args:
+
+            process:
+
+                The process that should be stopped
+
+        """
+
+        if process.returncode is None:
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass  # Process already finished
+        await process.wait()
+
+    async def enable_debug_mode(self, timeout: float | None = 10) -> None:
         """Enable debug mode for external device
 
+        Args:
+
+            timeout:
+
+                The maximum amount of seconds the command is allowed to run
+
         Examples:
 
             Import required library code
 
-            >>> from icotronic.config import settings
+            >>> from asyncio import run
 
             Enable debug mode of STH programming board
 
-            >>> commander = Commander()
-            >>> commander.enable_debug_mode()
+            >>> run(AsyncCommander().enable_debug_mode())
 
         """
 
-        error_reasons = ["programmer not connected"]
-        self._run_command(
+        await self._run_command(
             command="adapter dbgmode OUT".split(),
             description="enable debug mode",
-            possible_error_reasons=error_reasons,
+            possible_error_reasons=["programmer not connected"],
             regex_output="Setting debug mode to OUT",
+            timeout=timeout,
         )
 
-    def unlock_device(self, chip: str) -> None:
+    async def unlock_device(
+        self, chip: str, timeout: float | None = 60
+    ) -> None:
         """Unlock device for debugging
 
         Warning:
@@ -235,9 +1202,13 @@ class Commander:
 
                 The identifier of the chip on the PCB e.g. “BGM121A256V2”
 
+            timeout:
+
+                The maximum amount of seconds the command is allowed to run
+
         """
 
-        self._run_command(
+        await self._run_command(
             command="device unlock".split() + ["-d", f"{chip}"],
             description="unlock device",
             possible_error_reasons=[
@@ -245,9 +1216,53 @@ class Commander:
                 "programmer not connected",
             ],
             regex_output="Chip successfully unlocked",
+            timeout=timeout,
         )
 
-    def upload_flash(self, chip: str, filepaths: Sequence[str | Path]) -> None:
+    async def verify_flash(
+        self, chip: str, filepath: str | Path, timeout: float | None = 60
+    ) -> bool:
+        """Check if the flash memory of the device contains an image
+
+        Args:
+
+            chip:
+
+                The identifier of the chip on the PCB e.g. “BGM121A256V2”
+
+            filepath:
+
+                The filepath of the firmware image
+
+            timeout:
+
+                The maximum amount of seconds the command is allowed to run
+
+        Returns:
+
+            ``True``, if the flash memory contains the image or ``False``
+            otherwise
+
+        """
+
+        try:
+            await self._run_command(
+                command=self._verify_command(chip, filepath),
+                description="verify firmware",
+                timeout=timeout,
+            )
+        except CommanderReturnCodeException:
+            return False
+
+        return True
+
+    async def upload_flash(
+        self,
+        chip: str,
+        filepaths: Sequence[str | Path],
+        timeout: float | None = 120,
+        incremental: bool = False,
+    ) -> bool:
         """Upload code into the flash memory of the device
 
         Args:
@@ -261,6 +1276,21 @@ class Commander:
                 A sequence of filepaths that contains images that should be
                 uploaded to the device in the given order
 
+            timeout:
+
+                The maximum amount of seconds the upload of a single image is
+                allowed to take
+
+            incremental:
+
+                Skip the (time consuming) upload, if the flash memory of the
+                device already contains all of the given images
+
+        Returns:
+
+            ``True``, if the images were uploaded or ``False``, if the upload
+            was skipped, since the device already contains all images
+
         Raises:
 
             CommanderException:
@@ -270,49 +1300,44 @@ class Commander:
 
         Examples:
 
-            Trying to upload a non existent file causes an error
+            Import required library code
 
-            >>> commander = Commander()
-            >>> # We assume the following file does not exist on your machine
-            >>> filepath = "nothing here"
-            >>> commander.upload_flash("BGM121A256V2",
-            ...     [filepath])  # doctest: +IGNORE_EXCEPTION_DETAIL
-            Traceback (most recent call last):
-               ...
-            CommanderException: Firmware file “nothing here” does not exist
+            >>> from asyncio import run
 
-            Trying to upload a directory instead of a file results in an error
+            Trying to upload a non existent file causes an error
 
-            >>> commander.upload_flash("BGM121A256V2",
-            ...     [Path.home()]) # doctest: +IGNORE_EXCEPTION_DETAIL
+            >>> commander = AsyncCommander()
+            >>> run(commander.upload_flash("BGM121A256V2", ["nothing here"])
+            ...    ) # doctest: +IGNORE_EXCEPTION_DETAIL
             Traceback (most recent call last):
                ...
-            CommanderException: “...” is not a file
+            CommanderException: Firmware file “nothing here” does not exist
 
         """
 
-        for filepath in filepaths:
-            firmware_filepath = Path(filepath)
-
-            if not firmware_filepath.exists():
-                raise CommanderException(
-                    f"Firmware file “{filepath}” does not exist"
-                )
-
-            if not firmware_filepath.is_file():
-                raise CommanderException(f"“{filepath}” is not a file")
+        if error_message := self._firmware_file_error(filepaths):
+            raise CommanderException(error_message)
 
         # Set debug mode to out, to make sure we flash the STH (connected via
         # debug cable) and not another microcontroller connected to the
         # programmer board.
-        self.enable_debug_mode()
+        await self.enable_debug_mode()
+
+        logger = self.logger
+        logger.info("Firmware digest: %s", firmware_digest(filepaths))
+        if incremental:
+            for filepath in filepaths:
+                if not await self.verify_flash(chip, filepath):
+                    break
+            else:
+                logger.info("Firmware is up to date, skipping upload")
+                return False
 
         # Unlock device (triggers flash erase)
-        self.unlock_device(chip)
+        await self.unlock_device(chip)
 
-        logger = getLogger(__name__)
         for filepath in filepaths:
-            self._run_command(
+            await self._run_command(
                 command=[
                     "flash",
                     f"{filepath}",
@@ -320,10 +1345,15 @@ class Commander:
                     f"{chip}",
                 ],
                 description="upload firmware",
+                timeout=timeout,
             )
             logger.info("Uploaded firmware: %s", filepath)
 
-    def read_power_usage(self, seconds: float = 1) -> float:
+        return True
+
+    async def read_power_usage(
+        self, seconds: float = 1, timeout: float | None = None
+    ) -> float:
         """Read the power usage of the connected hardware
 
         Args:
@@ -332,6 +1362,12 @@ class Commander:
 
                 The amount of seconds the power usage should be measured for
 
+            timeout:
+
+                The maximum amount of seconds the command is allowed to run;
+                ``None`` means that the timeout should be based on the
+                measurement duration
+
         Returns:
 
             The measured power usage in milliwatts
@@ -347,43 +1383,108 @@ class Commander:
 
             Import required library code
 
-            >>> from icotronic.config import settings
+            >>> from asyncio import run
 
             Measure power usage of connected STH
 
-            >>> commander = Commander()
-            >>> commander.read_power_usage() > 0
+            >>> run(AsyncCommander().read_power_usage()) > 0
             True
 
         """
 
-        command = [
-            "aem",
-            "measure",
-            "--windowlength",
-            str(round(seconds * 1000)),
-        ]
+        output = await self._run_command(
+            command=self._power_usage_command(seconds),
+            description="read power usage",
+            possible_error_reasons=["programmer not connected"],
+            timeout=seconds + 10 if timeout is None else timeout,
+        )
 
-        regex = r"Power\s*\[mW\]\s*:\s*(?P<milliwatts>\d+\.\d+)"
-        try:
-            output = self._run_command(
-                command=command,
-                description="read power usage",
-                possible_error_reasons=["programmer not connected"],
-                regex_output=regex,
-            )
-        except CommanderOutputMatchException as error:
+        milliwatts = self._parse_power_usage(output)
+        if milliwatts is None:
             raise CommanderOutputMatchException(
                 "Unable to extract power usage "
                 "from Simplicity Commander output"
-            ) from error
+            )
 
-        pattern_match = re_compile(regex).search(output)
-        assert pattern_match is not None
-        milliwatts = pattern_match["milliwatts"]
+        return milliwatts
+
+    async def stream_power_usage(
+        self,
+    ) -> AsyncIterator[list[tuple[float, float]]]:
+        """Read the power usage of the connected hardware continuously
+
+        In contrast to ``read_power_usage`` this coroutine only starts a
+        single Simplicity Commander process for the whole measurement. The
+        process will be stopped as soon as you stop the iteration.
+
+        Yields:
+
+            list[tuple[float, float]]:
+                Lists of samples that contain the time (in seconds, relative
+                to the start of the measurement) and the power usage (in
+                milliwatts)
+
+        Raises:
+
+            CommanderReturnCodeException:
+
+                If Simplicity Commander stopped the measurement unsuccessfully
+
+        """
+
+        command_line = self._command_line(["aem", "dump"])
+        self.logger.info("Running command: “%s”", " ".join(command_line))
+        process = await create_subprocess_exec(
+            *command_line, stdout=PIPE, stderr=PIPE
+        )
+        assert process.stdout is not None
+        assert process.stderr is not None
+
+        remainder = ""
+        try:
+            while chunk := await process.stdout.read(2**16):
+                text, _, remainder = (
+                    remainder + chunk.decode(errors="replace")
+                ).rpartition("\n")
+                if samples := self._parse_power_samples(text):
+                    yield samples
+        finally:
+            await self._stop_process(process)
+
+        if process.returncode != 0:
+            assert process.returncode is not None
+            stderr = (await process.stderr.read()).decode(errors="replace")
+            error_reasons = ["programmer not connected"]
+            raise CommanderReturnCodeException(
+                self._return_code_message(
+                    "read power usage continuously",
+                    process.returncode,
+                    (remainder, stderr),
+                    error_reasons,
+                ),
+                error_reasons,
+            )
+
+
+# -- Attributes ---------------------------------------------------------------
+
+POWER_SAMPLE_REGEX = re_compile(
+    r"^\s*(\d+(?:\.\d*)?)\s*[,;\s]\s*(\d+(?:\.\d*)?)\s*[,;\s]\s*"
+    r"(\d+(?:\.\d*)?)\s*$",
+    MULTILINE,
+)
+"""Regular expression for a single sample of ``commander aem dump``"""
 
-        return float(milliwatts)
+COMMANDER_VERSION_REGEX = re_compile(
+    r"Simplicity\s+Commander\s+(?P<version>\d+v\S+)"
+)
+"""Regular expression for the version in the output of ``--version``"""
 
+COMPONENT_VERSION_REGEX = re_compile(
+    r"^(?P<name>[^:\n]+?)\s+version:\s*(?P<version>\S+)\s*$",
+    MULTILINE | IGNORECASE,
+)
+"""Regular expression for component versions in the output of ``--version``"""
 
 # -- Main ---------------------------------------------------------------------
 
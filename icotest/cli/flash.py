@@ -0,0 +1,444 @@
+"""Upload firmware to multiple nodes using multiple debug adapters"""
+
+# -- Imports ------------------------------------------------------------------
+
+from asyncio import Semaphore, gather
+from logging import FileHandler, Formatter, getLogger
+from pathlib import Path
+from re import IGNORECASE, compile as re_compile
+from time import monotonic
+from typing import NamedTuple, Sequence
+
+from icotest.cli.commander import AsyncCommander, CommanderException
+
+# -- Attributes ---------------------------------------------------------------
+
+ADAPTER_SERIAL_NUMBER_REGEX = re_compile(
+    r"serial\s*number\s*[=:]\s*(?P<serial_number>\d+)", IGNORECASE
+)
+"""Regular expression for serial numbers in the output of ``adapter list``"""
+
+# -- Classes ------------------------------------------------------------------
+
+
+class FlashResult(NamedTuple):
+    """Result of the firmware upload via a single debug adapter
+
+    Attributes:
+
+        serial_number:
+            The serial number of the debug adapter
+
+        uploaded:
+            ``True`` if the firmware was uploaded, ``False`` if the upload
+            was skipped or failed
+
+        duration:
+            The time the upload took in seconds
+
+        error:
+            The error that stopped the upload or ``None`` if the upload was
+            successful
+
+    Examples:
+
+        Show the string representation of a successful and a failed upload
+
+        >>> FlashResult("440123456", uploaded=True, duration=20.25)
+        440123456: Uploaded (20.25 s)
+        >>> FlashResult("440123457", uploaded=False, duration=1.5,
+        ...             error=CommanderException("Device not connected"))
+        440123457: Failed (1.50 s): Device not connected
+
+    """
+
+    serial_number: str
+    uploaded: bool
+    duration: float
+    error: Exception | None = None
+
+    @property
+    def success(self) -> bool:
+        """Check if the firmware upload (or the skip) was successful
+
+        Returns:
+
+            ``True`` if the node contains the firmware, ``False`` otherwise
+
+        """
+
+        return self.error is None
+
+    def __repr__(self) -> str:
+        """Get the textual representation of the result
+
+        Returns:
+
+            A string that describes the upload result
+
+        """
+
+        if not self.success:
+            status = "Failed"
+        else:
+            status = "Uploaded" if self.uploaded else "Up to date"
+
+        representation = (
+            f"{self.serial_number}: {status} ({self.duration:.2f} s)"
+        )
+        if self.error is not None:
+            representation += f": {self.error}"
+
+        return representation
+
+
+# -- Functions ----------------------------------------------------------------
+
+
+def parse_adapter_serial_numbers(output: str) -> list[str]:
+    """Get the serial numbers of debug adapters from Simplicity Commander
+
+    Args:
+
+        output:
+
+            The output of the command ``commander adapter list``
+
+    Returns:
+
+        A list containing the serial numbers of the debug adapters
+
+    Examples:
+
+        Parse the output of a command that found two adapters
+
+        >>> parse_adapter_serial_numbers('''deviceCount=2
+        ... device[0].name=J-Link OB
+        ... device[0].serialnumber=440123456
+        ... device[1].name=J-Link OB
+        ... device[1].serialnumber=440123457
+        ... DONE''')
+        ['440123456', '440123457']
+
+        Parse the output of a command that did not find any adapters
+
+        >>> parse_adapter_serial_numbers("deviceCount=0\\nDONE")
+        []
+
+    """
+
+    return [
+        match["serial_number"]
+        for match in ADAPTER_SERIAL_NUMBER_REGEX.finditer(output)
+    ]
+
+
+async def list_adapters(timeout: float | None = 10) -> list[str]:
+    """Get the serial numbers of all connected debug adapters
+
+    Args:
+
+        timeout:
+
+            The maximum amount of seconds the command is allowed to take
+
+    Returns:
+
+        A list containing the serial numbers of the connected debug adapters
+
+    """
+
+    # pylint: disable=protected-access
+    output = await AsyncCommander()._run_command(
+        command=["adapter", "list"],
+        description="list debug adapters",
+        timeout=timeout,
+    )
+    # pylint: enable=protected-access
+
+    return parse_adapter_serial_numbers(output)
+
+
+def firmware_filepaths(locations: Sequence[str]) -> list[Path]:
+    """Get the paths of firmware images from the configured locations
+
+    Args:
+
+        locations:
+
+            The configured firmware locations
+
+    Returns:
+
+        A list containing the absolute paths of the firmware images
+
+    Raises:
+
+        FileNotFoundError:
+
+            If one of the firmware images does not exist
+
+    Examples:
+
+        Trying to get the path of a non existent file causes an error
+
+        >>> firmware_filepaths(["nothing here"]
+        ...    ) # doctest: +IGNORE_EXCEPTION_DETAIL
+        Traceback (most recent call last):
+           ...
+        FileNotFoundError: Firmware file …/nothing here does not exist
+
+    """
+
+    image_filepaths: list[Path] = []
+    for location in locations:
+        image_filepath = Path(location).expanduser().resolve()
+        if not image_filepath.exists():
+            raise FileNotFoundError(
+                f"Firmware file {image_filepath} does not exist"
+            )
+        if not image_filepath.is_file():
+            raise FileNotFoundError(
+                f"Firmware file {image_filepath} is not a file"
+            )
+        image_filepaths.append(image_filepath)
+
+    return image_filepaths
+
+
+def throughput(results: Sequence[FlashResult], duration: float) -> float:
+    """Calculate the amount of successfully flashed nodes per hour
+
+    Args:
+
+        results:
+
+            The results of the firmware uploads
+
+        duration:
+
+            The time in seconds it took to flash all nodes
+
+    Returns:
+
+        The amount of nodes per hour that contain the firmware afterwards
+
+    Examples:
+
+        Calculate the throughput for three nodes flashed in 30 seconds
+
+        >>> results = [
+        ...     FlashResult("1", uploaded=True, duration=30),
+        ...     FlashResult("2", uploaded=False, duration=5),
+        ...     FlashResult("3", uploaded=True, duration=29),
+        ... ]
+        >>> throughput(results, duration=30)
+        360.0
+
+        Failed uploads do not count
+
+        >>> results[0] = FlashResult("1", uploaded=False, duration=30,
+        ...                          error=CommanderException())
+        >>> throughput(results, duration=30)
+        240.0
+
+    """
+
+    if duration <= 0:
+        return 0.0
+
+    return sum(result.success for result in results) * 3600 / duration
+
+
+async def flash(
+    serial_number: str,
+    chip: str,
+    filepaths: Sequence[str | Path],
+    incremental: bool = False,
+    log_directory: Path | None = None,
+) -> FlashResult:
+    """Upload firmware using a single debug adapter
+
+    Args:
+
+        serial_number:
+
+            The serial number of the debug adapter
+
+        chip:
+
+            The identifier of the chip on the PCB e.g. “BGM121A256V2”
+
+        filepaths:
+
+            The firmware images that should be uploaded in the given order
+
+        incremental:
+
+            Skip the upload, if the node already contains all images
+
+        log_directory:
+
+            The directory that should store the log file of the adapter;
+            ``None`` means that no log file will be created
+
+    Returns:
+
+        The result of the upload
+
+    """
+
+    commander = AsyncCommander(serial_number)
+    logger = commander.logger
+
+    handler: FileHandler | None = None
+    if log_directory is not None:
+        handler = FileHandler(log_directory / f"{serial_number}.log")
+        handler.setFormatter(
+            Formatter("{asctime} {levelname:7} {message}", style="{")
+        )
+        logger.addHandler(handler)
+
+    start = monotonic()
+    try:
+        uploaded = await commander.upload_flash(
+            chip=chip, filepaths=filepaths, incremental=incremental
+        )
+    except CommanderException as error:
+        logger.error("Upload failed: %s", error)
+        return FlashResult(
+            serial_number, False, monotonic() - start, error=error
+        )
+    finally:
+        if handler is not None:
+            logger.removeHandler(handler)
+            handler.close()
+
+    return FlashResult(serial_number, uploaded, monotonic() - start)
+
+
+async def flash_parallel(  # pylint: disable=too-many-arguments
+    chip: str,
+    filepaths: Sequence[str | Path],
+    *,
+    serial_numbers: Sequence[str] | None = None,
+    workers: int | None = None,
+    incremental: bool = False,
+    log_directory: Path | None = None,
+) -> list[FlashResult]:
+    """Upload firmware to multiple nodes concurrently
+
+    Args:
+
+        chip:
+
+            The identifier of the chip on the PCB e.g. “BGM121A256V2”
+
+        filepaths:
+
+            The firmware images that should be uploaded in the given order
+
+        serial_numbers:
+
+            The serial numbers of the debug adapters that should be used;
+            ``None`` means that every connected adapter will be used
+
+        workers:
+
+            The maximum number of concurrent uploads; ``None`` means that
+            all adapters will be used at the same time
+
+        incremental:
+
+            Skip the upload for nodes that already contain all images
+
+        log_directory:
+
+            The directory that should store one log file per adapter;
+            ``None`` means that no log files will be created
+
+    Returns:
+
+        A list containing the upload result for every adapter (in the order
+        of the given serial numbers)
+
+    Raises:
+
+        CommanderException:
+
+            If there are no debug adapters
+
+    Examples:
+
+        Import required library code
+
+        >>> from asyncio import run
+        >>> from tempfile import TemporaryDirectory
+        >>> from icotest.test.support.fake_commander import FakeCommander
+
+        Upload firmware via three simulated debug adapters (at most two at
+        the same time) and skip the upload afterwards
+
+        >>> def upload(directory: Path, **arguments) -> list[FlashResult]:
+        ...     firmware = directory / "firmware.hex"
+        ...     _ = firmware.write_text("firmware")
+        ...     return run(flash_parallel("BGM121A256V2", [firmware],
+        ...                               **arguments))
+        >>> with TemporaryDirectory() as directory:
+        ...     path = Path(directory)
+        ...     with FakeCommander(path, ["1", "2", "3"],
+        ...                        delay=0.5) as commander:
+        ...         results = upload(path, workers=2,
+        ...                          log_directory=path / "logs")
+        ...         skipped = upload(path, incremental=True)
+        ...         concurrency = commander.concurrency()
+        ...         logs = sorted(log.name
+        ...                       for log in (path / "logs").iterdir())
+        >>> results # doctest: +ELLIPSIS
+        [1: Uploaded (... s), 2: Uploaded (... s), 3: Uploaded (... s)]
+        >>> skipped # doctest: +ELLIPSIS
+        [1: Up to date (... s), 2: Up to date (... s), 3: Up to date (... s)]
+        >>> concurrency, logs
+        (2, ['1.log', '2.log', '3.log'])
+
+        A failed upload does not stop the other uploads
+
+        >>> with TemporaryDirectory() as directory:
+        ...     with FakeCommander(Path(directory), ["1"]):
+        ...         results = upload(Path(directory),
+        ...                          serial_numbers=["1", "2"])
+        >>> [result.success for result in results]
+        [True, False]
+
+    """
+
+    if serial_numbers is None:
+        serial_numbers = await list_adapters()
+    if len(serial_numbers) <= 0:
+        raise CommanderException("Unable to find any debug adapters")
+
+    if log_directory is not None:
+        log_directory.mkdir(parents=True, exist_ok=True)
+
+    semaphore = Semaphore(
+        len(serial_numbers) if workers is None else max(workers, 1)
+    )
+
+    async def worker(serial_number: str) -> FlashResult:
+        async with semaphore:
+            return await flash(
+                serial_number,
+                chip,
+                filepaths,
+                incremental=incremental,
+                log_directory=log_directory,
+            )
+
+    getLogger(__name__).info(
+        "Uploading firmware via %d debug adapters", len(serial_numbers)
+    )
+    return list(
+        await gather(
+            *(worker(serial_number) for serial_number in serial_numbers)
+        )
+    )
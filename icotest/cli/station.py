@@ -0,0 +1,274 @@
+"""Test multiple sensor nodes one after another in a single test session"""
+
+# -- Imports ------------------------------------------------------------------
+
+from __future__ import annotations
+
+from asyncio import sleep
+from datetime import datetime
+from json import dumps
+from logging import getLogger
+from pathlib import Path
+from typing import Any
+
+from icotronic.can import STU
+from icotronic.can.node.stu import SensorNodeInfo
+from netaddr import EUI
+from pytest import Config, Item, Session, StashKey, TestReport, hookimpl
+
+# -- Attributes ---------------------------------------------------------------
+
+station_key = StashKey["Station"]()
+"""Key for the station plugin in the stash of the pytest configuration"""
+
+# -- Functions ----------------------------------------------------------------
+
+
+async def wait_for_sensor_node(
+    stu: STU, exclude: set[EUI], interval: float = 0.5
+) -> SensorNodeInfo:
+    """Wait until a sensor node that was not tested before advertises
+
+    Args:
+
+        stu:
+
+            The STU used to search for sensor nodes
+
+        exclude:
+
+            The MAC addresses of sensor nodes that should be ignored
+
+        interval:
+
+            The amount of seconds between two searches for sensor nodes
+
+    Returns:
+
+        Information about the new sensor node with the strongest signal
+
+    """
+
+    logger = getLogger(__name__)
+    logger.info("Waiting for next sensor node")
+    while True:
+        sensor_nodes = [
+            sensor_node
+            for sensor_node in await stu.get_sensor_nodes()
+            if sensor_node.mac_address not in exclude
+        ]
+        if sensor_nodes:
+            sensor_node = max(sensor_nodes, key=lambda node: node.rssi)
+            logger.info("Found sensor node: %s", sensor_node)
+            return sensor_node
+        await sleep(interval)
+
+
+# -- Classes ------------------------------------------------------------------
+
+
+class Station:
+    """Pytest plugin that runs all tests for one sensor node after another
+
+    In station mode the test session keeps a single connection to the STU
+    open. For every unit the plugin waits until a new sensor node advertises,
+    runs all (sensor node) tests for this node and writes a report that
+    contains the test results of the node.
+
+    Args:
+
+        units:
+
+            The number of sensor nodes that should be tested; ``None`` means
+            that the station tests sensor nodes until it is interrupted
+
+        report_directory:
+
+            The directory that stores the reports of the tested sensor nodes
+
+    """
+
+    def __init__(
+        self,
+        units: int | None = None,
+        report_directory: Path = Path("reports"),
+    ) -> None:
+
+        self.units = units
+        self.report_directory = report_directory
+        self.tested: set[EUI] = set()
+        self.sensor_node: SensorNodeInfo | None = None
+        self.results: list[dict[str, Any]] = []
+
+    async def sensor_node_address(self, stu: STU) -> EUI:
+        """Get the MAC address of the sensor node of the current unit
+
+        Args:
+
+            stu:
+
+                The STU used to search for the sensor node, if the current
+                unit does not have a sensor node yet
+
+        Returns:
+
+            The MAC address of the currently tested sensor node
+
+        """
+
+        if self.sensor_node is None:
+            self.sensor_node = await wait_for_sensor_node(stu, self.tested)
+            self.tested.add(self.sensor_node.mac_address)
+
+        return self.sensor_node.mac_address
+
+    def write_report(self) -> Path | None:
+        """Store the test results of the current unit
+
+        Returns:
+
+            The path of the report or ``None``, if the tests did not use a
+            sensor node
+
+        """
+
+        sensor_node = self.sensor_node
+        if sensor_node is None:
+            return None
+
+        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        mac_address = str(sensor_node.mac_address).replace(":", "-")
+        filepath = self.report_directory / f"{timestamp}_{mac_address}.json"
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        filepath.write_text(
+            dumps(
+                {
+                    "sensor node": {
+                        "name": sensor_node.name,
+                        "mac address": str(sensor_node.mac_address),
+                    },
+                    "passed": all(
+                        result["outcome"] != "failed"
+                        for result in self.results
+                    ),
+                    "tests": self.results,
+                },
+                indent=2,
+            ),
+            encoding="utf-8",
+        )
+        getLogger(__name__).info("Stored report in “%s”", filepath)
+
+        return filepath
+
+    # -- Hooks ----------------------------------------------------------------
+
+    def pytest_configure(self, config: Config) -> None:
+        """Make the station available to the test fixtures
+
+        Args:
+
+            config:
+
+                The pytest configuration
+
+        """
+
+        config.stash[station_key] = self
+
+    def pytest_collection_modifyitems(
+        self, config: Config, items: list[Item]
+    ) -> None:
+        """Remove the STU tests, since the station uses a single STU
+
+        Args:
+
+            config:
+
+                The pytest configuration
+
+            items:
+
+                The collected tests
+
+        """
+
+        deselected = [item for item in items if item.path.stem == "test_stu"]
+        if deselected:
+            config.hook.pytest_deselected(items=deselected)
+            items[:] = [item for item in items if item not in deselected]
+
+    def pytest_runtest_logreport(self, report: TestReport) -> None:
+        """Store the result of a test phase for the report of the unit
+
+        Args:
+
+            report:
+
+                The report of the test phase (setup, call or teardown)
+
+        """
+
+        if report.when == "call" or report.outcome != "passed":
+            self.results.append({
+                "test": report.nodeid,
+                "phase": report.when,
+                "outcome": report.outcome,
+                "duration": report.duration,
+                "properties": dict(report.user_properties),
+            })
+
+    @hookimpl(tryfirst=True)
+    def pytest_runtestloop(self, session: Session) -> bool:
+        """Run all tests for one sensor node after another
+
+        Args:
+
+            session:
+
+                The pytest session
+
+        Returns:
+
+            ``True`` to stop the default implementation of the test loop
+
+        Raises:
+
+            session.Interrupted:
+
+                If the test session was interrupted
+
+            session.Failed:
+
+                If the test session should stop after a failure
+
+        """
+
+        items = session.items
+        if session.config.option.collectonly or not items:
+            return True
+
+        unit = 0
+        while self.units is None or unit < self.units:
+            last_unit = self.units is not None and unit >= self.units - 1
+            self.sensor_node = None
+            self.results = []
+            for index, item in enumerate(items):
+                # Use the first test of the next unit as next item to keep the
+                # session scoped fixtures (e.g. the STU connection) alive
+                nextitem = (
+                    items[index + 1]
+                    if index + 1 < len(items)
+                    else None if last_unit else items[0]
+                )
+                item.config.hook.pytest_runtest_protocol(
+                    item=item, nextitem=nextitem
+                )
+                if session.shouldfail:
+                    raise session.Failed(session.shouldfail)
+                if session.shouldstop:
+                    raise session.Interrupted(session.shouldstop)
+            self.write_report()
+            unit += 1
+
+        return True
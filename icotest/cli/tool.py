@@ -2,15 +2,32 @@
 
 # -- Imports ------------------------------------------------------------------
 
-from argparse import ArgumentParser
+from argparse import ArgumentParser, Namespace
+from asyncio import run as asyncio_run
 from logging import basicConfig, getLogger
 from os import environ
+from pathlib import Path
 from subprocess import run, CalledProcessError
 from sys import exit as sys_exit
+from time import monotonic
 
+from dynaconf.utils.boxing import DynaBox
+from icotronic.can import Connection, SensorNode
+from icotronic.can.adc import ADCConfiguration
 from icotronic.cmdline.types import node_name
-
+from pytest import main as pytest_main
+
+from icotest.cli.benchmark import (
+    ADCSweep,
+    adc_configurations,
+    benchmark_startup,
+    sweep_adc,
+)
+from icotest.cli.commander import CommanderException
+from icotest.cli.flash import firmware_filepaths, flash_parallel, throughput
+from icotest.cli.station import Station
 from icotest.config import settings, ConfigurationUtility
+from icotest.test.support.simulation import SimulatedNode
 
 # -- Functions ----------------------------------------------------------------
 
@@ -38,6 +55,96 @@ def create_icotest_parser() -> ArgumentParser:
         required=True, title="Subcommands", dest="subcommand"
     )
 
+    # =============
+    # = Benchmark =
+    # =============
+
+    benchmark_parser = subparsers.add_parser(
+        "benchmark", help="Measure performance of ICOtest"
+    )
+    benchmark_subparsers = benchmark_parser.add_subparsers(
+        required=True, title="Benchmarks", dest="benchmark"
+    )
+    startup_parser = benchmark_subparsers.add_parser(
+        "startup",
+        help="Compare startup time of tests in new and current process",
+    )
+    startup_parser.add_argument(
+        "-r",
+        "--repetitions",
+        type=int,
+        default=5,
+        help="Number of measurements for each execution mode (default: 5)",
+    )
+    adc_parser = benchmark_subparsers.add_parser(
+        "adc",
+        help="Measure throughput, message loss and noise for ADC settings",
+    )
+    adc_parser.add_argument(
+        "-p",
+        "--prescaler",
+        type=int,
+        nargs="+",
+        default=[2],
+        help="Prescaler values (default: 2)",
+    )
+    adc_parser.add_argument(
+        "-a",
+        "--acquisition-time",
+        type=int,
+        nargs="+",
+        default=[8],
+        help="Acquisition times (default: 8)",
+    )
+    adc_parser.add_argument(
+        "-o",
+        "--oversampling-rate",
+        type=int,
+        nargs="+",
+        default=[32, 64, 128],
+        help="Oversampling rates (default: 32 64 128)",
+    )
+    adc_parser.add_argument(
+        "-v",
+        "--reference-voltage",
+        type=float,
+        nargs="+",
+        default=[3.3],
+        help="Reference voltages in Volt (default: 3.3)",
+    )
+    adc_parser.add_argument(
+        "-c",
+        "--channels",
+        type=int,
+        choices=(1, 2, 3),
+        default=1,
+        help="Number of enabled measurement channels (default: 1)",
+    )
+    adc_parser.add_argument(
+        "-m",
+        "--messages",
+        type=int,
+        default=1000,
+        help="Streaming messages per ADC configuration (default: 1000)",
+    )
+    adc_parser.add_argument(
+        "-n",
+        "--name",
+        type=node_name,
+        help="Name of sensor node (default: configured sensor node name)",
+    )
+    adc_parser.add_argument(
+        "-s",
+        "--simulate",
+        action="store_true",
+        help="Use a simulated sensor node instead of hardware",
+    )
+    adc_parser.add_argument(
+        "--output",
+        type=Path,
+        help="CSV file the results should be appended to",
+    )
+
     # ==========
     # = Config =
     # ==========
@@ -46,6 +153,48 @@ def create_icotest_parser() -> ArgumentParser:
         "config", help="Open configuration file in default application"
     )
 
+    # =========
+    # = Flash =
+    # =========
+
+    flash_parser = subparsers.add_parser(
+        "flash", help="Upload firmware using multiple debug adapters"
+    )
+    flash_parser.add_argument(
+        "node",
+        choices=("sensor-node", "stu"),
+        help="Type of node that should be flashed",
+    )
+    flash_parser.add_argument(
+        "-a",
+        "--adapter",
+        action="append",
+        dest="adapters",
+        metavar="SERIAL_NUMBER",
+        help=(
+            "Serial number of debug adapter that should be used "
+            "(default: all connected adapters)"
+        ),
+    )
+    flash_parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        help="Maximum number of concurrent uploads (default: all adapters)",
+    )
+    flash_parser.add_argument(
+        "-i",
+        "--incremental",
+        action="store_true",
+        help="Skip upload for nodes that already contain the firmware",
+    )
+    flash_parser.add_argument(
+        "-l",
+        "--log-directory",
+        type=Path,
+        help="Directory that stores one log file per debug adapter",
+    )
+
     # =======
     # = Run =
     # =======
@@ -57,6 +206,50 @@ def create_icotest_parser() -> ArgumentParser:
         help="Name of sensor node",
         type=node_name,
     )
+    run_parser.add_argument(
+        "--in-process",
+        action="store_true",
+        help="Run tests in current process instead of a new pytest process",
+    )
+    recording_group = run_parser.add_mutually_exclusive_group()
+    recording_group.add_argument(
+        "--record",
+        metavar="DIRECTORY",
+        type=Path,
+        help="Store the streaming data of the STH tests in DIRECTORY",
+    )
+    recording_group.add_argument(
+        "--replay",
+        metavar="DIRECTORY",
+        type=Path,
+        help="Use streaming data stored in DIRECTORY instead of an STH",
+    )
+
+    # ===========
+    # = Station =
+    # ===========
+
+    station_parser = subparsers.add_parser(
+        "station",
+        help=(
+            "Test one sensor node after another using a single STU connection"
+        ),
+    )
+    station_parser.add_argument(
+        "-u",
+        "--units",
+        type=int,
+        help=(
+            "Number of sensor nodes that should be tested (default: unlimited)"
+        ),
+    )
+    station_parser.add_argument(
+        "-r",
+        "--report-directory",
+        type=Path,
+        default=Path("reports"),
+        help="Directory that stores the report of every sensor node",
+    )
 
     return parser
 
@@ -96,6 +289,214 @@ def run_pytest(
         sys_exit(error.returncode)
 
 
+def run_pytest_in_process(
+    log_level: str, pytest_args: list[str], plugins: list[object] | None = None
+) -> None:
+    """Run pytest for the package in the current process
+
+    In contrast to ``run_pytest`` this function does not start a new Python
+    interpreter. The tests use the already loaded modules and the current
+    configuration (``icotest.config.settings``).
+
+    Args:
+
+        log_level:
+
+            Log level for invocation of pytest
+
+        pytest_args:
+
+            Additional arguments for pytest call
+
+        plugins:
+
+            Additional pytest plugin objects
+
+    """
+
+    arguments = [
+        "--log-cli-level",
+        log_level,
+        "--pyargs",
+        "icotest.test",
+    ] + pytest_args
+    print(f"\nTest Command:\n\n  pytest {' '.join(arguments)}\n")
+    sys_exit(pytest_main(arguments, plugins=plugins))
+
+
+def flash_nodes(
+    node_settings: DynaBox,
+    adapters: list[str] | None,
+    workers: int | None,
+    incremental: bool,
+    log_directory: Path | None,
+) -> None:
+    """Upload firmware to multiple nodes concurrently
+
+    Args:
+
+        node_settings:
+
+            The configuration of the node type that should be flashed
+
+        adapters:
+
+            The serial numbers of the debug adapters that should be used
+
+        workers:
+
+            The maximum number of concurrent uploads
+
+        incremental:
+
+            Skip the upload for nodes that already contain the firmware
+
+        log_directory:
+
+            The directory that should store the log files of the adapters
+
+    Examples:
+
+        Import required library code
+
+        >>> from tempfile import TemporaryDirectory
+        >>> from types import SimpleNamespace
+        >>> from icotest.test.support.fake_commander import FakeCommander
+
+        Flash two nodes using simulated debug adapters
+
+        >>> with TemporaryDirectory() as directory:
+        ...     path = Path(directory)
+        ...     firmware = path / "firmware.hex"
+        ...     _ = firmware.write_text("firmware")
+        ...     node_settings = SimpleNamespace(firmware=SimpleNamespace(
+        ...         chip="BGM121A256V2",
+        ...         locations=[str(firmware)],
+        ...         incremental=False,
+        ...     ))
+        ...     with FakeCommander(path, ["1", "2"]):
+        ...         flash_nodes(node_settings, adapters=None, workers=None,
+        ...                     incremental=False, log_directory=None)
+        ... # doctest: +ELLIPSIS
+        1: Uploaded (... s)
+        2: Uploaded (... s)
+        <BLANKLINE>
+        2/2 nodes flashed in ... s (... nodes/h)
+
+    """
+
+    start = monotonic()
+    try:
+        results = asyncio_run(
+            flash_parallel(
+                chip=node_settings.firmware.chip,
+                filepaths=firmware_filepaths(node_settings.firmware.locations),
+                serial_numbers=adapters,
+                workers=workers,
+                incremental=incremental or node_settings.firmware.incremental,
+                log_directory=log_directory,
+            )
+        )
+    except (CommanderException, FileNotFoundError) as error:
+        sys_exit(f"Unable to upload firmware: {error}")
+    duration = monotonic() - start
+
+    for result in results:
+        print(result)
+    successful = sum(result.success for result in results)
+    print(
+        f"\n{successful}/{len(results)} nodes flashed in {duration:.2f} s "
+        f"({throughput(results, duration):.0f} nodes/h)"
+    )
+
+    if successful < len(results):
+        sys_exit(1)
+
+
+async def sweep_sensor_node(
+    name: str | None,
+    configurations: list[ADCConfiguration],
+    channels: int,
+    messages: int,
+    simulate: bool,
+) -> ADCSweep:
+    """Measure the streaming performance of a sensor node for ADC settings
+
+    Args:
+
+        name:
+
+            The name of the sensor node; ``None`` uses the configured name
+
+        configurations:
+
+            The ADC configurations that should be measured
+
+        channels:
+
+            The number of enabled measurement channels
+
+        messages:
+
+            The number of streaming messages per ADC configuration
+
+        simulate:
+
+            Use a simulated sensor node instead of hardware
+
+    Returns:
+
+        The results of all ADC configurations
+
+    """
+
+    if simulate:
+        return await sweep_adc(
+            SimulatedNode(), configurations, channels, messages
+        )
+
+    async with Connection() as stu:
+        async with stu.connect_sensor_node(
+            settings.sensor_node.name if name is None else name, SensorNode
+        ) as sensor_node:
+            return await sweep_adc(
+                sensor_node, configurations, channels, messages
+            )
+
+
+def run_benchmark(arguments: Namespace) -> None:
+    """Run the benchmark selected via the command line
+
+    Args:
+
+        arguments:
+
+            The parsed command line arguments of the benchmark subcommand
+
+    """
+
+    if arguments.benchmark == "startup":
+        print(benchmark_startup(arguments.repetitions))
+    else:
+        sweep = asyncio_run(
+            sweep_sensor_node(
+                name=arguments.name,
+                configurations=adc_configurations(
+                    arguments.prescaler,
+                    arguments.acquisition_time,
+                    arguments.oversampling_rate,
+                    arguments.reference_voltage,
+                ),
+                channels=arguments.channels,
+                messages=arguments.messages,
+                simulate=arguments.simulate,
+            )
+        )
+        print(sweep)
+        if arguments.output is not None:
+            sweep.save(arguments.output)
+
+
 # -- Main ---------------------------------------------------------------------
 
 
@@ -105,7 +506,10 @@ def main() -> None:
     parser = create_icotest_parser()
     # Parse known args to get subcommand
     arguments, additional_args = parser.parse_known_args()
-    if vars(arguments).get("subcommand", "undefined") != "run":
+    if vars(arguments).get("subcommand", "undefined") not in {
+        "run",
+        "station",
+    }:
         arguments = parser.parse_args()
 
     log_level = arguments.log.upper()
@@ -122,19 +526,66 @@ def main() -> None:
     subcommand = arguments.subcommand
 
     match subcommand:
+        case "benchmark":
+            run_benchmark(arguments)
         case "config":
             ConfigurationUtility.open_user_config()
+        case "flash":
+            flash_nodes(
+                (
+                    settings.sensor_node
+                    if arguments.node == "sensor-node"
+                    else settings.stu
+                ),
+                adapters=arguments.adapters,
+                workers=arguments.workers,
+                incremental=arguments.incremental,
+                log_directory=arguments.log_directory,
+            )
         case "run":
-            environment_pytest = dict(environ)
-            if arguments.name is not None:
-                logger.info(
-                    "Using sensor node name: %s", settings.sensor_node.name
-                )
-                environment_pytest["DYNACONF_SENSOR_NODE__NAME"] = (
-                    arguments.name
+            recording = {
+                mode: str(directory)
+                for mode, directory in (
+                    ("record", arguments.record),
+                    ("replay", arguments.replay),
                 )
-
-            run_pytest(log_level, additional_args, environment_pytest)
+                if directory is not None
+            }
+            if arguments.in_process:
+                if arguments.name is not None:
+                    settings.set("sensor_node.name", arguments.name)
+                    logger.info(
+                        "Using sensor node name: %s", settings.sensor_node.name
+                    )
+                for mode, directory in recording.items():
+                    settings.set("sth.recording.mode", mode)
+                    settings.set("sth.recording.directory", directory)
+                run_pytest_in_process(log_level, additional_args)
+            else:
+                environment_pytest = dict(environ)
+                if arguments.name is not None:
+                    logger.info("Using sensor node name: %s", arguments.name)
+                    environment_pytest["DYNACONF_SENSOR_NODE__NAME"] = (
+                        arguments.name
+                    )
+                for mode, directory in recording.items():
+                    environment_pytest["DYNACONF_STH__RECORDING__MODE"] = mode
+                    environment_pytest[
+                        "DYNACONF_STH__RECORDING__DIRECTORY"
+                    ] = directory
+
+                run_pytest(log_level, additional_args, environment_pytest)
+        case "station":
+            run_pytest_in_process(
+                log_level,
+                additional_args,
+                plugins=[
+                    Station(
+                        units=arguments.units,
+                        report_directory=arguments.report_directory,
+                    )
+                ],
+            )
 
 
 if __name__ == "__main__":
@@ -2,4 +2,12 @@
 
 # -- Exports ------------------------------------------------------------------
 
-from .config import ConfigurationUtility, settings
+from .config import ConfigurationUtility, limits, settings
+from .limits import (
+    AccelerationLimits,
+    Band,
+    Limits,
+    PowerLimits,
+    StreamingLimits,
+    Window,
+)
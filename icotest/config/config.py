@@ -4,11 +4,14 @@
 
 from datetime import date
 from functools import partial
+from hashlib import sha256
 from importlib.resources import as_file, files
 from numbers import Real
+from os import environ, getpid
 from pathlib import Path
+from pickle import HIGHEST_PROTOCOL, PickleError, dumps, loads
 from sys import exit as sys_exit, stderr
-from typing import Any
+from typing import Any, Sequence
 
 
 from dynaconf import (  # type: ignore[attr-defined]
@@ -18,11 +21,14 @@ from dynaconf import (  # type: ignore[attr-defined]
 )
 
 from dynaconf.utils.boxing import DynaBox
+from dynaconf.utils.parse_conf import boolean_fix, parse_conf_data
 from dynaconf.vendor.ruamel.yaml.parser import ParserError
 from dynaconf.vendor.ruamel.yaml.scanner import ScannerError
 
 from startfile import startfile
-from platformdirs import site_config_dir, user_config_dir
+from platformdirs import site_config_dir, user_cache_dir, user_config_dir
+
+from icotest.config.limits import Limits
 
 # -- Functions ----------------------------------------------------------------
 
@@ -146,6 +152,57 @@ def element_is_string(nodes: DynaBox, name: str) -> bool:  # noqa: DOC502
     return element_is_type(nodes, name, element_type=str)
 
 
+def band_is_valid(bands: DynaBox, name: str) -> bool:
+    """Check that all elements of a list are valid frequency bands
+
+    Args:
+
+        bands:
+
+            The list of frequency bands that should be checked
+
+        name:
+
+            The name of the list
+
+    Returns:
+
+        ``True``, if every element is a valid frequency band
+
+    Raises:
+
+        ValidationError:
+
+            If any element of the given list is not a valid frequency band
+
+    """
+
+    if bands is None:
+        return True  # Let parent validator handle wrong type
+
+    for band in bands:
+        values = [
+            band.get(key) if isinstance(band, dict) else None
+            for key in ("minimum", "maximum", "ratio_noise_to_max_value")
+        ]
+        minimum, maximum, ratio = values
+        if not (
+            isinstance(minimum, Real)
+            and isinstance(maximum, Real)
+            and isinstance(ratio, Real)
+        ):
+            raise ValidationError(
+                f"Element “{band}” of {name} requires the numeric values "
+                "“minimum”, “maximum” and “ratio noise to max value”"
+            )
+        if minimum > maximum:
+            raise ValidationError(
+                f"Minimum of element “{band}” of {name} is larger than its "
+                "maximum"
+            )
+    return True
+
+
 def commands_validators() -> list[Validator]:
     """Return list of validators for config data below key `commands`"""
 
@@ -159,6 +216,18 @@ def commands_validators() -> list[Validator]:
     ]
 
 
+def retry_validators() -> list[Validator]:
+    """Return list of validators for config data below key `retry`"""
+
+    return [
+        Validator(
+            "retry.transient", "retry.other", is_type_of=int, gte=0, default=0
+        ),
+        Validator("retry.delay", is_type_of=Real, gte=0, default=0.5),
+        Validator("retry.maximum_delay", is_type_of=Real, gte=0, default=8),
+    ]
+
+
 def acceleration_sensor_validators(name: str) -> list[Validator]:
     """Return the list of validators for a specific acceleration sensor
 
@@ -178,6 +247,7 @@ def acceleration_sensor_validators(name: str) -> list[Validator]:
     return [
         must_exist(
             f"{prefix}.{name}.acceleration.maximum",
+            f"{prefix}.{name}.acceleration.ratio_noise_to_max_value",
             f"{prefix}.{name}.acceleration.tolerance",
             f"{prefix}.{name}.reference_voltage",
             f"{prefix}.{name}.self_test.voltage.difference",
@@ -189,6 +259,16 @@ def acceleration_sensor_validators(name: str) -> list[Validator]:
             is_type_of=str,
             is_in=("x", "y", "z"),
         ),
+        must_exist(
+            f"{prefix}.{name}.spectrum.bands",
+            is_type_of=list,
+            condition=partial(
+                band_is_valid, name=f"{prefix}.{name}.spectrum.bands"
+            ),
+        ),
+        must_exist(
+            f"{prefix}.{name}.spectrum.spur_threshold", is_type_of=Real
+        ),
     ]
 
 
@@ -217,6 +297,14 @@ def node_validators(node: str) -> list[Validator]:
             f"{node}.serial_number",
             is_type_of=str,
         ),
+        # Use default value, since users might disable merging for the whole
+        # firmware configuration to overwrite the list of firmware locations
+        Validator(
+            f"{node}.firmware.incremental", is_type_of=bool, default=False
+        ),
+        Validator(
+            f"{node}.eeprom.read_before_write", is_type_of=bool, default=True
+        ),
         must_exist(
             f"{node}.firmware.locations",
             is_type_of=list,
@@ -255,6 +343,17 @@ def sensor_node_validators() -> list[Validator]:
             "sensor_node.power.streaming.tolerance",
             is_type_of=Real,
         ),
+        must_exist(
+            "sensor_node.streaming.maximum_loss",
+            is_type_of=Real,
+            gte=0,
+            lte=1,
+        ),
+        must_exist(
+            "sensor_node.streaming.minimum_sample_rate",
+            is_type_of=Real,
+            gte=0,
+        ),
         must_exist(
             "sensor_node.bluetooth.advertisement_time_1",
             "sensor_node.bluetooth.advertisement_time_2",
@@ -274,7 +373,57 @@ def stu_validators() -> list[Validator]:
 def sth_validators() -> list[Validator]:
     """Return list of validators for config data below key `sth`"""
 
-    validators = []
+    validators = [
+        Validator(
+            "sth.triple_axis.acquisition",
+            is_type_of=str,
+            is_in=("simultaneous", "sequential"),
+            default="simultaneous",
+        ),
+        must_exist(
+            "sth.triple_axis.zero_point",
+            "sth.triple_axis.sensitivity",
+            "sth.backpack.tolerance",
+            is_type_of=Real,
+        ),
+    ] + [
+        must_exist(
+            name,
+            is_type_of=list,
+            len_eq=3,
+            condition=partial(element_is_type, name=name, element_type=Real),
+        )
+        for name in (
+            "sth.backpack.maximum",
+            "sth.backpack.ratio_noise_to_max_value",
+        )
+    ]
+    validators.extend([
+        Validator(
+            "sth.adaptive_acquisition.enabled", is_type_of=bool, default=False
+        ),
+        Validator(
+            "sth.recording.mode",
+            is_type_of=str,
+            is_in=("disabled", "record", "replay"),
+            default="disabled",
+        ),
+        Validator(
+            "sth.recording.directory", is_type_of=str, default="recordings"
+        ),
+        Validator(
+            "sth.adaptive_acquisition.block_size",
+            is_type_of=int,
+            gt=0,
+            default=1000,
+        ),
+        Validator(
+            "sth.adaptive_acquisition.confidence",
+            is_type_of=Real,
+            gt=0,
+            default=3,
+        ),
+    ])
     for sensor in ("ADXL1001", "ADXL1002", "ADXL356"):
         validators.extend(acceleration_sensor_validators(sensor))
 
@@ -320,6 +469,9 @@ class ConfigurationUtility:
     user_config_filepath = (
         Path(user_config_dir(app_name, appauthor=app_author)) / config_filename
     )
+    snapshot_filepath = (
+        Path(user_cache_dir(app_name, appauthor=app_author)) / "config.pickle"
+    )
 
     @staticmethod
     def open_config_file(filepath: Path):
@@ -373,6 +525,12 @@ class SettingsIncorrectError(Exception):
 class Settings(Dynaconf):
     """Small extension of the settings object for our purposes
 
+    The object stores the merged and validated settings in a snapshot. The
+    snapshot does not contain the values of the environment variables in
+    ``run_variables``, since these values usually change for every test
+    run (e.g. ``icotest run -n <name>``). Instead the object applies and
+    validates these values after it loaded the snapshot.
+
     Args:
 
         default_settings_filepath:
@@ -392,8 +550,20 @@ class Settings(Dynaconf):
 
             All keyword arguments
 
+    Attributes:
+
+        run_variables:
+            Environment variables that only change the settings of a single
+            run
+
     """
 
+    run_variables = (
+        "DYNACONF_SENSOR_NODE__NAME",
+        "DYNACONF_STH__RECORDING__MODE",
+        "DYNACONF_STH__RECORDING__DIRECTORY",
+    )
+
     def __init__(
         self,
         default_settings_filepath: Path,
@@ -411,25 +581,212 @@ class Settings(Dynaconf):
             ConfigurationUtility.user_config_filepath,
         ] + settings_files
 
-        super().__init__(
-            settings_files=settings_files,
-            *arguments,
-            **keyword_arguments,
-        )
-        self.validate_settings()
+        key = self.snapshot_key(settings_files)
+        snapshot = self.load_snapshot(key)
+        if snapshot is not None:
+            # The snapshot already contains the merged and validated settings
+            super().__init__(*arguments, **keyword_arguments)
+            self.update(snapshot)
+        else:
+            # Store the settings without the values of the current run
+            run_values = {
+                name: environ.pop(name)
+                for name in self.run_variables
+                if name in environ
+            }
+            try:
+                super().__init__(
+                    settings_files=settings_files,
+                    *arguments,
+                    **keyword_arguments,
+                )
+                self.validate_settings()
+            finally:
+                environ.update(run_values)
+            self.store_snapshot(key)
+
+        self.apply_run_variables()
 
-    def validate_settings(self) -> None:
-        """Check settings for errors"""
+    @staticmethod
+    def snapshot_key(settings_files: list) -> str:
+        """Get the key that identifies the settings for certain input files
 
-        self.validators.register(
-            *commands_validators(),
-            *sensor_node_validators(),
-            *sth_validators(),
-            *stu_validators(),
-        )
+        The key depends on the content of the given settings files (and their
+        local variants), the Dynaconf environment variables (except
+        ``run_variables``) and the code of the validators.
+
+        Args:
+
+            settings_files:
+
+                A list containing setting files in ascending order according
+                to importance (most important last)
+
+        Returns:
+
+            A hexadecimal digest that changes, if any of the inputs that
+            influence the settings change
+
+        Examples:
+
+            Import required library code
+
+            >>> from tempfile import TemporaryDirectory
+
+            The key changes, if the content of a settings file changes
+
+            >>> with TemporaryDirectory() as directory:
+            ...     filepath = Path(directory) / "config.yaml"
+            ...     _ = filepath.write_text("name: Test-STH")
+            ...     key = Settings.snapshot_key([filepath])
+            ...     same_key = Settings.snapshot_key([filepath])
+            ...     _ = filepath.write_text("name: Another-STH")
+            ...     other_key = Settings.snapshot_key([filepath])
+            >>> key == same_key
+            True
+            >>> key == other_key
+            False
+
+            The key does not depend on the values of a single test run
+
+            >>> from unittest.mock import patch
+            >>> with patch.dict(environ, DYNACONF_SENSOR_NODE__NAME="STH"):
+            ...     run_key = Settings.snapshot_key([])
+            >>> run_key == Settings.snapshot_key([])
+            True
+
+        """
+
+        digest = sha256(Path(__file__).read_bytes())
+        for settings_file in settings_files:
+            filepath = Path(settings_file)
+            local_filepath = filepath.with_suffix(f".local{filepath.suffix}")
+            for path in (filepath, local_filepath):
+                digest.update(f"\0{path}\0".encode())
+                try:
+                    digest.update(path.read_bytes())
+                except OSError:
+                    digest.update(b"\0missing")
+
+        for name in sorted(environ):
+            if "DYNACONF" in name and name not in Settings.run_variables:
+                digest.update(f"\0{name}={environ[name]}".encode())
+
+        return digest.hexdigest()
+
+    @staticmethod
+    def load_snapshot(key: str) -> dict[str, Any] | None:
+        """Load validated settings from the snapshot cache
+
+        Args:
+
+            key:
+
+                The key that identifies the settings
+
+        Returns:
+
+            The stored settings, if the cache contains a snapshot for the
+            given key or ``None`` otherwise
+
+        """
 
         try:
-            self.validators.validate()
+            snapshot = loads(
+                ConfigurationUtility.snapshot_filepath.read_bytes()
+            )
+            if snapshot["key"] == key:
+                return snapshot["settings"]
+        except (
+            OSError,
+            EOFError,
+            PickleError,
+            AttributeError,
+            ImportError,
+            KeyError,
+            TypeError,
+            ValueError,
+        ):
+            pass
+
+        return None
+
+    def store_snapshot(self, key: str) -> None:
+        """Store the (validated) settings in the snapshot cache
+
+        Args:
+
+            key:
+
+                The key that identifies the settings
+
+        """
+
+        filepath = ConfigurationUtility.snapshot_filepath
+        # Write to a temporary file first, so that other processes never read
+        # an incomplete snapshot
+        temporary_filepath = filepath.with_suffix(f".{getpid()}.tmp")
+        try:
+            filepath.parent.mkdir(parents=True, exist_ok=True)
+            temporary_filepath.write_bytes(
+                dumps(
+                    {"key": key, "settings": self.as_dict()},
+                    protocol=HIGHEST_PROTOCOL,
+                )
+            )
+            temporary_filepath.replace(filepath)
+        except (OSError, PickleError):
+            temporary_filepath.unlink(missing_ok=True)
+
+    def apply_run_variables(self) -> None:
+        """Apply and check the settings of the current run"""
+
+        keys = []
+        for name in self.run_variables:
+            value = environ.get(name)
+            if value is None:
+                continue
+            key = name.removeprefix("DYNACONF_").replace("__", ".").lower()
+            self.set(
+                key,
+                parse_conf_data(
+                    boolean_fix(value), tomlfy=True, box_settings=self
+                ),
+            )
+            keys.append(key)
+
+        if keys:
+            self.validate_settings(only=keys)
+
+    def validate_settings(self, only: Sequence[str] | None = None) -> None:
+        """Check settings for errors
+
+        Args:
+
+            only:
+
+                The names of the settings that should be checked; ``None``
+                means that all settings should be checked
+
+        Raises:
+
+            SettingsIncorrectError:
+
+                If the settings are incorrect
+
+        """
+
+        if not self.validators:
+            self.validators.register(
+                *commands_validators(),
+                *retry_validators(),
+                *sensor_node_validators(),
+                *sth_validators(),
+                *stu_validators(),
+            )
+
+        try:
+            self.validators.validate(only=only)
         except ValidationError as error:
             raise SettingsIncorrectError(
                 f"Incorrect configuration: {error}"
@@ -463,3 +820,6 @@ with as_file(
         handle_incorrect_settings(
             f"Unable to parse configuration: {parsing_error}"
         )
+
+limits = Limits.from_settings(settings)
+"""Test limits based on the current configuration"""
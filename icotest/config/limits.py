@@ -0,0 +1,303 @@
+"""Precomputed test limits based on the configuration"""
+
+# -- Imports ------------------------------------------------------------------
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from dynaconf.utils.boxing import DynaBox
+
+if TYPE_CHECKING:
+    from icotest.config.config import Settings
+
+# -- Classes ------------------------------------------------------------------
+
+
+@dataclass(frozen=True, slots=True)
+class Window:
+    """Range of allowed values (including the limits)
+
+    Attributes:
+
+        minimum:
+            The minimum allowed value
+
+        maximum:
+            The maximum allowed value
+
+    Examples:
+
+        Create a window based on an expected value and a tolerance
+
+        >>> window = Window.from_tolerance(3.6, 0.5)
+        >>> window
+        Window(minimum=3.1, maximum=4.1)
+
+        Check if values are inside the window
+
+        >>> 3.1 in window
+        True
+        >>> 4.2 in window
+        False
+
+    """
+
+    minimum: float
+    maximum: float
+
+    @classmethod
+    def from_tolerance(cls, expected: float, tolerance: float) -> Window:
+        """Create a window from an expected value and a tolerance
+
+        Args:
+
+            expected:
+
+                The expected value (center of the window)
+
+            tolerance:
+
+                The maximum allowed difference to the expected value
+
+        Returns:
+
+            A window that contains all values that differ at most
+            ``tolerance`` from the expected value
+
+        """
+
+        return cls(
+            minimum=float(expected - tolerance),
+            maximum=float(expected + tolerance),
+        )
+
+    def __contains__(self, value: float) -> bool:
+        """Check if a value is inside the window
+
+        Args:
+
+            value:
+
+                The value that should be checked
+
+        Returns:
+
+            ``True``, if the value is inside the window, ``False`` otherwise
+
+        """
+
+        return self.minimum <= value <= self.maximum
+
+
+@dataclass(frozen=True, slots=True)
+class PowerLimits:
+    """Allowed power usage of the different sensor node states in mW
+
+    Attributes:
+
+        disconnected:
+            The allowed power usage without Bluetooth connection
+
+        connected:
+            The allowed power usage while connected (but not streaming)
+
+        streaming:
+            The allowed power usage while streaming
+
+    """
+
+    disconnected: Window
+    connected: Window
+    streaming: Window
+
+
+@dataclass(frozen=True, slots=True)
+class StreamingLimits:
+    """Limits for the data streams of the sensor node
+
+    Attributes:
+
+        loss:
+            The maximum allowed ratio of lost streaming messages
+
+        sample_rate:
+            The minimum allowed number of values per channel and second
+
+    """
+
+    loss: float
+    sample_rate: float
+
+
+@dataclass(frozen=True, slots=True)
+class Band:
+    """Noise limit for a frequency band
+
+    Attributes:
+
+        minimum:
+            The lower limit of the frequency band in Hz
+
+        maximum:
+            The upper limit of the frequency band in Hz
+
+        noise_ratio:
+            The maximum allowed ratio of the noise in the frequency band to
+            the maximum measurement value in dB
+
+    """
+
+    minimum: float
+    maximum: float
+    noise_ratio: float
+
+
+@dataclass(frozen=True, slots=True)
+class AccelerationLimits:
+    """Limits for the currently selected acceleration sensor
+
+    Attributes:
+
+        sensor:
+            The name of the acceleration sensor e.g. “ADXL1001”
+
+        acceleration:
+            The allowed stationary acceleration in multiples of g₀
+
+        noise_ratio:
+            The maximum allowed ratio of noise to maximum measurement value
+            in dB
+
+        self_test_voltage:
+            The allowed difference between the acceleration voltage with
+            and without active self test in mV
+
+        self_test_drift:
+            The maximum allowed difference between the acceleration voltage
+            before and after the self test in mV
+
+        bands:
+            The noise limits for different frequency bands (spectral mask)
+
+        spur_threshold:
+            The maximum allowed level of a spur above the noise floor of the
+            power spectral density in dB
+
+    """
+
+    sensor: str
+    acceleration: Window
+    noise_ratio: float
+    self_test_voltage: Window
+    self_test_drift: float
+    bands: tuple[Band, ...]
+    spur_threshold: float
+
+
+@dataclass(frozen=True, slots=True)
+class Limits:
+    """Test limits computed from the configuration
+
+    Attributes:
+
+        supply_voltage:
+            The allowed supply voltage of the sensor node in V
+
+        power:
+            The allowed power usage of the sensor node
+
+        streaming:
+            The limits for the data streams of the sensor node
+
+        acceleration:
+            The limits for the acceleration sensor of the STH
+
+    Examples:
+
+        Import required library code
+
+        >>> from icotest.config import settings
+
+        Compute the limits from the configuration
+
+        >>> limits = Limits.from_settings(settings)
+        >>> isinstance(limits.supply_voltage, Window)
+        True
+        >>> limits.power.streaming.minimum <= limits.power.streaming.maximum
+        True
+
+        The limits can not be changed
+
+        >>> limits.power = None # doctest: +IGNORE_EXCEPTION_DETAIL
+        Traceback (most recent call last):
+           ...
+        FrozenInstanceError: cannot assign to field 'power'
+
+    """
+
+    supply_voltage: Window
+    power: PowerLimits
+    streaming: StreamingLimits
+    acceleration: AccelerationLimits
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> Limits:
+        """Compute the test limits from the configuration
+
+        Args:
+
+            settings:
+
+                The settings object (``icotest.config.settings``)
+
+        Returns:
+
+            The limits for the current configuration
+
+        """
+
+        sensor_node = settings.sensor_node
+        power = sensor_node.power
+
+        def window(values: DynaBox) -> Window:
+            return Window.from_tolerance(values.average, values.tolerance)
+
+        sensor = settings.acceleration_sensor()
+        self_test_voltage = sensor.self_test.voltage
+
+        return cls(
+            supply_voltage=window(sensor_node.supply.voltage),
+            power=PowerLimits(
+                disconnected=window(power.disconnected),
+                connected=window(power.connected),
+                streaming=window(power.streaming),
+            ),
+            streaming=StreamingLimits(
+                loss=float(sensor_node.streaming.maximum_loss),
+                sample_rate=float(sensor_node.streaming.minimum_sample_rate),
+            ),
+            acceleration=AccelerationLimits(
+                sensor=settings.sth.acceleration_sensor.sensor,
+                acceleration=Window.from_tolerance(
+                    0, sensor.acceleration.tolerance
+                ),
+                noise_ratio=float(
+                    sensor.acceleration.ratio_noise_to_max_value
+                ),
+                self_test_voltage=Window.from_tolerance(
+                    self_test_voltage.difference, self_test_voltage.tolerance
+                ),
+                self_test_drift=float(self_test_voltage.tolerance),
+                bands=tuple(
+                    Band(
+                        minimum=float(band.minimum),
+                        maximum=float(band.maximum),
+                        noise_ratio=float(band.ratio_noise_to_max_value),
+                    )
+                    for band in sensor.spectrum.bands
+                ),
+                spur_threshold=float(sensor.spectrum.spur_threshold),
+            ),
+        )
@@ -3,12 +3,42 @@
 # -- Imports ------------------------------------------------------------------
 
 from logging import getLogger
+from pathlib import Path
+from typing import AsyncIterator, cast
+from weakref import WeakKeyDictionary
 
-from pytest import fixture
+from _pytest.doctest import DoctestItem
+from pytest import (
+    Config,
+    exit as pytest_exit,
+    fixture,
+    FixtureRequest,
+    hookimpl,
+    Item,
+    Metafunc,
+    Session,
+)
 from icotronic.can import Connection, SensorNode, STH, STU
 from netaddr import EUI
 
+from icotest.cli.commander import (
+    AsyncCommander,
+    CommanderException,
+    commander_info,
+)
+from icotest.cli.station import station_key
 from icotest.config import settings
+from icotest.test.support.connection import ConnectionPool
+from icotest.test.support.node import NodeSnapshot, query_node, status_queries
+from icotest.test.support.power import PowerTrace, power_trace_key
+from icotest.test.support.recording import RecordingNode, ReplayNode
+from icotest.test.support.retry import RetryPolicy
+from icotest.test.support.scheduler import (
+    Configuration,
+    NodeConfigurator,
+    restore_key,
+    schedule,
+)
 
 # for renaming the output files
 import datetime
@@ -36,47 +66,318 @@ def sensor_node_name() -> str:
 
 
 @fixture(scope="session")
-async def sensor_node_mac_address(sensor_node_name: str) -> EUI:
-    """Return the MAC address of the sensor node used for the test"""
+async def connection_pool() -> AsyncIterator[ConnectionPool]:
+    """Reuse the connections to the STU and sensor node across tests"""
+
+    async with ConnectionPool() as pool:
+        yield pool
+
 
-    async with Connection() as stu:
-        async with stu.connect_sensor_node(sensor_node_name) as sensor_node:
-            return await sensor_node.get_mac_address()
+def fresh_connection(request: FixtureRequest) -> bool:
+    """Check if a test requires its own connections (marker)"""
+
+    return request.node.get_closest_marker("fresh_connection") is not None
 
 
 @fixture
-async def stu() -> STU:
-    """Connect to and disconnect from STU"""
+async def stu(
+    request: FixtureRequest, connection_pool: ConnectionPool
+) -> AsyncIterator[STU]:
+    """Get connection to STU"""
+
+    if fresh_connection(request):
+        await connection_pool.close()
+        async with Connection() as stu:
+            yield stu
+    else:
+        if request.node.get_closest_marker("disconnected_sensor_node"):
+            await connection_pool.release_sensor_node()
+        yield await connection_pool.stu()
+
+
+@fixture
+async def sensor_node_identifier(
+    request: FixtureRequest, stu: STU, sensor_node_name: str
+) -> str | EUI:
+    """Returns the identifier used to connect to the sensor node
+
+    In station mode this fixture waits for the next sensor node and returns
+    its MAC address. Otherwise it returns the configured sensor node name.
+
+    """
+
+    station = request.config.stash.get(station_key, None)
+    if station is None:
+        return sensor_node_name
+
+    return await station.sensor_node_address(stu)
+
+
+@fixture(scope="session")
+async def sensor_node_mac_address(
+    connection_pool: ConnectionPool, sensor_node_name: str
+) -> EUI:
+    """Return the MAC address of the sensor node used for the test"""
+
+    sensor_node = await connection_pool.sensor_node(sensor_node_name)
+    return await sensor_node.get_mac_address()
+
 
-    async with Connection() as stu:
-        yield stu
+async def connect_sensor_node(
+    request: FixtureRequest,
+    stu: STU,
+    connection_pool: ConnectionPool,
+    identifier: str | EUI,
+    sensor_node_class: type[SensorNode],
+) -> AsyncIterator[SensorNode]:
+    """Get connection to sensor node (from pool or dedicated)"""
+
+    if fresh_connection(request):
+        async with stu.connect_sensor_node(
+            identifier, sensor_node_class
+        ) as sensor_node:
+            yield sensor_node
+    else:
+        yield await connection_pool.sensor_node(identifier, sensor_node_class)
 
 
 @fixture
-async def sensor_node(stu, sensor_node_name) -> SensorNode:
-    """Connect to and disconnect from sensor node"""
+async def sensor_node(
+    request, stu, connection_pool, sensor_node_identifier
+) -> AsyncIterator[SensorNode]:
+    """Get connection to sensor node"""
 
-    async with stu.connect_sensor_node(sensor_node_name) as sensor_node:
+    async for sensor_node in connect_sensor_node(
+        request, stu, connection_pool, sensor_node_identifier, SensorNode
+    ):
         yield sensor_node
 
 
+@fixture(scope="session")
+def node_configurator() -> NodeConfigurator:
+    """Keep track of the channel configuration of the sensor nodes"""
+
+    return NodeConfigurator()
+
+
+@fixture
+async def sth(
+    request, stu, connection_pool, sensor_node_identifier, node_configurator
+) -> AsyncIterator[STH]:
+    """Get connection to an STH
+
+    The fixture changes the channel configuration of the STH to the one
+    specified by the marker ``node_configuration`` of the test.
+
+    """
+
+    recording = settings.sth.recording
+    async for sth in connect_sensor_node(
+        request, stu, connection_pool, sensor_node_identifier, STH
+    ):
+        assert isinstance(sth, STH)
+        node = (
+            cast(
+                STH,
+                RecordingNode(
+                    sth, Path(recording.directory) / request.node.name
+                ),
+            )
+            if recording.mode == "record"
+            else sth
+        )
+        await node_configurator.apply(
+            sth, Configuration.of(request.node), node
+        )
+        yield node
+        if request.node.stash.get(restore_key, False):
+            await node_configurator.restore(sth, node)
+
+
+@fixture(scope="session")
+def node_snapshots() -> WeakKeyDictionary[STU | SensorNode, NodeSnapshot]:
+    """Cache the status snapshot of every node connection"""
+
+    return WeakKeyDictionary()
+
+
 @fixture
-async def sth(stu, sensor_node_name) -> STH:
-    """Connect to and disconnect from an STH"""
+async def sensor_node_status(
+    sensor_node: SensorNode,
+    node_snapshots: WeakKeyDictionary[STU | SensorNode, NodeSnapshot],
+    record_property,
+) -> NodeSnapshot:
+    """Get the status values of the connected sensor node
+
+    The fixture retrieves all status values at once and then reuses them for
+    all tests that use the same connection to the sensor node.
+
+    """
+
+    snapshot = node_snapshots.get(sensor_node)
+    if snapshot is None:
+        snapshot = await query_node(status_queries(sensor_node))
+        node_snapshots[sensor_node] = snapshot
+        record_property("status latency", snapshot.metrics())
+
+    return snapshot
+
+
+@fixture(scope="session")
+async def power_trace(request: FixtureRequest) -> AsyncIterator[PowerTrace]:
+    """Measure the power usage continuously during the whole test session"""
+
+    async with PowerTrace(AsyncCommander()) as trace:
+        request.config.stash[power_trace_key] = trace
+        yield trace
+        del request.config.stash[power_trace_key]
+
+
+@fixture
+async def idle_debug_adapter(request: FixtureRequest) -> AsyncIterator[None]:
+    """Pause the continuous power measurement during the test
+
+    The power measurement occupies the debug adapter, which the firmware
+    upload requires. In station mode the measurement of the previous unit
+    is still running, when the firmware upload of the next unit starts.
+
+    """
+
+    trace = request.config.stash.get(power_trace_key, None)
+    if trace is None:
+        yield
+    else:
+        async with trace.paused():
+            yield
+
+
+def replay_mode() -> bool:
+    """Check if the tests use recorded streaming data instead of an STH"""
+
+    return settings.sth.recording.mode == "replay"
+
+
+def pytest_generate_tests(metafunc: Metafunc) -> None:
+    """Replace the STH with recorded streaming data in replay mode"""
+
+    if not replay_mode() or "sth" not in metafunc.fixturenames:
+        return
+
+    directory = Path(settings.sth.recording.directory)
+    metafunc.parametrize(
+        "sth",
+        [ReplayNode(directory / metafunc.function.__name__)],
+        ids=["replay"],
+    )
+
+
+@hookimpl(trylast=True)
+def pytest_collection_modifyitems(config: Config, items: list[Item]) -> None:
+    """Order the tests and only keep STH tests (and doctests) in replay mode
+
+    The hook runs after all other implementations, so the order only
+    contains the tests that will actually run (e.g. after the deselection
+    via ``-k``).
+
+    """
+
+    if replay_mode():
+        deselected = [
+            item
+            for item in items
+            if not isinstance(item, DoctestItem)
+            and "sth" not in getattr(item, "fixturenames", ())
+        ]
+        if deselected:
+            config.hook.pytest_deselected(items=deselected)
+            items[:] = [item for item in items if item not in deselected]
+
+    items[:] = schedule(items)
+
+
+def requires_commander(item: Item) -> bool:
+    """Check if a test uses Simplicity Commander
+
+    Tests use Simplicity Commander to upload firmware (marker ``commander``)
+    or to measure the power usage (fixture ``power_trace``).
+
+    """
+
+    marker = item.get_closest_marker("commander")
+    return marker is not None or "power_trace" in getattr(
+        item, "fixturenames", ()
+    )
+
+
+def pytest_collection_finish(session: Session) -> None:
+    """Check that Simplicity Commander is available before any test starts
+
+    The session only stops, if one of the selected tests uses Simplicity
+    Commander. Otherwise a missing Simplicity Commander installation only
+    causes a warning.
+
+    """
+
+    if (
+        session.config.option.collectonly
+        or replay_mode()
+        or all(isinstance(item, DoctestItem) for item in session.items)
+    ):
+        return
+
+    try:
+        info = commander_info()
+    except CommanderException as error:
+        if any(requires_commander(item) for item in session.items):
+            pytest_exit(f"Pre-flight check failed: {error}", returncode=1)
+        getLogger().warning("Simplicity Commander is not available: %s", error)
+        return
 
-    async with stu.connect_sensor_node(sensor_node_name, STH) as sth:
-        yield sth
+    getLogger().info(
+        "Using Simplicity Commander %s (%s)", info.version, info.executable
+    )
 
 
 def pytest_configure(config):
+    config.addinivalue_line(
+        "markers",
+        "fresh_connection: use dedicated STU and sensor node connections "
+        "instead of the connection pool",
+    )
+    config.addinivalue_line(
+        "markers",
+        "disconnected_sensor_node: disconnect the pooled sensor node, but "
+        "keep the pooled STU connection",
+    )
+    config.addinivalue_line(
+        "markers",
+        "commander: the test requires Simplicity Commander (e.g. to upload "
+        "firmware)",
+    )
+    config.addinivalue_line(
+        "markers",
+        "node_configuration(adc=None, sensors=None): ADC configuration "
+        "(arguments of `set_adc_configuration`) and sensor configuration "
+        "the STH should use for the test",
+    )
+    retry = settings.retry
+    config.pluginmanager.register(
+        RetryPolicy(
+            transient=retry.transient,
+            other=retry.other,
+            delay=retry.delay,
+            maximum_delay=retry.maximum_delay,
+        ),
+        "retry policy",
+    )
     if config.getoption("--json-report", default=False):
         # create a report folder if tht is not yet the case
-        if not os.path.exists('reports'):
-            os.makedirs('reports')
+        if not os.path.exists("reports"):
+            os.makedirs("reports")
 
         # generate a time dependent report name
         timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M")
         report_name = f"reports/hardware_test_{timestamp}.json"
 
         # set the path for the plugin
-        config.option.json_report_file = report_name
\ No newline at end of file
+        config.option.json_report_file = report_name
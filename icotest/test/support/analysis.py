@@ -0,0 +1,437 @@
+"""Analyze acceleration data of multiple channels at once"""
+
+# -- Imports ------------------------------------------------------------------
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+from typing import NamedTuple
+
+from icotronic.measurement.constants import ADC_MAX_VALUE
+
+import numpy as np
+
+# -- Classes ------------------------------------------------------------------
+
+
+class Conversion(NamedTuple):
+    """Linear conversion of raw ADC values into multiples of g₀
+
+    The conversion uses the formula
+
+    ``acceleration = (raw value - zero point) · sensitivity``
+
+    Attributes:
+
+        zero_point:
+            The raw ADC value that represents an acceleration of 0 g₀
+
+        sensitivity:
+            The acceleration in multiples of g₀ per ADC step
+
+    Examples:
+
+        Convert raw values of a ± 100 g₀ sensor
+
+        >>> conversion = Conversion.from_maximum(200)
+        >>> conversion(ADC_MAX_VALUE)
+        100.0
+        >>> conversion(np.array([0, ADC_MAX_VALUE / 2]))
+        array([-100.,    0.])
+
+    """
+
+    zero_point: float
+    sensitivity: float
+
+    @classmethod
+    def from_maximum(cls, maximum: float) -> Conversion:
+        """Create a conversion for a sensor that uses the whole ADC range
+
+        Args:
+
+            maximum:
+
+                The measurement range of the sensor in multiples of g₀ (e.g.
+                200 for a ± 100 g₀ sensor)
+
+        Returns:
+
+            A conversion that maps the ADC range to ``± maximum/2``
+
+        """
+
+        return cls(
+            zero_point=ADC_MAX_VALUE / 2, sensitivity=maximum / ADC_MAX_VALUE
+        )
+
+    def __call__(self, raw: float | np.ndarray) -> float | np.ndarray:
+        """Convert raw ADC values into multiples of g₀
+
+        Args:
+
+            raw:
+
+                A single raw value or an array of raw values
+
+        Returns:
+
+            The acceleration in multiples of g₀
+
+        """
+
+        return (raw - self.zero_point) * self.sensitivity
+
+
+class ChannelStatistics(NamedTuple):
+    """Statistics of the acceleration data of a single channel
+
+    Attributes:
+
+        mean:
+            The mean acceleration in multiples of g₀
+
+        rms:
+            The RMS noise (standard deviation) in multiples of g₀
+
+        noise_ratio:
+            The ratio of the RMS noise to the maximum measurement value (half
+            the ADC range) in dB
+
+        minimum:
+            The minimum acceleration in multiples of g₀
+
+        maximum:
+            The maximum acceleration in multiples of g₀
+
+        drift:
+            The difference between the mean acceleration of the second and
+            first half of the measurement in multiples of g₀
+
+    """
+
+    mean: float
+    rms: float
+    noise_ratio: float
+    minimum: float
+    maximum: float
+    drift: float
+
+
+# -- Functions ----------------------------------------------------------------
+
+
+def analyze(
+    values: np.ndarray, conversions: Sequence[Conversion]
+) -> list[ChannelStatistics]:
+    """Calculate statistics for the acceleration data of multiple channels
+
+    Args:
+
+        values:
+
+            The raw ADC values; either a one dimensional array for a single
+            channel or a two dimensional array with one row per channel
+
+        conversions:
+
+            The conversion into multiples of g₀ for every channel
+
+    Returns:
+
+        The statistics of every channel
+
+    Raises:
+
+        ValueError:
+
+            If the number of conversions does not match the number of
+            channels, or if there are no values
+
+    Examples:
+
+        Analyze the data of two channels
+
+        >>> values = np.array([[0, ADC_MAX_VALUE, 0, ADC_MAX_VALUE],
+        ...                    [1, 2, 3, 4]])
+        >>> first, second = analyze(values, [Conversion.from_maximum(200),
+        ...                                  Conversion(0, 1)])
+        >>> first.mean, first.rms, first.minimum, first.maximum
+        (0.0, 100.0, -100.0, 100.0)
+        >>> round(first.noise_ratio, 6)
+        0.0
+        >>> second.mean, second.drift
+        (2.5, 2.0)
+
+        Analyze the data of a single channel
+
+        >>> analyze(np.full(10, 100), [Conversion(100, 2)])
+        ... # doctest: +NORMALIZE_WHITESPACE
+        [ChannelStatistics(mean=0.0, rms=0.0, noise_ratio=-inf, minimum=0.0,
+                           maximum=0.0, drift=0.0)]
+
+    """
+
+    values = np.atleast_2d(values)
+    channels, samples = values.shape
+    if len(conversions) != channels:
+        raise ValueError(
+            f"Number of conversions ({len(conversions)}) does not match "
+            f"number of channels ({channels})"
+        )
+    if samples <= 0:
+        raise ValueError("Unable to analyze empty measurement data")
+
+    zero_point = np.array(
+        [conversion.zero_point for conversion in conversions]
+    )
+    sensitivity = np.array(
+        [conversion.sensitivity for conversion in conversions]
+    )
+
+    mean = values.mean(axis=1)
+    deviation = values.std(axis=1)
+    minimum = values.min(axis=1)
+    maximum = values.max(axis=1)
+    half = samples // 2
+    drift = (
+        values[:, half:].mean(axis=1) - values[:, :half].mean(axis=1)
+        if half > 0
+        else np.zeros(channels)
+    )
+    with np.errstate(divide="ignore"):
+        noise_ratio = 20 * np.log10(deviation / (ADC_MAX_VALUE / 2))
+
+    limits = np.sort(
+        [
+            (minimum - zero_point) * sensitivity,
+            (maximum - zero_point) * sensitivity,
+        ],
+        axis=0,
+    )
+
+    return [
+        ChannelStatistics(*map(float, statistics))
+        for statistics in zip(
+            (mean - zero_point) * sensitivity,
+            deviation * np.abs(sensitivity),
+            noise_ratio,
+            limits[0],
+            limits[1],
+            drift * sensitivity,
+        )
+    ]
+
+
+class RunningStatistics:
+    """Update the mean and variance of multiple channels block by block
+
+    The class uses the parallel variant of Welford’s algorithm to combine
+    the statistics of a new block of values with the statistics of all
+    previous values.
+
+    Args:
+
+        channels:
+
+            The number of channels
+
+    Examples:
+
+        Calculate the statistics of two channels in two blocks
+
+        >>> statistics = RunningStatistics(channels=2)
+        >>> statistics.update(np.array([[1, 2], [10, 10]]))
+        >>> statistics.update(np.array([[3, 4, 5], [10, 10, 10]]))
+        >>> statistics.count
+        5
+        >>> statistics.mean
+        array([ 3., 10.])
+        >>> statistics.variance
+        array([2., 0.])
+
+    """
+
+    def __init__(self, channels: int) -> None:
+
+        self.count = 0
+        self.mean = np.zeros(channels)
+        self.m2 = np.zeros(channels)
+
+    def update(self, values: np.ndarray) -> None:
+        """Add a block of values
+
+        Args:
+
+            values:
+
+                A two dimensional array with one row of values per channel
+
+        """
+
+        values = np.atleast_2d(values)
+        count = values.shape[1]
+        if count <= 0:
+            return
+
+        mean = values.mean(axis=1)
+        m2 = np.square(values - mean[:, np.newaxis]).sum(axis=1)
+
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean = self.mean + delta * count / total
+        self.m2 = self.m2 + m2 + np.square(delta) * self.count * count / total
+        self.count = total
+
+    @property
+    def variance(self) -> np.ndarray:
+        """Get the (population) variance of every channel
+
+        Returns:
+
+            The variance of the values of every channel
+
+        """
+
+        return self.m2 / self.count if self.count > 0 else self.m2
+
+    def noise_ratio(self, confidence: float = 0) -> np.ndarray:
+        """Get the ratio of noise to maximum measurement value in dB
+
+        Args:
+
+            confidence:
+
+                The number of standard errors that should be added to the
+                noise ratio (negative values subtract the standard error).
+                The standard error assumes independent values.
+
+        Returns:
+
+            The noise ratio of every channel (shifted by the given number of
+            standard errors)
+
+        Examples:
+
+            Import required library code
+
+            >>> from icotronic.measurement import ratio_noise_max
+
+            The noise ratio matches the one calculated by ICOtronic
+
+            >>> values = [32000, 32010, 31990, 32005, 31995]
+            >>> statistics = RunningStatistics(channels=1)
+            >>> statistics.update(np.array(values))
+            >>> bool(np.isclose(statistics.noise_ratio()[0],
+            ...                 ratio_noise_max(values)))
+            True
+
+            The confidence interval gets smaller with more values
+
+            >>> upper = statistics.noise_ratio(confidence=3)[0]
+            >>> statistics.update(np.tile(values, 100))
+            >>> bool(upper > statistics.noise_ratio(confidence=3)[0])
+            True
+
+        """
+
+        # The standard error of the logarithm of the standard deviation is
+        # about 1/√(2(n-1)) (for normally distributed values)
+        error = 20 / np.log(10) / np.sqrt(2 * max(self.count - 1, 1))
+        with np.errstate(divide="ignore"):
+            ratio = 10 * np.log10(self.variance / (ADC_MAX_VALUE / 2) ** 2)
+        return ratio + confidence * error
+
+
+class EarlyStopping:  # pylint: disable=too-few-public-methods
+    """Stop a noise measurement as soon as the result is clear
+
+    An object of this class analyzes the collected values block by block.
+    Calling the object returns ``True``, as soon as the confidence interval
+    of the noise ratio of every channel is below the limit (pass) or the
+    interval of at least one channel is above the limit (fail).
+
+    Args:
+
+        limits:
+
+            The maximum allowed noise ratio in dB for every channel
+
+        block_size:
+
+            The number of values per channel that should be analyzed at once
+
+        confidence:
+
+            The half width of the confidence interval in standard errors
+
+    Examples:
+
+        Import required library code
+
+        >>> from numpy.random import default_rng
+
+        Stop after the first block, if the noise is clearly too high
+
+        >>> noisy = default_rng(1).normal(32768, 1000, (1, 5000))
+        >>> stop = EarlyStopping([-60], block_size=1000)
+        >>> stop(noisy[:, :999])
+        False
+        >>> stop(noisy[:, :1000])
+        True
+        >>> stop.passed
+        False
+
+        Stop after the first block, if the noise is clearly low enough
+
+        >>> quiet = default_rng(1).normal(32768, 10, (1, 5000))
+        >>> stop = EarlyStopping([-60], block_size=1000)
+        >>> stop(quiet[:, :1000]), stop.passed
+        (True, True)
+
+    """
+
+    def __init__(
+        self,
+        limits: Sequence[float],
+        block_size: int = 1000,
+        confidence: float = 3,
+    ) -> None:
+
+        self.limits = np.array(limits, dtype=float)
+        self.block_size = block_size
+        self.confidence = confidence
+        self.statistics = RunningStatistics(channels=len(self.limits))
+        self.passed: bool | None = None
+
+    def __call__(self, values: np.ndarray) -> bool:
+        """Check if the measurement can be stopped
+
+        Args:
+
+            values:
+
+                All values collected so far (one row per channel)
+
+        Returns:
+
+            ``True``, if the noise ratio is clearly above or below the limit,
+            ``False`` otherwise
+
+        """
+
+        values = np.atleast_2d(values)
+        analyzed = self.statistics.count
+        if values.shape[1] - analyzed < self.block_size:
+            return False
+
+        self.statistics.update(values[:, analyzed:])
+
+        if np.any(self.statistics.noise_ratio(-self.confidence) > self.limits):
+            self.passed = False
+        elif np.all(
+            self.statistics.noise_ratio(self.confidence) < self.limits
+        ):
+            self.passed = True
+
+        return self.passed is not None
@@ -2,12 +2,12 @@
 
 # -- Imports ------------------------------------------------------------------
 
-from dynaconf.utils.boxing import DynaBox
+from icotest.config import Window
 
 # -- Functions ----------------------------------------------------------------
 
 
-async def check_power_usage(power_usage: float, settings: DynaBox):
+async def check_power_usage(power_usage: float, window: Window):
     """Test if the average power usage matches a certain value
 
     Args:
@@ -16,17 +16,14 @@ async def check_power_usage(power_usage: float, settings: DynaBox):
 
             The measured power usage in mW
 
-        settings:
+        window:
 
-            The settings object that contains the expected power usage values
+            The allowed range for the power usage in mW
 
     """
 
-    average_power = settings.average
-    tolerance = settings.tolerance
-
-    minimum_power = average_power - tolerance
-    maximum_power = average_power + tolerance
+    minimum_power = window.minimum
+    maximum_power = window.maximum
     assert minimum_power <= power_usage, (
         f"Power usage of {power_usage} mW smaller than expected minimum of "
         f"{minimum_power} mW"
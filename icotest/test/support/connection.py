@@ -0,0 +1,183 @@
+"""Reuse connections to the STU and sensor nodes across tests"""
+
+# -- Imports ------------------------------------------------------------------
+
+from __future__ import annotations
+
+from asyncio import wait_for
+from contextlib import AsyncExitStack
+from logging import getLogger
+from types import TracebackType
+
+from icotronic.can import Connection, SensorNode, STU
+from netaddr import EUI
+
+# -- Classes ------------------------------------------------------------------
+
+
+class ConnectionPool:
+    """Keep the connections to the STU and a sensor node open between tests
+
+    Before the pool hands out a connection, it checks that the connected node
+    still responds. The pool only reconnects, if this health check fails
+    (e.g. since the node restarted after a firmware upload).
+
+    Args:
+
+        timeout:
+
+            The maximum amount of seconds the health check of a node is
+            allowed to take
+
+    """
+
+    def __init__(self, timeout: float = 2) -> None:
+
+        self.timeout = timeout
+        self.stu_stack = AsyncExitStack()
+        self.sensor_node_stack = AsyncExitStack()
+        self._stu: STU | None = None
+        self._sensor_node: SensorNode | None = None
+        self._sensor_node_identifier: int | str | EUI | None = None
+        self.logger = getLogger(__name__)
+
+    async def __aenter__(self) -> ConnectionPool:
+        """Use the pool as context manager
+
+        Returns:
+
+            The connection pool
+
+        """
+
+        return self
+
+    async def __aexit__(
+        self,
+        exception_type: type[BaseException] | None,
+        exception_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        """Close all connections of the pool
+
+        Args:
+
+            exception_type:
+                The type of the exception in case of an exception
+
+            exception_value:
+                The value of the exception in case of an exception
+
+            traceback:
+                The traceback in case of an exception
+
+        """
+
+        await self.close()
+
+    async def is_alive(self, node: STU | SensorNode) -> bool:
+        """Check if a node still responds to requests
+
+        Args:
+
+            node:
+
+                The node that should be checked
+
+        Returns:
+
+            ``True``, if the node responded in time, ``False`` otherwise
+
+        """
+
+        try:
+            await wait_for(node.get_state(), self.timeout)
+        except Exception as error:  # pylint: disable=broad-exception-caught
+            self.logger.info("Health check of %s failed: %r", node, error)
+            return False
+
+        return True
+
+    async def stu(self) -> STU:
+        """Get a working connection to the STU
+
+        Returns:
+
+            The (pooled) STU
+
+        """
+
+        stu = self._stu
+        if stu is not None and await self.is_alive(stu):
+            return stu
+
+        await self.close()
+        self.logger.info("Connecting to STU")
+        stu = await self.stu_stack.enter_async_context(Connection())
+        self._stu = stu
+        return stu
+
+    async def sensor_node(
+        self,
+        identifier: int | str | EUI,
+        sensor_node_class: type[SensorNode] = SensorNode,
+    ) -> SensorNode:
+        """Get a working connection to a sensor node
+
+        Args:
+
+            identifier:
+
+                The identifier (number, name or MAC address) of the sensor
+                node
+
+            sensor_node_class:
+
+                The class of the sensor node e.g. ``STH``
+
+        Returns:
+
+            The (pooled) sensor node
+
+        """
+
+        stu = await self.stu()
+
+        sensor_node = self._sensor_node
+        if (
+            sensor_node is not None
+            and self._sensor_node_identifier == identifier
+            and isinstance(sensor_node, sensor_node_class)
+            and await self.is_alive(sensor_node)
+        ):
+            return sensor_node
+
+        await self.release_sensor_node()
+        self.logger.info("Connecting to sensor node “%s”", identifier)
+        sensor_node = await self.sensor_node_stack.enter_async_context(
+            stu.connect_sensor_node(identifier, sensor_node_class)
+        )
+        self._sensor_node = sensor_node
+        self._sensor_node_identifier = identifier
+        return sensor_node
+
+    async def release_sensor_node(self) -> None:
+        """Disconnect from the pooled sensor node"""
+
+        self._sensor_node = None
+        self._sensor_node_identifier = None
+        try:
+            await self.sensor_node_stack.aclose()
+        except Exception as error:  # pylint: disable=broad-exception-caught
+            # The connection is most likely already broken
+            self.logger.info("Unable to disconnect sensor node: %r", error)
+
+    async def close(self) -> None:
+        """Close all connections of the pool"""
+
+        await self.release_sensor_node()
+        self._stu = None
+        try:
+            await self.stu_stack.aclose()
+        except Exception as error:  # pylint: disable=broad-exception-caught
+            self.logger.info("Unable to disconnect STU: %r", error)
@@ -0,0 +1,896 @@
+"""Verify multiple EEPROM values of a node at once"""
+
+# -- Imports ------------------------------------------------------------------
+
+from __future__ import annotations
+
+from collections.abc import Callable, Iterator, Mapping
+from logging import getLogger
+from math import ceil, isclose
+from operator import __eq__
+from typing import Any, NamedTuple
+
+from icotronic.can import SensorNode, STU
+from icotronic.can.node.eeprom.basic import EEPROM
+
+# -- Types --------------------------------------------------------------------
+
+Comparator = Callable[[Any, Any], bool]
+"""Function that checks if a written and read EEPROM value match"""
+
+# -- Attributes ---------------------------------------------------------------
+
+BYTES_PER_MESSAGE = 4
+"""Maximum number of EEPROM bytes transferred by a single CAN request"""
+
+# -- Functions ----------------------------------------------------------------
+
+
+def function_name(name: str) -> str:
+    """Get the name suffix of the EEPROM read and write coroutines of a value
+
+    Args:
+
+        name:
+
+            The name of the EEPROM value
+
+    Returns:
+
+        The suffix of the read and write coroutines in ``NodeEEPROM``
+
+    Examples:
+
+        Get the suffix of the coroutines for the hardware version
+
+        >>> function_name("hardware version")
+        'hardware_version'
+
+    """
+
+    return name.lower().replace(" ", "_")
+
+
+def messages(length: int) -> int:
+    """Get the number of CAN requests used to transfer EEPROM data
+
+    Args:
+
+        length:
+
+            The number of bytes that should be read or written
+
+    Returns:
+
+        The number of requests
+
+    Examples:
+
+        Get the number of requests for some lengths
+
+        >>> messages(1), messages(4), messages(9)
+        (1, 1, 3)
+
+    """
+
+    return ceil(length / BYTES_PER_MESSAGE)
+
+
+def default_comparator(value: Any) -> Comparator:
+    """Get the function that compares a written and read EEPROM value
+
+    Args:
+
+        value:
+
+            The written value
+
+    Returns:
+
+        ``isclose`` for floating point values, ``__eq__`` otherwise
+
+    Examples:
+
+        Get the comparator for different values
+
+        >>> default_comparator(1.5) is isclose
+        True
+        >>> default_comparator("Test-STH") is __eq__
+        True
+
+    """
+
+    return isclose if isinstance(value, float) else __eq__
+
+
+# -- Classes ------------------------------------------------------------------
+
+
+class EEPROMField(NamedTuple):
+    """The (encoded) data of a single EEPROM value
+
+    Attributes:
+
+        name:
+            The name of the EEPROM value (e.g. ``"serial number"``)
+
+        value:
+            The (decoded) value
+
+        address:
+            The EEPROM page that stores the value
+
+        offset:
+            The offset of the first byte of the value in the page
+
+        data:
+            The bytes that represent the value in the EEPROM
+
+    """
+
+    name: str
+    value: Any
+    address: int
+    offset: int
+    data: list[int]
+
+
+class EEPROMImage:
+    """Store EEPROM content in memory
+
+    The image uses the same encoding as the EEPROM classes of ICOtronic,
+    since it executes the read and write coroutines of these classes with an
+    EEPROM object that accesses the image instead of the node.
+
+    Args:
+
+        eeprom_class:
+
+            The EEPROM class of the node (e.g. ``STHEEPROM``)
+
+    Examples:
+
+        Import required library code
+
+        >>> from asyncio import run
+        >>> from icotronic.can.node.eeprom.sth import STHEEPROM
+
+        Encode some values
+
+        >>> image = EEPROMImage(STHEEPROM)
+        >>> run(image.encode("name", "Test-STH"))
+        ... # doctest: +NORMALIZE_WHITESPACE
+        EEPROMField(name='name', value='Test-STH', address=0, offset=1,
+                    data=[84, 101, 115, 116, 45, 83, 84, 72])
+        >>> field = run(image.encode("x axis acceleration slope", 0.5))
+        >>> field.address, field.offset, len(field.data)
+        (8, 0, 4)
+
+        Decode values stored in the image
+
+        >>> run(image.decode("name"))
+        'Test-STH'
+        >>> run(image.decode("x axis acceleration slope"))
+        0.5
+
+        Get the contiguous byte ranges of the image
+
+        >>> image.ranges()
+        [(0, 1, 8), (8, 0, 4)]
+
+    """
+
+    def __init__(self, eeprom_class: type[EEPROM]) -> None:
+
+        self.eeprom_class = eeprom_class
+        self.content: dict[int, dict[int, int]] = {}
+
+    def eeprom(self) -> EEPROM:
+        """Get an EEPROM object that reads and writes this image
+
+        Returns:
+
+            An object of the EEPROM class of the node, which accesses the
+            image instead of the node
+
+        """
+
+        eeprom = object.__new__(self.eeprom_class)
+
+        async def read(address: int, offset: int, length: int) -> list[int]:
+            return self.read(address, offset, length)
+
+        async def write(
+            address: int,
+            offset: int,
+            data: list[int],
+            length: int | None = None,
+        ) -> None:
+            if length is not None:
+                data = data[:length] + [0] * (length - len(data))
+            self.write(address, offset, data)
+
+        setattr(eeprom, "read", read)
+        setattr(eeprom, "write", write)
+        return eeprom
+
+    def read(self, address: int, offset: int, length: int) -> list[int]:
+        """Get bytes of the image
+
+        Args:
+
+            address:
+
+                The page number in the EEPROM
+
+            offset:
+
+                The offset of the first byte in the page
+
+            length:
+
+                The number of bytes
+
+        Returns:
+
+            The requested bytes
+
+        """
+
+        page = self.content.get(address, {})
+        return [page[position] for position in range(offset, offset + length)]
+
+    def write(self, address: int, offset: int, data: list[int]) -> None:
+        """Change bytes of the image
+
+        Args:
+
+            address:
+
+                The page number in the EEPROM
+
+            offset:
+
+                The offset of the first byte in the page
+
+            data:
+
+                The new bytes
+
+        """
+
+        page = self.content.setdefault(address, {})
+        for position, byte in enumerate(data, start=offset):
+            page[position] = byte
+
+    def update(self, other: EEPROMImage) -> None:
+        """Copy all bytes of another image into this image
+
+        Args:
+
+            other:
+
+                The image that contains the new bytes
+
+        """
+
+        for address, offset, byte in other:
+            self.write(address, offset, [byte])
+
+    def difference(self, other: EEPROMImage) -> EEPROMImage:
+        """Get the bytes of this image that differ from another image
+
+        Args:
+
+            other:
+
+                The image this image should be compared to
+
+        Returns:
+
+            An image that contains all bytes of this image, which are missing
+            or different in the other image
+
+        Examples:
+
+            Compare two images
+
+            >>> image = EEPROMImage(EEPROM)
+            >>> image.write(address=0, offset=0, data=[1, 2, 3])
+            >>> other = EEPROMImage(EEPROM)
+            >>> other.write(address=0, offset=0, data=[1, 0])
+            >>> list(image.difference(other))
+            [(0, 1, 2), (0, 2, 3)]
+
+        """
+
+        difference = EEPROMImage(self.eeprom_class)
+        for address, offset, byte in self:
+            if (address, offset) not in other or other.read(
+                address, offset, 1
+            ) != [byte]:
+                difference.write(address, offset, [byte])
+        return difference
+
+    def __contains__(self, location: object) -> bool:
+        """Check if the image contains the byte at a certain location
+
+        Args:
+
+            location:
+
+                A tuple containing the page and offset of the byte
+
+        Returns:
+
+            ``True``, if the image contains the byte, ``False`` otherwise
+
+        """
+
+        if not isinstance(location, tuple):
+            return False
+        address, offset = location
+        return offset in self.content.get(address, {})
+
+    def __iter__(self) -> Iterator[tuple[int, int, int]]:
+        """Iterate over the bytes of the image
+
+        Yields:
+
+            tuple[int, int, int]:
+                The page, offset and value of every byte in ascending order
+
+        """
+
+        for address in sorted(self.content):
+            page = self.content[address]
+            for offset in sorted(page):
+                yield address, offset, page[offset]
+
+    async def encode(self, name: str, value: Any) -> EEPROMField:
+        """Add a value to the image
+
+        Args:
+
+            name:
+
+                The name of the EEPROM value (e.g. ``"product name"``)
+
+            value:
+
+                The value that should be stored
+
+        Returns:
+
+            The location and encoded data of the value
+
+        """
+
+        locations: list[tuple[int, int, int]] = []
+        eeprom = self.eeprom()
+        write = getattr(eeprom, "write")
+
+        async def record(
+            address: int,
+            offset: int,
+            data: list[int],
+            length: int | None = None,
+        ) -> None:
+            await write(address, offset, data, length)
+            locations.append(
+                (address, offset, len(data) if length is None else length)
+            )
+
+        setattr(eeprom, "write", record)
+        await getattr(eeprom, f"write_{function_name(name)}")(value)
+
+        address, offset, _ = locations[0]
+        return EEPROMField(
+            name=name,
+            value=value,
+            address=address,
+            offset=offset,
+            data=[
+                byte for location in locations for byte in self.read(*location)
+            ],
+        )
+
+    async def decode(self, name: str) -> Any:
+        """Get a value stored in the image
+
+        Args:
+
+            name:
+
+                The name of the EEPROM value (e.g. ``"product name"``)
+
+        Returns:
+
+            The decoded value
+
+        """
+
+        eeprom = self.eeprom()
+        return await getattr(eeprom, f"read_{function_name(name)}")()
+
+    def ranges(self, gap: int = 0) -> list[tuple[int, int, int]]:
+        """Get the contiguous byte ranges of the image
+
+        Args:
+
+            gap:
+
+                The maximum number of missing bytes between two ranges that
+                should be merged into one range
+
+        Returns:
+
+            The page, offset and length of every range
+
+        Examples:
+
+            Merge ranges that are close to each other
+
+            >>> image = EEPROMImage(EEPROM)
+            >>> image.write(address=4, offset=0, data=[1, 2])
+            >>> image.write(address=4, offset=3, data=[3])
+            >>> image.write(address=5, offset=4, data=[4])
+            >>> image.ranges()
+            [(4, 0, 2), (4, 3, 1), (5, 4, 1)]
+            >>> image.ranges(gap=1)
+            [(4, 0, 4), (5, 4, 1)]
+
+        """
+
+        ranges: list[tuple[int, int, int]] = []
+        for address, offset, _ in self:
+            if ranges:
+                last_address, last_offset, last_length = ranges[-1]
+                end = last_offset + last_length
+                if last_address == address and offset - end <= gap:
+                    ranges[-1] = (
+                        last_address,
+                        last_offset,
+                        offset + 1 - last_offset,
+                    )
+                    continue
+            ranges.append((address, offset, 1))
+        return ranges
+
+
+class EEPROMUpdate(NamedTuple):
+    """Information about an update of multiple EEPROM values
+
+    Attributes:
+
+        values:
+            The number of checked EEPROM values
+
+        skipped:
+            The number of values that already contained the expected content
+            and were therefore not written
+
+        written:
+            The number of written bytes
+
+        size:
+            The number of bytes of all checked values
+
+        reads:
+            The number of EEPROM read requests
+
+        writes:
+            The number of EEPROM write requests
+
+        mismatches:
+            All values that do not match the expected value after the update
+
+    Examples:
+
+        Show a textual representation of an update
+
+        >>> EEPROMUpdate(values=26, skipped=25, written=4, size=326, reads=83,
+        ...              writes=1, mismatches=[])
+        ... # doctest: +NORMALIZE_WHITESPACE
+        26 EEPROM values (25 writes skipped): 4/326 bytes written, 83 read and
+        1 write requests
+
+    """
+
+    values: int
+    skipped: int
+    written: int
+    size: int
+    reads: int
+    writes: int
+    mismatches: list[EEPROMMismatch]
+
+    def __repr__(self) -> str:
+        """Get the textual representation of the update
+
+        Returns:
+
+            A text that contains the number of skipped values, written
+            bytes and requests
+
+        """
+
+        return (
+            f"{self.values} EEPROM values ({self.skipped} writes skipped): "
+            f"{self.written}/{self.size} bytes written, {self.reads} read and "
+            f"{self.writes} write requests"
+        )
+
+    def metrics(self) -> dict[str, Any]:
+        """Get the update information as JSON compatible dictionary
+
+        Returns:
+
+            A dictionary that contains the number of values, skipped values,
+            written bytes and requests
+
+        """
+
+        return {
+            "values": self.values,
+            "skipped": self.skipped,
+            "written bytes": self.written,
+            "size": self.size,
+            "read requests": self.reads,
+            "write requests": self.writes,
+        }
+
+
+class EEPROMMismatch(NamedTuple):
+    """An EEPROM value that does not match the expected value
+
+    Attributes:
+
+        name:
+            The name of the EEPROM value
+
+        expected:
+            The written value
+
+        read:
+            The value read from the EEPROM
+
+    Examples:
+
+        Show a textual representation of a mismatch
+
+        >>> EEPROMMismatch("name", "Test-STH", "Test")
+        Written name “Test-STH” does not match read name “Test”
+
+    """
+
+    name: str
+    expected: Any
+    read: Any
+
+    def __repr__(self) -> str:
+        """Get the textual representation of the mismatch
+
+        Returns:
+
+            A text that describes the mismatch
+
+        """
+
+        return (
+            f"Written {self.name} “{self.expected}” does not match read "
+            f"{self.name} “{self.read}”"
+        )
+
+
+# -- Functions ----------------------------------------------------------------
+
+
+async def compare(
+    fields: list[EEPROMField],
+    image: EEPROMImage,
+    comparators: Mapping[str, Comparator] | None = None,
+) -> list[EEPROMMismatch]:
+    """Compare expected EEPROM values with the content of an EEPROM image
+
+    Args:
+
+        fields:
+
+            The expected EEPROM values
+
+        image:
+
+            An image that contains the (read) content of the EEPROM
+
+        comparators:
+
+            Functions that check if the written and read value of a certain
+            EEPROM value match; the default comparator uses ``isclose`` for
+            floating point values and ``__eq__`` for all other values
+
+    Returns:
+
+        All values that do not match the expected value
+
+    """
+
+    comparators = {} if comparators is None else comparators
+    mismatches = []
+    for field in fields:
+        value = await image.decode(field.name)
+        comparator = comparators.get(
+            field.name, default_comparator(field.value)
+        )
+        if not comparator(field.value, value):
+            mismatches.append(EEPROMMismatch(field.name, field.value, value))
+    return mismatches
+
+
+async def read_ranges(
+    node: SensorNode | STU, ranges: list[tuple[int, int, int]]
+) -> EEPROMImage:
+    """Read multiple byte ranges of the EEPROM of a node
+
+    Args:
+
+        node:
+
+            The node that contains the EEPROM
+
+        ranges:
+
+            The page, offset and length of every range
+
+    Returns:
+
+        An image that contains the read bytes
+
+    """
+
+    image = EEPROMImage(type(node.eeprom))
+    for address, offset, length in ranges:
+        image.write(
+            address, offset, await node.eeprom.read(address, offset, length)
+        )
+    return image
+
+
+async def update_eeprom(
+    node: SensorNode | STU,
+    values: Mapping[str, Any],
+    comparators: Mapping[str, Comparator] | None = None,
+) -> EEPROMUpdate:
+    """Change the EEPROM of a node to match an expected image
+
+    The function reads the current content of all expected values, compares
+    it with the expected EEPROM image and only writes the bytes that differ.
+    Afterwards it reads the written bytes again and checks all values. For a
+    node that already contains the expected values the function does not
+    write into the EEPROM at all, which saves time and EEPROM write cycles.
+
+    Args:
+
+        node:
+
+            The node that should be updated
+
+        values:
+
+            The expected EEPROM values (e.g. ``{"name": "Test-STH"}``)
+
+        comparators:
+
+            Functions that check if the expected and read value of a certain
+            EEPROM value match
+
+    Returns:
+
+        Information about the update including all values that do not match
+        the expected value
+
+    Examples:
+
+        Import required library code
+
+        >>> from asyncio import run
+        >>> from types import SimpleNamespace
+        >>> from icotronic.can.node.eeprom.sth import STHEEPROM
+
+        Update an (empty) simulated EEPROM two times
+
+        >>> memory = EEPROMImage(STHEEPROM)
+        >>> memory.write(address=0, offset=0, data=[0] * 32)
+        >>> node = SimpleNamespace(eeprom=memory.eeprom())
+        >>> values = {"name": "Test-STH", "sleep time 1": 86_400_000}
+        >>> run(update_eeprom(node, values))
+        ... # doctest: +NORMALIZE_WHITESPACE
+        2 EEPROM values (0 writes skipped): 12/12 bytes written, 6 read and
+        3 write requests
+        >>> run(update_eeprom(node, values))
+        ... # doctest: +NORMALIZE_WHITESPACE
+        2 EEPROM values (2 writes skipped): 0/12 bytes written, 3 read and
+        0 write requests
+
+        Only change a single value
+
+        >>> run(update_eeprom(node, {**values, "sleep time 1": 1000}))
+        ... # doctest: +NORMALIZE_WHITESPACE
+        2 EEPROM values (1 writes skipped): 4/12 bytes written, 4 read and
+        1 write requests
+
+    """
+
+    expected = EEPROMImage(type(node.eeprom))
+    fields = [
+        await expected.encode(name, value) for name, value in values.items()
+    ]
+
+    # Reading additional bytes between two values does not hurt, but might
+    # reduce the number of requests
+    ranges = expected.ranges(gap=BYTES_PER_MESSAGE - 1)
+    current = await read_ranges(node, ranges)
+
+    changed = expected.difference(current)
+    target = EEPROMImage(type(node.eeprom))
+    target.update(current)
+    target.update(expected)
+    # The current image contains all bytes between two changed bytes that
+    # are close to each other, which means we can write them together
+    write_ranges = changed.ranges(gap=BYTES_PER_MESSAGE - 1)
+    for address, offset, length in write_ranges:
+        await node.eeprom.write(
+            address, offset, target.read(address, offset, length)
+        )
+
+    current.update(await read_ranges(node, write_ranges))
+    return EEPROMUpdate(
+        values=len(fields),
+        skipped=sum(
+            all(
+                (field.address, offset) not in changed
+                for offset in range(
+                    field.offset, field.offset + len(field.data)
+                )
+            )
+            for field in fields
+        ),
+        written=sum(length for _, _, length in write_ranges),
+        size=sum(len(field.data) for field in fields),
+        reads=sum(messages(length) for _, _, length in ranges + write_ranges),
+        writes=sum(messages(length) for _, _, length in write_ranges),
+        mismatches=await compare(fields, current, comparators),
+    )
+
+
+async def verify_eeprom(
+    node: SensorNode | STU,
+    values: Mapping[str, Any],
+    comparators: Mapping[str, Comparator] | None = None,
+) -> EEPROMUpdate:
+    """Write multiple EEPROM values and check that reading them works
+
+    Instead of writing and reading one value after another, this function
+    first encodes all values, then writes them and afterwards reads them
+    back. Values stored next to each other are
+    written and read using common requests. Since every CAN request
+    transfers at most 4 bytes and the node handles one EEPROM request after
+    another, this reduces the number of requests as far as the protocol
+    allows.
+
+    Args:
+
+        node:
+
+            The node that should be checked
+
+        values:
+
+            The expected EEPROM values (e.g. ``{"name": "Test-STH"}``)
+
+        comparators:
+
+            Functions that check if the written and read value of a certain
+            EEPROM value match; the default comparator uses ``isclose`` for
+            floating point values and ``__eq__`` for all other values
+
+    Returns:
+
+        Information about the written values including all values that do
+        not match the expected value
+
+    Examples:
+
+        Import required library code
+
+        >>> from asyncio import run
+        >>> from types import SimpleNamespace
+        >>> from icotronic.can.node.eeprom.sth import STHEEPROM
+
+        Verify values using a simulated EEPROM with a defective byte in the
+        name
+
+        >>> class Memory(EEPROMImage):
+        ...     def write(self, address, offset, data):
+        ...         super().write(address, offset, data)
+        ...         if (0, 8) in self:
+        ...             self.content[0][8] = 0
+        >>> node = SimpleNamespace(eeprom=Memory(STHEEPROM).eeprom())
+        >>> run(verify_eeprom(node, {
+        ...     "name": "Test-STH",
+        ...     "sleep time 1": 86_400_000,
+        ...     "x axis acceleration slope": 0.5,
+        ... })).mismatches
+        [Written name “Test-STH” does not match read name “Test-ST”]
+
+    """
+
+    expected = EEPROMImage(type(node.eeprom))
+    fields = [
+        await expected.encode(name, value) for name, value in values.items()
+    ]
+
+    for address, offset, length in expected.ranges():
+        await node.eeprom.write(
+            address, offset, expected.read(address, offset, length)
+        )
+
+    # Reading additional bytes between two values does not hurt, but might
+    # reduce the number of requests
+    ranges = expected.ranges(gap=BYTES_PER_MESSAGE - 1)
+    read = await read_ranges(node, ranges)
+
+    size = sum(len(field.data) for field in fields)
+    return EEPROMUpdate(
+        values=len(fields),
+        skipped=0,
+        written=size,
+        size=size,
+        reads=sum(messages(length) for _, _, length in ranges),
+        writes=sum(messages(length) for _, _, length in expected.ranges()),
+        mismatches=await compare(fields, read, comparators),
+    )
+
+
+async def check_eeprom_values(
+    node: SensorNode | STU,
+    values: Mapping[str, Any],
+    comparators: Mapping[str, Comparator] | None = None,
+    read_before_write: bool = True,
+) -> EEPROMUpdate:
+    """Test that the EEPROM of a node contains the expected values
+
+    Args:
+
+        node:
+
+            The node that should be checked
+
+        values:
+
+            The expected EEPROM values
+
+        comparators:
+
+            Functions that check if the written and read value of a certain
+            EEPROM value match
+
+        read_before_write:
+
+            Read the EEPROM first and only write the bytes that differ from
+            the expected values (``update_eeprom``) instead of writing all
+            values (``verify_eeprom``)
+
+    Returns:
+
+        Information about the written values
+
+    """
+
+    update = await (update_eeprom if read_before_write else verify_eeprom)(
+        node, values, comparators
+    )
+    getLogger(__name__).info("EEPROM update: %s", update)
+    assert not update.mismatches, "\n".join(map(repr, update.mismatches))
+
+    return update
@@ -0,0 +1,271 @@
+"""Fake Simplicity Commander executable for tests without debug adapters
+
+The module replaces ``commander`` on ``PATH`` with a small script that
+runs this file. The fake supports the commands that ICOtest uses to
+upload firmware (``adapter list``, ``adapter dbgmode``, ``device unlock``,
+``verify`` and ``flash``) including the option ``--serialno``. It stores the
+“flash content” of every simulated debug adapter in a directory.
+"""
+
+# -- Imports ------------------------------------------------------------------
+
+from __future__ import annotations
+
+from argparse import ArgumentParser
+from collections.abc import Sequence
+from os import environ, pathsep
+from pathlib import Path
+from shutil import rmtree
+from sys import argv, executable, exit as sys_exit, platform
+from time import sleep, time
+from types import TracebackType
+
+from icotest.cli.commander import commander_executable
+
+# -- Attributes ---------------------------------------------------------------
+
+DIRECTORY_VARIABLE = "ICOTEST_FAKE_COMMANDER"
+"""Environment variable that contains the state directory of the fake"""
+
+ADAPTERS_VARIABLE = "ICOTEST_FAKE_COMMANDER_ADAPTERS"
+"""Environment variable that contains the simulated serial numbers"""
+
+DELAY_VARIABLE = "ICOTEST_FAKE_COMMANDER_DELAY"
+"""Environment variable that contains the duration of a flash command"""
+
+# -- Functions ----------------------------------------------------------------
+
+
+def run_command(arguments: Sequence[str]) -> int:
+    """Execute a command of the fake Simplicity Commander
+
+    Args:
+
+        arguments:
+
+            The command line arguments of the command
+
+    Returns:
+
+        The return code of the command
+
+    """
+
+    parser = ArgumentParser(prog="commander")
+    parser.add_argument("command")
+    parser.add_argument("arguments", nargs="*")
+    parser.add_argument("-d", "--device")
+    parser.add_argument("--serialno")
+    options = parser.parse_args(arguments)
+
+    directory = Path(environ[DIRECTORY_VARIABLE])
+    adapters = environ[ADAPTERS_VARIABLE].split(",")
+    command = [options.command, *options.arguments]
+
+    if command == ["adapter", "list"]:
+        print(f"deviceCount={len(adapters)}")
+        for index, serial_number in enumerate(adapters):
+            print(f"device[{index}].name=J-Link OB")
+            print(f"device[{index}].serialnumber={serial_number}")
+        print("DONE")
+        return 0
+
+    serial_number = options.serialno or adapters[0]
+    if serial_number not in adapters:
+        print(
+            f"ERROR: Could not connect to J-Link with serial {serial_number}"
+        )
+        return 1
+
+    flash = directory / "flash" / serial_number
+    if command == ["adapter", "dbgmode", "OUT"]:
+        print("Setting debug mode to OUT...\nDONE")
+    elif command == ["device", "unlock"]:
+        rmtree(flash, ignore_errors=True)
+        print("Chip successfully unlocked\nDONE")
+    elif options.command in {"flash", "verify"} and len(command) == 2:
+        image = Path(options.arguments[0])
+        stored = flash / image.name
+        if options.command == "verify":
+            if (
+                not stored.exists()
+                or stored.read_bytes() != image.read_bytes()
+            ):
+                print("ERROR: Verification failed")
+                return 1
+        else:
+            start = time()
+            sleep(float(environ.get(DELAY_VARIABLE, "0")))
+            flash.mkdir(parents=True, exist_ok=True)
+            stored.write_bytes(image.read_bytes())
+            with (directory / "uploads.txt").open("a") as uploads:
+                uploads.write(f"{serial_number} {start} {time()}\n")
+        print("DONE")
+    else:
+        print(f"ERROR: Unsupported command “{' '.join(command)}”")
+        return 1
+
+    return 0
+
+
+# -- Classes ------------------------------------------------------------------
+
+
+class FakeCommander:
+    """Replace Simplicity Commander with a fake executable on ``PATH``
+
+    Args:
+
+        directory:
+
+            The directory that stores the fake executable and the flash
+            content of the simulated debug adapters
+
+        serial_numbers:
+
+            The serial numbers of the simulated debug adapters
+
+        delay:
+
+            The amount of seconds a single ``flash`` command takes
+
+    Examples:
+
+        Import required library code
+
+        >>> from subprocess import run
+        >>> from tempfile import TemporaryDirectory
+
+        List the simulated debug adapters
+
+        >>> with TemporaryDirectory() as directory:
+        ...     with FakeCommander(Path(directory), ["440123456"]):
+        ...         print(run([commander_executable(), "adapter", "list"],
+        ...                   capture_output=True, text=True).stdout)
+        deviceCount=1
+        device[0].name=J-Link OB
+        device[0].serialnumber=440123456
+        DONE
+        <BLANKLINE>
+
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        serial_numbers: Sequence[str],
+        delay: float = 0,
+    ) -> None:
+
+        self.directory = directory
+        self.variables = {
+            "PATH": pathsep.join(
+                [str(directory / "bin"), environ.get("PATH", "")]
+            ),
+            DIRECTORY_VARIABLE: str(directory),
+            ADAPTERS_VARIABLE: ",".join(serial_numbers),
+            DELAY_VARIABLE: str(delay),
+        }
+        self.environment: dict[str, str | None] = {}
+
+    def __enter__(self) -> FakeCommander:
+        """Put the fake executable on ``PATH``
+
+        Returns:
+
+            The fake Simplicity Commander
+
+        """
+
+        binaries = self.directory / "bin"
+        binaries.mkdir(parents=True, exist_ok=True)
+        if platform == "win32":
+            (binaries / "commander.bat").write_text(
+                f'@"{executable}" "{__file__}" %*\n'
+            )
+        else:
+            script = binaries / "commander"
+            script.write_text(
+                f'#!/bin/sh\nexec "{executable}" "{__file__}" "$@"\n'
+            )
+            script.chmod(0o755)
+
+        self.environment = {name: environ.get(name) for name in self.variables}
+        environ.update(self.variables)
+        commander_executable.cache_clear()
+
+        return self
+
+    def __exit__(
+        self,
+        exception_type: type[BaseException] | None,
+        exception_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        """Restore the original environment
+
+        Args:
+
+            exception_type:
+                The type of the exception in case of an exception
+
+            exception_value:
+                The value of the exception in case of an exception
+
+            traceback:
+                The traceback in case of an exception
+
+        """
+
+        for name, value in self.environment.items():
+            if value is None:
+                environ.pop(name, None)
+            else:
+                environ[name] = value
+        commander_executable.cache_clear()
+
+    def uploads(self) -> list[tuple[str, float, float]]:
+        """Get all executed ``flash`` commands
+
+        Returns:
+
+            A list containing the serial number of the used debug adapter and
+            the start and end time of every ``flash`` command
+
+        """
+
+        filepath = self.directory / "uploads.txt"
+        if not filepath.exists():
+            return []
+
+        uploads = []
+        for line in filepath.read_text().splitlines():
+            serial_number, start, end = line.split()
+            uploads.append((serial_number, float(start), float(end)))
+
+        return uploads
+
+    def concurrency(self) -> int:
+        """Get the maximum number of concurrent ``flash`` commands
+
+        Returns:
+
+            The maximum number of ``flash`` commands that ran at the same
+            time
+
+        """
+
+        uploads = self.uploads()
+        return max(
+            (
+                sum(start <= time < end for _, start, end in uploads)
+                for _, time, _ in uploads
+            ),
+            default=0,
+        )
+
+
+# -- Main ---------------------------------------------------------------------
+
+if __name__ == "__main__":
+    sys_exit(run_command(argv[1:]))
@@ -2,25 +2,217 @@
 
 # -- Imports ------------------------------------------------------------------
 
-from asyncio import sleep
+from __future__ import annotations
+
+from asyncio import sleep, TaskGroup, wait_for
+from collections.abc import Awaitable, Iterable
+from itertools import groupby
 from logging import getLogger
-from math import isclose
-from operator import __eq__
-from pathlib import Path
-from typing import Callable, TypeVar
+from time import perf_counter
+from typing import Any, Callable, NamedTuple
 
 from dynaconf.utils.boxing import DynaBox
-from icotronic.can import SensorNode, STH, STU
+from icotronic.can import SensorNode, STU
+from icotronic.can.error import CANConnectionError
 from icotronic.can.node.eeprom.status import EEPROMStatus
 from icotronic.can.status import State
 from semantic_version import Version
 
-from icotest.cli.commander import Commander
+from icotest.cli.commander import AsyncCommander
+from icotest.cli.flash import firmware_filepaths
+
+# -- Attributes ---------------------------------------------------------------
+
+OPERATING = State(mode="Get", location="Application", state="Operating")
+"""State of a node that is ready to handle requests"""
+
+# -- Classes ------------------------------------------------------------------
+
+
+class NodeQuery(NamedTuple):
+    """A request for a single status value of a node
+
+    Attributes:
+
+        name:
+            The name of the status value
+
+        request:
+            The coroutine function that retrieves the value
+
+        group:
+            The CAN block command used by the request. The CAN request layer
+            only uses the message identifier to match a response to its
+            request. Queries that use the same block command would therefore
+            receive the responses of each other, which is why they run one
+            after another.
+
+    """
+
+    name: str
+    request: Callable[[], Awaitable[Any]]
+    group: str
+
+
+class NodeSnapshot(NamedTuple):
+    """Status values of a node retrieved in one batch
+
+    Attributes:
+
+        values:
+            Maps the name of every status value to the retrieved value
+
+        latencies:
+            Maps the name of every status value to the time in seconds it
+            took to retrieve it
+
+        duration:
+            The time in seconds it took to retrieve all values
+
+    Examples:
+
+        Show the string representation of an example snapshot
+
+        >>> NodeSnapshot(values={"state": "Operating", "voltage": 3.25},
+        ...              latencies={"state": 0.0125, "voltage": 0.04},
+        ...              duration=0.045)
+        state: Operating (12.5 ms), voltage: 3.25 (40.0 ms) → 45.0 ms
+
+    """
+
+    values: dict[str, Any]
+    latencies: dict[str, float]
+    duration: float
+
+    def __repr__(self) -> str:
+        """Get the textual representation of the snapshot
+
+        Returns:
+
+            A string containing every value and its latency
+
+        """
+
+        values = ", ".join(
+            f"{name}: {value} ({self.latencies[name] * 1000:.1f} ms)"
+            for name, value in self.values.items()
+        )
+        return f"{values} → {self.duration * 1000:.1f} ms"
+
+    def metrics(self) -> dict[str, float]:
+        """Get the latencies as metrics for the test report
+
+        Returns:
+
+            A dictionary that maps the name of every status value to its
+            latency and the key ``duration`` to the overall duration, all in
+            milliseconds
 
-# -- Types --------------------------------------------------------------------
+        Examples:
+
+            Get the metrics of an example snapshot
+
+            >>> NodeSnapshot(values={"state": "Operating"},
+            ...              latencies={"state": 0.0125},
+            ...              duration=0.0125).metrics()
+            {'state': 12.5, 'duration': 12.5}
+
+        """
+
+        return {
+            **{
+                name: round(latency * 1000, 3)
+                for name, latency in self.latencies.items()
+            },
+            "duration": round(self.duration * 1000, 3),
+        }
+
+
+class Readiness(NamedTuple):
+    """Result of waiting for a node to become ready
+
+    Attributes:
+
+        state:
+            The last state reported by the node (``None``, if the node never
+            responded)
+
+        responded:
+            The time in seconds until the node responded to a state request
+            for the first time (boot time)
+
+        ready:
+            The time in seconds until the node reported the expected state
+            (``None``, if the node did not reach this state in time)
+
+        attempts:
+            The number of state requests
+
+    Examples:
+
+        Show the string representation of some example results
+
+        >>> Readiness(OPERATING, responded=0.1, ready=0.25, attempts=3)
+        Ready after 250.0 ms (first response: 100.0 ms, 3 requests)
+        >>> Readiness(None, responded=None, ready=None, attempts=7)
+        Not ready (first response: never, 7 requests)
+
+    """
+
+    state: State | None
+    responded: float | None
+    ready: float | None
+    attempts: int
+
+    def __repr__(self) -> str:
+        """Get the textual representation of the result
+
+        Returns:
+
+            A string containing the boot and ready time
+
+        """
+
+        def milliseconds(seconds: float | None) -> str:
+            return "never" if seconds is None else f"{seconds * 1000:.1f} ms"
+
+        status = (
+            "Not ready"
+            if self.ready is None
+            else f"Ready after {milliseconds(self.ready)}"
+        )
+        return (
+            f"{status} (first response: {milliseconds(self.responded)}, "
+            f"{self.attempts} requests)"
+        )
+
+    def metrics(self) -> dict[str, float | int | None]:
+        """Get the boot and ready time as metrics for the test report
+
+        Returns:
+
+            A dictionary containing the boot and ready time in milliseconds
+            and the number of state requests
+
+        Examples:
+
+            Get the metrics of an example result
+
+            >>> Readiness(OPERATING, responded=0.1, ready=0.25,
+            ...           attempts=3).metrics()
+            {'boot time': 100.0, 'ready time': 250.0, 'requests': 3}
+
+        """
+
+        def milliseconds(seconds: float | None) -> float | None:
+            return None if seconds is None else round(seconds * 1000, 3)
+
+        return {
+            "boot time": milliseconds(self.responded),
+            "ready time": milliseconds(self.ready),
+            "requests": self.attempts,
+        }
 
-EEPROMValue = TypeVar("EEPROMValue", Version, str)
-"""Type of an object that can be written into EEPROM"""
 
 # -- Functions ----------------------------------------------------------------
 
@@ -32,190 +224,300 @@ async def check_firmware_upload(node_settings: DynaBox):
 
     logger = getLogger(__name__)
     logger.debug("Firmware locations: %s", firmware_locations)
-    image_filepaths: list[Path] = []
-    for firmware_location in firmware_locations:
-        image_filepath = Path(firmware_location).expanduser().resolve()
-        if not image_filepath.exists():
-            raise FileNotFoundError(
-                f"Firmware file {image_filepath} does not exist"
-            )
-        if not image_filepath.is_file():
-            raise FileNotFoundError(
-                f"Firmware file {image_filepath} is not a file"
-            )
-        image_filepaths.append(image_filepath)
+    image_filepaths = firmware_filepaths(firmware_locations)
 
     chip = node_settings.firmware.chip
-    Commander().upload_flash(chip=chip, filepaths=image_filepaths)
+    uploaded = await AsyncCommander().upload_flash(
+        chip=chip,
+        filepaths=image_filepaths,
+        incremental=node_settings.firmware.incremental,
+    )
+    if not uploaded:
+        logger.info("Skipped upload of up to date firmware")
 
 
-async def check_connection(node: SensorNode | STU) -> None:
-    """Check connection to node
+def status_queries(node: SensorNode | STU) -> list[NodeQuery]:
+    """Get the queries for the status values of a node
 
     Args:
 
         node:
 
-            The node for that should be checked
-
-    """
+            The node whose status should be retrieved
 
-    await sleep(1)  # Wait for startup of sensor node
+    Returns:
 
-    # Just send a request for the state and check, if the result
-    # matches our expectations.
-    state = await node.get_state()
+        A list containing the state and firmware version query and for
+        sensor nodes additionally the supply voltage and MAC address query
 
-    expected_state = State(
-        mode="Get", location="Application", state="Operating"
-    )
+    """
 
-    assert state == expected_state, (
-        (
-            f"Expected state “{expected_state}” does not match "
-            f"received state “{state}”"
+    queries = [
+        NodeQuery("state", node.get_state, "System: Get/Set State"),
+        NodeQuery(
+            "firmware version",
+            node.get_firmware_version,
+            "Product Data: Firmware Version",
         ),
-    )
+    ]
+    if isinstance(node, SensorNode):
+        queries.extend([
+            NodeQuery(
+                "supply voltage",
+                node.get_supply_voltage,
+                "Streaming: Voltage",
+            ),
+            NodeQuery(
+                "MAC address", node.get_mac_address, "System: Bluetooth"
+            ),
+        ])
+
+    return queries
 
 
-async def check_write_read_eeprom_function(
-    node: SensorNode | STH | STU,
-    name: str,
-    written: EEPROMValue,
-    comparator: Callable[[EEPROMValue, EEPROMValue], bool],
-    description: str,
-):
-    """Check a written and read EEPROM value for relation to each other
+async def query_node(queries: Iterable[NodeQuery]) -> NodeSnapshot:
+    """Retrieve multiple status values of a node concurrently
+
+    Queries of different groups run concurrently, queries of the same group
+    run one after another in the given order.
 
     Args:
 
-        node:
-                The node that should be checked
+        queries:
 
-        name:
+            The queries that should be executed
+
+    Returns:
 
-                The name of the EEPROM value
+        A snapshot containing the value and latency of every query
 
-        written:
+    Examples:
 
-                The value that should be written and then read afterwards
+        Import required library code
 
-        comparator:
+        >>> from asyncio import run
 
-                The function that will be applied to check if the values are
-                related or not
+        Create queries that take a certain amount of time
 
-        description:
+        >>> def delay(value: int) -> Callable[[], Awaitable[int]]:
+        ...     async def request() -> int:
+        ...         await sleep(0.1)
+        ...         return value
+        ...     return request
+        >>> queries = [NodeQuery("one", delay(1), "first"),
+        ...            NodeQuery("two", delay(2), "second"),
+        ...            NodeQuery("three", delay(3), "third")]
 
-                A text that describes the **inverse** of the comparator
-                function; e.g. for something like the function ``__eq__`` this
-                could be something like ``"is not equal to"``.
+        Queries of different groups run concurrently
+
+        >>> snapshot = run(query_node(queries))
+        >>> snapshot.values
+        {'one': 1, 'two': 2, 'three': 3}
+        >>> snapshot.duration < sum(snapshot.latencies.values())
+        True
+
+        Queries of the same group run one after another
+
+        >>> snapshot = run(query_node([query._replace(group="same")
+        ...                            for query in queries]))
+        >>> snapshot.duration >= sum(snapshot.latencies.values())
+        True
 
     """
 
-    function_name = name.lower().replace(" ", "_")
-    write_coroutine = getattr(node.eeprom, f"write_{function_name}")
-    read_coroutine = getattr(node.eeprom, f"read_{function_name}")
-    await write_coroutine(written)
-    read = await read_coroutine()
-    logger = getLogger(__name__)
-    logger.debug("Type of written value: %s", type(written))
-    logger.debug("Type of read value: %s", type(read))
-    assert comparator(
-        written, read
-    ), f"Written {name} “{written}” {description} read {name} “{read}”"
+    queries = list(queries)
+    values: dict[str, Any] = {}
+    latencies: dict[str, float] = {}
+
+    async def run_group(group: Iterable[NodeQuery]) -> None:
+        for query in group:
+            start = perf_counter()
+            values[query.name] = await query.request()
+            latencies[query.name] = perf_counter() - start
+
+    def group_key(query: NodeQuery) -> str:
+        return query.group
+
+    start = perf_counter()
+    async with TaskGroup() as task_group:
+        for _, group in groupby(sorted(queries, key=group_key), group_key):
+            task_group.create_task(run_group(list(group)))
+    duration = perf_counter() - start
+
+    names = [query.name for query in queries]
+    snapshot = NodeSnapshot(
+        values={name: values[name] for name in names},
+        latencies={name: latencies[name] for name in names},
+        duration=duration,
+    )
+    getLogger(__name__).info("Node status: %s", snapshot)
+
+    return snapshot
+
 
+async def wait_for_ready(  # pylint: disable=too-many-arguments
+    node: SensorNode | STU,
+    expected: State = OPERATING,
+    *,
+    timeout: float = 5,
+    delay: float = 0.05,
+    maximum_delay: float = 0.8,
+    factor: float = 2,
+) -> Readiness:
+    """Poll the state of a node until it reaches the expected state
 
-async def check_write_read_eeprom(
-    node: SensorNode | STH | STU, name: str, written: EEPROMValue
-) -> None:
-    """Check that a written and read EEPROM value match
+    The function waits between state requests. The delay starts with
+    ``delay`` and grows by ``factor`` after every request up to
+    ``maximum_delay``. Errors of a state request (e.g. since the node is
+    still booting) count as “not ready”.
 
     Args:
 
         node:
-                The node that should be checked
 
-        name:
+            The node that should be checked
 
-                The name of the EEPROM value
+        expected:
 
-        written:
+            The state the node should reach
 
-                The value that should be written and then read afterwards
+        timeout:
 
-    """
+            The maximum amount of seconds the function waits for the node
 
-    return await check_write_read_eeprom_function(
-        node, name, written, __eq__, "does not match"
-    )
+        delay:
 
+            The initial delay between state requests in seconds
 
-async def check_write_read_eeprom_close(
-    node: SensorNode | STH | STU, name: str, written: float
-) -> None:
-    """Check that a written and read EEPROM value are approximately the same
+        maximum_delay:
 
-    Args:
+            The maximum delay between state requests in seconds
 
-        node:
-                The node that should be checked
+        factor:
 
-        name:
+            The factor the delay grows after every request
 
-                The name of the EEPROM value
+    Returns:
 
-        written:
+        The last state and the measured boot and ready time of the node
 
-                The value that should be written and then read afterwards
+    Examples:
 
-    """
+        Import required library code
 
-    return await check_write_read_eeprom_function(
-        node, name, written, isclose, "is not close to"
-    )
+        >>> from asyncio import run
+
+        Create a node that is ready after a certain amount of requests
+
+        >>> class BootingNode:
+        ...     def __init__(self, requests: int) -> None:
+        ...         self.requests = requests
+        ...     async def get_state(self) -> State:
+        ...         self.requests -= 1
+        ...         if self.requests > 2:
+        ...             raise CANConnectionError("Node not available")
+        ...         return (OPERATING if self.requests <= 0 else
+        ...                 State(mode="Get", location="Application",
+        ...                       state="Startup"))
+
+        Wait for a node that is already ready
+
+        >>> readiness = run(wait_for_ready(BootingNode(1)))
+        >>> readiness.attempts
+        1
+        >>> readiness.ready < 0.05
+        True
+
+        Wait for a node that needs some time to boot
 
+        >>> readiness = run(wait_for_ready(BootingNode(5)))
+        >>> readiness.state == OPERATING
+        True
+        >>> readiness.attempts
+        5
+        >>> readiness.responded < readiness.ready
+        True
 
-async def check_eeprom_product_data(node: SensorNode | STU, settings: DynaBox):
-    """Test if reading and writing EEPROM product data works
+        Stop waiting at the deadline
+
+        >>> readiness = run(wait_for_ready(BootingNode(100), timeout=0.2))
+        >>> readiness # doctest: +ELLIPSIS
+        Not ready (first response: never, ... requests)
+
+    """
+
+    logger = getLogger(__name__)
+    start = perf_counter()
+    deadline = start + timeout
+    state: State | None = None
+    responded: float | None = None
+    attempts = 0
+
+    while True:
+        attempts += 1
+        try:
+            state = await wait_for(
+                node.get_state(), max(deadline - perf_counter(), 0)
+            )
+        except (CANConnectionError, TimeoutError) as error:
+            logger.debug("State request %d failed: %r", attempts, error)
+        else:
+            if responded is None:
+                responded = perf_counter() - start
+            if state == expected:
+                readiness = Readiness(
+                    state, responded, perf_counter() - start, attempts
+                )
+                logger.info("%s", readiness)
+                return readiness
+
+        remaining = deadline - perf_counter()
+        if remaining <= 0:
+            break
+        await sleep(min(delay, remaining))
+        delay = min(delay * factor, maximum_delay)
+
+    readiness = Readiness(state, responded, None, attempts)
+    logger.warning("%s", readiness)
+    return readiness
+
+
+async def check_connection(
+    node: SensorNode | STU, timeout: float = 5
+) -> Readiness:
+    """Check connection to node
 
     Args:
 
         node:
 
-            The node that should be checked
+            The node for that should be checked
 
-        settings:
+        timeout:
 
-            The settings object that contains the node setting
+            The maximum amount of seconds to wait until the node is ready
+
+    Returns:
+
+        The measured boot and ready time of the node
 
     """
 
-    await check_write_read_eeprom(node, "GTIN", settings.gtin)
-    await check_write_read_eeprom(
-        node, "hardware version", Version.coerce(settings.hardware_version)
-    )
-    # I am not sure, if the firmware already inits the EEPROM with the firmware
-    # version. Writing back the same firmware version into the EEPROM should
-    # not be a problem though.
-    await check_write_read_eeprom(
-        node, "firmware version", await node.get_firmware_version()
-    )
-    # Originally we assumed that this value would be set by the
-    # firmware itself. However, according to tests with an empty EEPROM
-    # this is not the case.
-    await check_write_read_eeprom(
-        node, "release name", settings.firmware.release_name
-    )
-    await check_write_read_eeprom(
-        node, "serial number", settings.serial_number
+    # Wait until the state of the node matches our expectations
+    readiness = await wait_for_ready(node, OPERATING, timeout=timeout)
+
+    assert readiness.ready is not None, (
+        f"Expected state “{OPERATING}” does not match received state "
+        f"“{readiness.state}” after {timeout} seconds"
     )
-    await check_write_read_eeprom(node, "product name", settings.product_name)
-    await check_write_read_eeprom(node, "OEM data", settings.oem_data)
 
+    return readiness
 
-async def check_eeprom_statistics(node: SensorNode | STU, settings: DynaBox):
-    """Test if reading and writing EEPROM statistic data works
+
+async def eeprom_product_data(
+    node: SensorNode | STU, settings: DynaBox
+) -> dict[str, Any]:
+    """Get the expected EEPROM product data of a node
 
     Args:
 
@@ -227,32 +529,64 @@ async def check_eeprom_statistics(node: SensorNode | STU, settings: DynaBox):
 
             The settings object that contains the node setting
 
-    """
+    Returns:
 
-    for attribute in (
-        "power on cycles",
-        "power off cycles",
-        "operating time",
-        "under voltage counter",
-        "watchdog reset counter",
-    ):
-        await check_write_read_eeprom(node, attribute, 0)
-
-    await check_write_read_eeprom(
-        node, "production date", settings.production_date
-    )
-    await check_write_read_eeprom(node, "batch number", settings.batch_number)
+        A dictionary that maps the name of every product data value to its
+        expected value
 
+    """
 
-async def check_eeprom_status(node: SensorNode | STU):
-    """Test if reading and writing the EEPROM status byte works
+    return {
+        "GTIN": settings.gtin,
+        "hardware version": Version.coerce(settings.hardware_version),
+        # I am not sure, if the firmware already inits the EEPROM with the
+        # firmware version. Writing back the same firmware version into the
+        # EEPROM should not be a problem though.
+        "firmware version": await node.get_firmware_version(),
+        # Originally we assumed that this value would be set by the
+        # firmware itself. However, according to tests with an empty EEPROM
+        # this is not the case.
+        "release name": settings.firmware.release_name,
+        "serial number": settings.serial_number,
+        "product name": settings.product_name,
+        "OEM data": settings.oem_data,
+    }
+
+
+def eeprom_statistics(settings: DynaBox) -> dict[str, Any]:
+    """Get the expected EEPROM statistics data of a node
 
     Args:
 
-        node:
+        settings:
 
-            The node that should be checked
+            The settings object that contains the node setting
+
+    Returns:
+
+        A dictionary that maps the name of every statistics value to its
+        expected value
+
+    """
+
+    return {
+        "power on cycles": 0,
+        "power off cycles": 0,
+        "operating time": 0,
+        "under voltage counter": 0,
+        "watchdog reset counter": 0,
+        "production date": settings.production_date,
+        "batch number": settings.batch_number,
+    }
+
+
+def eeprom_status() -> dict[str, Any]:
+    """Get the expected EEPROM status byte of a node
+
+    Returns:
+
+        A dictionary that contains the expected status
 
     """
 
-    await check_write_read_eeprom(node, "status", EEPROMStatus("Initialized"))
+    return {"status": EEPROMStatus("Initialized")}
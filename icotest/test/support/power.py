@@ -0,0 +1,601 @@
+"""Support for continuous power usage measurements"""
+
+# -- Imports ------------------------------------------------------------------
+
+from __future__ import annotations
+
+from asyncio import CancelledError, Task, create_task, sleep
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from logging import getLogger
+from time import monotonic
+from types import TracebackType
+from typing import NamedTuple
+
+import numpy as np
+from pytest import StashKey
+
+from icotest.cli.commander import AsyncCommander, CommanderException
+
+# -- Attributes ---------------------------------------------------------------
+
+power_trace_key = StashKey["PowerTrace"]()
+"""Key for the running power usage measurement in the pytest configuration"""
+
+# -- Classes ------------------------------------------------------------------
+
+
+class PowerStatistics(NamedTuple):
+    """Power usage statistics of a certain state
+
+    Attributes:
+
+        samples:
+            Number of power samples
+
+        mean:
+            Average power usage in mW
+
+        median:
+            Median of the power usage in mW
+
+        percentile_5:
+            5th percentile of the power usage in mW
+
+        percentile_95:
+            95th percentile of the power usage in mW
+
+        peak:
+            Maximum power usage in mW
+
+    Examples:
+
+        Show the string representation of some example statistics
+
+        >>> PowerStatistics(samples=10, mean=30.5, median=30.25,
+        ...                 percentile_5=29, percentile_95=32.125, peak=40)
+        30.50 mW (Median: 30.25 mW, 5 %: 29.00 mW, 95 %: 32.12 mW, \
+Peak: 40.00 mW, 10 Samples)
+
+    """
+
+    samples: int
+    mean: float
+    median: float
+    percentile_5: float
+    percentile_95: float
+    peak: float
+
+    def __repr__(self) -> str:
+        """Get the textual representation of the statistics
+
+        Returns:
+
+            A string containing the power usage statistics
+
+        """
+
+        return (
+            f"{self.mean:.2f} mW (Median: {self.median:.2f} mW, "
+            f"5 %: {self.percentile_5:.2f} mW, "
+            f"95 %: {self.percentile_95:.2f} mW, "
+            f"Peak: {self.peak:.2f} mW, {self.samples} Samples)"
+        )
+
+
+class PowerTrace:
+    """Store a continuous power usage measurement and the states of a node
+
+    The trace stores the power samples together with timestamps (based on
+    ``time.monotonic``) that mark state changes of the measured node. This
+    way a single measurement can provide the power usage statistics of
+    multiple states (e.g. disconnected, connected and streaming).
+
+    The trace only keeps the samples that start at the oldest mark. This
+    way the memory usage does not grow during long test sessions (e.g. in
+    station mode), since ``measure`` removes its marks after the
+    measurement.
+
+    Args:
+
+        commander:
+
+            The Simplicity Commander object used to measure the power usage
+
+    Examples:
+
+        Add some example samples and states to a trace
+
+        >>> trace = PowerTrace()
+        >>> trace.extend(np.arange(10.0), np.array([2, 2, 2, 30, 30, 30,
+        ...                                         50, 51, 52, 53]))
+        >>> trace.mark("disconnected", time=0)
+        >>> trace.mark(None, time=2.5)
+        >>> trace.mark("connected", time=3)
+        >>> trace.mark("streaming", time=6)
+        >>> trace.mark(None, time=9)
+
+        Get the statistics for the different states
+
+        >>> trace.statistics("disconnected")
+        2.00 mW (Median: 2.00 mW, 5 %: 2.00 mW, 95 %: 2.00 mW, \
+Peak: 2.00 mW, 3 Samples)
+        >>> trace.statistics("connected").mean
+        30.0
+        >>> trace.statistics("streaming").peak
+        52.0
+
+        Samples before the oldest mark are discarded
+
+        >>> trace.marks = trace.marks[2:]
+        >>> trace.extend(np.array([10.0]), np.array([3]))
+        >>> trace.length, float(trace.times[0])
+        (8, 3.0)
+
+    """
+
+    def __init__(self, commander: AsyncCommander | None = None) -> None:
+
+        self.commander = commander
+        self.times = np.empty(2**16)
+        self.power = np.empty(2**16)
+        self.length = 0
+        self.marks: list[tuple[float, str | None]] = []
+        self.measurements: list[tuple[str, PowerStatistics]] = []
+        self.capture_task: Task | None = None
+
+    async def __aenter__(self) -> PowerTrace:
+        """Start the continuous power measurement
+
+        Returns:
+
+            The trace that stores the measured power usage
+
+        """
+
+        await self.start()
+
+        return self
+
+    async def __aexit__(
+        self,
+        exception_type: type[BaseException] | None,
+        exception_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        """Stop the continuous power measurement
+
+        Args:
+
+            exception_type:
+                The type of the exception in case of an exception
+
+            exception_value:
+                The value of the exception in case of an exception
+
+            traceback:
+                The traceback in case of an exception
+
+        """
+
+        await self.stop()
+
+        getLogger(__name__).info("Power usage: %s", self.measurements)
+
+    async def start(self) -> None:
+        """Start the continuous power measurement"""
+
+        assert self.commander is not None
+        await self.commander.enable_debug_mode()
+        self.capture_task = create_task(self.capture(self.commander))
+
+    async def stop(self) -> None:
+        """Stop the continuous power measurement"""
+
+        capture_task = self.capture_task
+        self.capture_task = None
+        if capture_task is not None:
+            capture_task.cancel()
+            try:
+                await capture_task
+            except (CancelledError, CommanderException):
+                pass
+
+    async def resume(self) -> None:
+        """Restart the continuous power measurement, if it stopped
+
+        The measurement stops, if ``commander aem dump`` fails (e.g. since
+        the debug adapter was disconnected). Restarting the measurement
+        makes sure that a single failure does not fail every following
+        power measurement of the test session.
+
+        Examples:
+
+            Import required library code
+
+            >>> from asyncio import run
+
+            Restart a measurement that failed
+
+            >>> class Commander:
+            ...     async def enable_debug_mode(self) -> None:
+            ...         pass
+            ...     async def stream_power_usage(self):
+            ...         while True:
+            ...             await sleep(0.01)
+            ...             yield [(monotonic(), 5.0)]
+            >>> async def fail() -> None:
+            ...     raise CommanderException("Debug adapter disconnected")
+            >>> async def measure_after_failure() -> PowerStatistics:
+            ...     async with PowerTrace(Commander()) as trace:
+            ...         await trace.stop()
+            ...         trace.capture_task = create_task(fail())
+            ...         await sleep(0)
+            ...         return await trace.measure("connected", seconds=0.1)
+            >>> run(measure_after_failure()).mean
+            5.0
+
+        """
+
+        capture_task = self.capture_task
+        if capture_task is None or not capture_task.done():
+            return
+
+        getLogger(__name__).warning(
+            "Restarting stopped continuous power usage measurement"
+        )
+        await self.stop()
+        await self.start()
+
+    @asynccontextmanager
+    async def paused(self) -> AsyncIterator[None]:
+        """Stop the continuous power measurement temporarily
+
+        The measurement (``commander aem dump``) uses the debug adapter.
+        Other commands that require the debug adapter (e.g. the firmware
+        upload) should therefore run while the measurement is paused.
+
+        Yields:
+
+            None:
+                Nothing, the measurement continues after the context ends
+
+        """
+
+        await self.stop()
+        try:
+            yield
+        finally:
+            await self.start()
+
+    async def capture(self, commander: AsyncCommander) -> None:
+        """Store power usage samples until the coroutine gets cancelled
+
+        Args:
+
+            commander:
+
+                The Simplicity Commander object used to measure the power
+                usage
+
+        """
+
+        offset: float | None = None
+        async for samples in commander.stream_power_usage():
+            data = np.asarray(samples)
+            if offset is None:
+                # Map time of measurement to time of host
+                offset = monotonic() - data[-1, 0]
+            self.extend(data[:, 0] + offset, data[:, 1])
+
+    def extend(self, times: np.ndarray, power: np.ndarray) -> None:
+        """Add power samples to the trace
+
+        Args:
+
+            times:
+
+                The (monotonic) timestamps of the samples in seconds
+
+            power:
+
+                The power usage of the samples in milliwatts
+
+        """
+
+        self.discard(self.marks[0][0] if self.marks else np.inf)
+
+        length = self.length + len(times)
+        if length > len(self.times):
+            capacity = max(length, 2 * len(self.times))
+            self.times = np.resize(self.times, capacity)
+            self.power = np.resize(self.power, capacity)
+
+        self.times[self.length : length] = times
+        self.power[self.length : length] = power
+        self.length = length
+
+    def discard(self, before: float) -> None:
+        """Remove the samples before a certain time
+
+        Args:
+
+            before:
+
+                The (monotonic) time of the oldest sample that should be kept
+
+        Examples:
+
+            Remove the first samples of a trace
+
+            >>> trace = PowerTrace()
+            >>> trace.extend(np.arange(6.0), np.arange(6.0) * 10)
+            >>> trace.discard(3.5)
+            >>> trace.power[:trace.length]
+            array([40., 50.])
+
+        """
+
+        start = int(np.searchsorted(self.times[: self.length], before))
+        if start <= 0:
+            return
+
+        length = self.length - start
+        self.times[:length] = self.times[start : self.length]
+        self.power[:length] = self.power[start : self.length]
+        self.length = length
+
+    def mark(self, state: str | None, time: float | None = None) -> None:
+        """Mark the start of a new state
+
+        Args:
+
+            state:
+
+                The name of the state that starts at the given time or
+                ``None`` if the following samples should not be associated
+                with any state (e.g. while the node changes its state)
+
+            time:
+
+                The (monotonic) time of the state change; ``None`` means that
+                the state changes now
+
+        """
+
+        self.marks.append((monotonic() if time is None else time, state))
+
+    def segments(self, state: str) -> list[tuple[float, float]]:
+        """Get the time ranges of a certain state
+
+        Args:
+
+            state:
+
+                The name of the state
+
+        Returns:
+
+            A list containing the start and end time of every segment that
+            belongs to the given state
+
+        Examples:
+
+            Get the segments of some example states
+
+            >>> trace = PowerTrace()
+            >>> trace.mark("connected", time=1)
+            >>> trace.mark("streaming", time=2)
+            >>> trace.mark("connected", time=3)
+            >>> trace.mark(None, time=4)
+            >>> trace.segments("connected")
+            [(1, 2), (3, 4)]
+
+        """
+
+        ends = [time for time, _ in self.marks[1:]] + [np.inf]
+        return [
+            (start, end)
+            for (start, mark_state), end in zip(self.marks, ends)
+            if mark_state == state
+        ]
+
+    def statistics(self, state: str) -> PowerStatistics:
+        """Get the power usage statistics of a certain state
+
+        Args:
+
+            state:
+
+                The name of the state
+
+        Returns:
+
+            The power usage statistics of all samples in the given state
+
+        Raises:
+
+            ValueError:
+
+                If the trace does not contain any samples for the given state
+
+        """
+
+        power = self.samples(self.segments(state))
+
+        if len(power) <= 0:
+            raise ValueError(f"No power samples for state “{state}”")
+
+        return self.describe(power)
+
+    def samples(self, segments: list[tuple[float, float]]) -> np.ndarray:
+        """Get the power samples inside certain time ranges
+
+        Args:
+
+            segments:
+
+                A list containing the start and end time of every time range
+
+        Returns:
+
+            The power values (in mW) of all samples inside the time ranges
+
+        Examples:
+
+            Get the samples of two time ranges
+
+            >>> trace = PowerTrace()
+            >>> trace.extend(np.arange(6.0), np.arange(6.0) * 10)
+            >>> trace.samples([(0.5, 2.5), (4, 5)])
+            array([10., 20., 40.])
+
+        """
+
+        times = self.times[: self.length]
+        ranges = np.array(segments).reshape(-1, 2)
+        starts = np.searchsorted(times, ranges[:, 0])
+        ends = np.searchsorted(times, ranges[:, 1])
+        return np.concatenate(
+            [self.power[start:end] for start, end in zip(starts, ends)]
+            + [np.empty(0)]
+        )
+
+    @staticmethod
+    def describe(power: np.ndarray) -> PowerStatistics:
+        """Calculate statistics for power samples
+
+        Args:
+
+            power:
+
+                The power values in mW (at least one value)
+
+        Returns:
+
+            The statistics of the given power values
+
+        """
+
+        median, percentile_5, percentile_95 = np.percentile(power, [50, 5, 95])
+        return PowerStatistics(
+            samples=len(power),
+            mean=float(power.mean()),
+            median=float(median),
+            percentile_5=float(percentile_5),
+            percentile_95=float(percentile_95),
+            peak=float(power.max()),
+        )
+
+    async def measure(
+        self, state: str, seconds: float = 1, timeout: float = 5
+    ) -> PowerStatistics:
+        """Measure the power usage of the current state
+
+        Args:
+
+            state:
+
+                The name of the current state
+
+            seconds:
+
+                The amount of seconds the power usage should be measured for
+
+            timeout:
+
+                The maximum amount of seconds to wait for the power samples
+                of the measurement after the given measurement time
+
+        Returns:
+
+            The power usage statistics of the measured state (only
+            containing samples of this measurement)
+
+        Examples:
+
+            Import required library code
+
+            >>> from asyncio import run
+
+            Measure the power usage of a trace that already contains samples
+
+            >>> async def measure_state(trace: PowerTrace) -> PowerStatistics:
+            ...     trace.extend(monotonic() + np.arange(0.0, 0.2, 0.01),
+            ...                  np.full(20, 5.0))
+            ...     return await trace.measure("connected", seconds=0.1)
+            >>> trace = PowerTrace()
+            >>> run(measure_state(trace)).mean
+            5.0
+            >>> trace.marks, trace.measurements[0][0]
+            ([], 'connected')
+
+            The next samples replace the samples of the measurement
+
+            >>> trace.extend(np.array([monotonic()]), np.array([5.0]))
+            >>> trace.length
+            1
+
+            A stopped measurement does not leave its marks behind
+
+            >>> async def fail() -> None:
+            ...     raise CommanderException("Debug adapter disconnected")
+            >>> async def measure_stopped(trace: PowerTrace) -> None:
+            ...     trace.capture_task = create_task(fail())
+            ...     await trace.measure("connected", seconds=0.1)
+            >>> run(measure_stopped(trace))
+            Traceback (most recent call last):
+               ...
+            icotest.cli.commander.CommanderException: Debug adapter \
+disconnected
+            >>> trace.marks
+            []
+
+        Raises:
+
+            CommanderException:
+
+                If the continuous measurement stopped
+
+            ValueError:
+
+                If the trace does not contain samples for the measurement
+
+        """
+
+        await self.resume()
+
+        start = monotonic()
+        end: float | None = None
+        self.mark(state, start)
+        try:
+            await sleep(seconds)
+            end = monotonic()
+            self.mark(None, end)
+
+            capture_task = self.capture_task
+            # Wait until the trace contains all samples of the measurement
+            while self.length <= 0 or self.times[self.length - 1] < end:
+                if capture_task is not None and capture_task.done():
+                    capture_task.result()
+                    raise CommanderException(
+                        "Continuous power usage measurement stopped"
+                    )
+                if monotonic() > end + timeout:
+                    break
+                await sleep(0.05)
+
+            power = self.samples([(start, end)])
+        finally:
+            # The samples of the measurement are not required anymore
+            self.marks.remove((start, state))
+            if end is not None:
+                self.marks.remove((end, None))
+
+        if len(power) <= 0:
+            raise ValueError(f"No power samples for state “{state}”")
+
+        statistics = self.describe(power)
+        self.measurements.append((state, statistics))
+
+        return statistics
@@ -0,0 +1,500 @@
+"""Record streaming data of sensor nodes and replay it without hardware"""
+
+# -- Imports ------------------------------------------------------------------
+
+from __future__ import annotations
+
+from collections.abc import AsyncIterator, Iterator, Mapping
+from contextlib import asynccontextmanager
+from json import dumps, loads
+from logging import getLogger
+from pathlib import Path
+from shutil import rmtree
+from typing import Any, NamedTuple, NoReturn
+
+from _pytest.outcomes import Skipped
+from icotronic.can import SensorConfiguration, SensorNode
+from icotronic.can import StreamingConfiguration
+from icotronic.can.streaming import StreamingData
+from pytest import skip
+
+import numpy as np
+
+from icotest.test.support.streaming import StreamingCollector
+
+# -- Functions ----------------------------------------------------------------
+
+
+def channels_of(configuration: StreamingConfiguration) -> Mapping[str, bool]:
+    """Get the enabled channels of a streaming configuration
+
+    Args:
+
+        configuration:
+
+            The streaming configuration
+
+    Returns:
+
+        A dictionary that specifies which channels are enabled
+
+    Examples:
+
+        Get the enabled channels of a streaming configuration
+
+        >>> channels_of(StreamingConfiguration(first=False, second=True))
+        {'first': False, 'second': True, 'third': False}
+
+    """
+
+    return {
+        "first": configuration.first,
+        "second": configuration.second,
+        "third": configuration.third,
+    }
+
+
+# -- Classes ------------------------------------------------------------------
+
+
+class Recording(NamedTuple):
+    """Streaming data of a single data stream
+
+    Attributes:
+
+        configuration:
+            The streaming configuration used to collect the data
+
+        values:
+            The (raw) values of the enabled channels (one row per channel)
+
+        counters:
+            The message counters of the streaming messages
+
+        timestamps:
+            The timestamps of the streaming messages in µs
+
+        metadata:
+            Additional information about the measurement (e.g. the ADC and
+            sensor configuration)
+
+    Examples:
+
+        Import required library code
+
+        >>> from tempfile import TemporaryDirectory
+
+        Store and load streaming data
+
+        >>> collector = StreamingCollector(
+        ...     StreamingConfiguration(first=True, third=True), messages=2)
+        >>> collector.append(StreamingData(values=[1, 2], counter=1,
+        ...                                timestamp=0.5))
+        >>> collector.append(StreamingData(values=[3, 4], counter=2,
+        ...                                timestamp=0.75))
+        >>> with TemporaryDirectory() as directory:
+        ...     Recording.from_collector(collector, {"test": "example"}).save(
+        ...         Path(directory))
+        ...     recording = Recording.load(Path(directory))
+        ...     [data.values for data in recording.messages()]
+        ...     recording.metadata
+        [[1.0, 2.0], [3.0, 4.0]]
+        {'test': 'example'}
+
+    """
+
+    configuration: StreamingConfiguration
+    values: np.ndarray
+    counters: np.ndarray
+    timestamps: np.ndarray
+    metadata: dict[str, Any]
+
+    @classmethod
+    def from_collector(
+        cls, collector: StreamingCollector, metadata: dict[str, Any]
+    ) -> Recording:
+        """Create a recording from collected streaming data
+
+        Args:
+
+            collector:
+
+                The collector that stores the streaming data
+
+            metadata:
+
+                Additional information about the measurement
+
+        Returns:
+
+            A recording containing (views of) the collected data
+
+        """
+
+        return cls(
+            configuration=collector.configuration,
+            values=collector.values,
+            counters=collector.counters,
+            timestamps=collector.timestamps,
+            metadata=metadata,
+        )
+
+    @classmethod
+    def load(cls, directory: Path) -> Recording:
+        """Load a recording
+
+        The arrays of the returned recording are memory mapped, which means
+        loading the recording does not read the streaming data into memory.
+
+        Args:
+
+            directory:
+
+                The directory that stores the recording
+
+        Returns:
+
+            The recording stored in the given directory
+
+        """
+
+        metadata = loads(
+            (directory / "metadata.json").read_text(encoding="utf-8")
+        )
+        return cls(
+            configuration=StreamingConfiguration(
+                **metadata.pop("streaming configuration")
+            ),
+            values=np.load(directory / "values.npy", mmap_mode="r"),
+            counters=np.load(directory / "counters.npy", mmap_mode="r"),
+            timestamps=np.load(directory / "timestamps.npy", mmap_mode="r"),
+            metadata=metadata,
+        )
+
+    def save(self, directory: Path) -> None:
+        """Store the recording
+
+        Args:
+
+            directory:
+
+                The directory that should store the recording
+
+        """
+
+        directory.mkdir(parents=True, exist_ok=True)
+        np.save(directory / "values.npy", self.values)
+        np.save(directory / "counters.npy", self.counters)
+        np.save(directory / "timestamps.npy", self.timestamps)
+        (directory / "metadata.json").write_text(
+            dumps(
+                {
+                    "streaming configuration": channels_of(self.configuration),
+                    **self.metadata,
+                },
+                indent=2,
+            ),
+            encoding="utf-8",
+        )
+
+    def messages(self) -> Iterator[StreamingData]:
+        """Recreate the streaming messages of the recording
+
+        Yields:
+
+            StreamingData:
+                The streaming data of one message after another
+
+        """
+
+        samples = self.values.shape[1] // max(len(self.counters), 1)
+        for index, (counter, timestamp) in enumerate(
+            zip(self.counters, self.timestamps)
+        ):
+            start = index * samples
+            yield StreamingData(
+                values=self.values[:, start : start + samples]
+                .T.ravel()
+                .tolist(),
+                counter=int(counter),
+                timestamp=float(timestamp) / 1_000_000,
+            )
+
+
+class RecordingNode:
+    """Store the streaming data of a sensor node while a test uses it
+
+    The class forwards all requests to the given sensor node. Every data
+    stream opened by the test is stored in a separate (numbered)
+    subdirectory of the given directory.
+
+    Args:
+
+        node:
+
+            The (connected) sensor node
+
+        directory:
+
+            The directory that stores the streaming data of the test
+
+    """
+
+    def __init__(self, node: SensorNode, directory: Path) -> None:
+
+        self.node = node
+        self.directory = directory
+        self.streams = 0
+        self.adc_configuration: dict[str, Any] | None = None
+        self.sensor_configuration: dict[str, Any] | None = None
+        if directory.exists():
+            rmtree(directory)
+
+    def __getattr__(self, name: str) -> Any:
+        """Forward all other attributes to the sensor node
+
+        Args:
+
+            name:
+
+                The name of the requested attribute
+
+        Returns:
+
+            The attribute of the sensor node
+
+        """
+
+        return getattr(self.node, name)
+
+    async def set_adc_configuration(self, **configuration: Any) -> None:
+        """Change and remember the ADC configuration of the sensor node
+
+        Args:
+
+            **configuration:
+
+                The ADC configuration values
+
+        """
+
+        await self.node.set_adc_configuration(**configuration)
+        self.adc_configuration = None
+
+    async def set_sensor_configuration(
+        self, sensors: SensorConfiguration
+    ) -> None:
+        """Change and remember the sensor configuration of the sensor node
+
+        Args:
+
+            sensors:
+
+                The sensor numbers of the different measurement channels
+
+        """
+
+        await self.node.set_sensor_configuration(sensors)
+        self.sensor_configuration = dict(sensors)
+
+    @asynccontextmanager
+    async def open_data_stream(
+        self, channels: StreamingConfiguration, **arguments: Any
+    ) -> AsyncIterator[AsyncIterator[tuple[StreamingData, int]]]:
+        """Open a data stream and record all streaming messages of it
+
+        Args:
+
+            channels:
+
+                Specifies which measurement channels should be enabled
+
+            **arguments:
+
+                Additional arguments for opening the data stream
+
+        Yields:
+
+            AsyncIterator[tuple[StreamingData, int]]:
+                An iterator over the streaming data and the number of lost
+                messages
+
+        """
+
+        if self.adc_configuration is None:
+            self.adc_configuration = dict(
+                await self.node.get_adc_configuration()
+            )
+
+        # Store the values of every message as soon as it arrives
+        collector = StreamingCollector(channels, messages=1024)
+
+        async def record(
+            stream: AsyncIterator[tuple[StreamingData, int]],
+        ) -> AsyncIterator[tuple[StreamingData, int]]:
+            async for data, lost in stream:
+                if collector.full:
+                    collector.grow()
+                collector.append(data)
+                yield data, lost
+
+        async with self.node.open_data_stream(channels, **arguments) as stream:
+            yield record(stream)
+
+        directory = self.directory / str(self.streams)
+        Recording.from_collector(
+            collector,
+            {
+                "adc configuration": self.adc_configuration,
+                "sensor configuration": self.sensor_configuration,
+            },
+        ).save(directory)
+        self.streams += 1
+        getLogger(__name__).info("Stored streaming data in “%s”", directory)
+
+
+class ReplayNode:
+    """Replay recorded streaming data instead of using a sensor node
+
+    The node returns the recorded data streams in the order they were
+    recorded. Tests that use any other functionality of the sensor node
+    are skipped.
+
+    Args:
+
+        directory:
+
+            The directory that contains the recorded streams of a test
+
+    Examples:
+
+        Import required library code
+
+        >>> from asyncio import run
+        >>> from tempfile import TemporaryDirectory
+
+        Replay recorded streaming data
+
+        >>> async def replay(directory: Path) -> list[float]:
+        ...     node = ReplayNode(directory)
+        ...     await node.set_adc_configuration(prescaler=2)
+        ...     async with node.open_data_stream(
+        ...             StreamingConfiguration(first=True)) as stream:
+        ...         return [data.values async for data, _ in stream]
+        >>> collector = StreamingCollector(
+        ...     StreamingConfiguration(first=True), messages=1)
+        >>> collector.append(StreamingData(values=[1, 2, 3], counter=1,
+        ...                                timestamp=0))
+        >>> with TemporaryDirectory() as directory:
+        ...     Recording.from_collector(collector, {}).save(
+        ...         Path(directory) / "0")
+        ...     run(replay(Path(directory)))
+        [[1.0, 2.0, 3.0]]
+
+    """
+
+    def __init__(self, directory: Path) -> None:
+
+        self.directory = directory
+        self.streams = 0
+
+    def __getattr__(self, name: str) -> NoReturn:
+        """Skip the test, if it uses functionality that requires hardware
+
+        Args:
+
+            name:
+
+                The name of the requested attribute
+
+        Raises:
+
+            Skipped:
+
+                Always, since replay mode only supports streaming data
+
+        """
+
+        raise Skipped(f"Replay mode does not support “{name}”")
+
+    async def set_adc_configuration(self, **configuration: Any) -> None:
+        """Ignore changes of the ADC configuration
+
+        Args:
+
+            **configuration:
+
+                The ADC configuration values
+
+        """
+
+        getLogger(__name__).debug(
+            "Ignoring ADC configuration %s", configuration
+        )
+
+    async def set_sensor_configuration(
+        self, sensors: SensorConfiguration
+    ) -> None:
+        """Ignore changes of the sensor configuration
+
+        Args:
+
+            sensors:
+
+                The sensor numbers of the different measurement channels
+
+        """
+
+        getLogger(__name__).debug("Ignoring sensor configuration %s", sensors)
+
+    @asynccontextmanager
+    async def open_data_stream(
+        self, channels: StreamingConfiguration, **_: Any
+    ) -> AsyncIterator[AsyncIterator[tuple[StreamingData, int]]]:
+        """Replay the next recorded data stream
+
+        Args:
+
+            channels:
+
+                Specifies which measurement channels should be enabled
+
+        Yields:
+
+            AsyncIterator[tuple[StreamingData, int]]:
+                An iterator over the recorded streaming data and the number
+                of lost messages
+
+        Raises:
+
+            ValueError:
+
+                If the recorded data stream uses a different streaming
+                configuration
+
+        """
+
+        directory = self.directory / str(self.streams)
+        if not directory.exists():
+            skip(f"No recorded streaming data in “{directory}”")
+        recording = Recording.load(directory)
+        self.streams += 1
+
+        if channels_of(recording.configuration) != channels_of(channels):
+            raise ValueError(
+                "Recorded streaming configuration "
+                f"“{recording.configuration}” does not match requested "
+                f"configuration “{channels}”"
+            )
+
+        getLogger(__name__).info(
+            "Replaying streaming data of “%s” (%s)",
+            directory,
+            recording.metadata,
+        )
+
+        async def replay() -> AsyncIterator[tuple[StreamingData, int]]:
+            for data in recording.messages():
+                yield data, 0
+
+        yield replay()
@@ -0,0 +1,410 @@
+"""Rerun failed tests depending on the cause of the failure"""
+
+# -- Imports ------------------------------------------------------------------
+
+from __future__ import annotations
+
+from collections.abc import Generator
+from logging import getLogger
+from time import sleep
+from typing import cast, Literal
+
+from _pytest.runner import runtestprotocol
+from icotronic.can.error import CANConnectionError, CANInitError
+from pytest import CallInfo, Config, hookimpl, Item, skip, TestReport
+
+from icotest.cli.commander import (
+    CommanderException,
+    CommanderReturnCodeException,
+)
+
+# -- Types --------------------------------------------------------------------
+
+Failure = Literal["permanent", "transient", "other"]
+"""Classification of the cause of a test failure"""
+
+# -- Attributes ---------------------------------------------------------------
+
+PERMANENT_ERROR_REASONS = {"programmer not connected", "device not connected"}
+"""Simplicity Commander error reasons (``Commander.error_reasons``) that will
+not go away, if we run the test again"""
+
+PERMANENT_ERRORS: tuple[type[BaseException], ...] = (CANInitError,)
+"""Exceptions that indicate a problem of the test setup"""
+
+TRANSIENT_ERRORS: tuple[type[BaseException], ...] = (
+    CANConnectionError,
+    CommanderException,
+    ConnectionError,
+    TimeoutError,
+)
+"""Exceptions that might not happen again, if we run the test again"""
+
+# -- Functions ----------------------------------------------------------------
+
+
+def classify(error: BaseException) -> Failure:
+    """Classify the cause of a test failure
+
+    Args:
+
+        error:
+
+            The exception that caused the test to fail
+
+    Returns:
+
+        - ``"permanent"``, if running the test again will most likely fail in
+          the same way (e.g. the programming board is not connected),
+        - ``"transient"``, if the problem might go away (e.g. the Bluetooth
+          connection was lost), or
+        - ``"other"`` for all other problems (e.g. a failed assertion)
+
+    Examples:
+
+        Import required library code
+
+        >>> from icotronic.can.error import NoResponseError
+
+        Classify some example exceptions
+
+        >>> classify(CommanderReturnCodeException(
+        ...     "Unable to upload firmware", ["programmer not connected"]))
+        'permanent'
+        >>> classify(NoResponseError("Unable to get state"))
+        'transient'
+        >>> classify(AssertionError("Supply voltage too low"))
+        'other'
+
+        Classify exception groups based on their most severe exception
+
+        >>> classify(ExceptionGroup("Streaming failed", [
+        ...     NoResponseError("Unable to stop stream"),
+        ...     CANInitError("No CAN adapter")]))
+        'permanent'
+        >>> classify(ExceptionGroup("Streaming failed", [
+        ...     NoResponseError("Unable to stop stream"),
+        ...     AssertionError("Noise too high")]))
+        'other'
+
+    """
+
+    if isinstance(error, BaseExceptionGroup):
+        failures = {classify(exception) for exception in error.exceptions}
+        for failure in ("permanent", "other"):
+            if failure in failures:
+                return failure
+        return "transient"
+
+    if isinstance(error, PERMANENT_ERRORS) or (
+        isinstance(error, CommanderReturnCodeException)
+        and PERMANENT_ERROR_REASONS.intersection(error.error_reasons)
+    ):
+        return "permanent"
+
+    if isinstance(error, TRANSIENT_ERRORS):
+        return "transient"
+
+    return "other"
+
+
+# -- Classes ------------------------------------------------------------------
+
+
+class RetryPolicy:
+    """Pytest plugin that reruns failed tests based on the cause of failure
+
+    The plugin never reruns tests that failed because of a permanent problem
+    of the test setup. Tests that failed because of a transient problem run
+    again after an exponentially growing delay.
+
+    Tests marked with ``prerequisite`` are required by all following tests
+    that use one of the fixtures given as marker arguments. If a
+    prerequisite fails, then the plugin skips these tests immediately.
+
+    Args:
+
+        transient:
+
+            The maximum number of reruns of a test that failed because of a
+            transient problem
+
+        other:
+
+            The maximum number of reruns of a test that failed for another
+            reason (e.g. a failed assertion)
+
+        delay:
+
+            The delay in seconds before the first rerun
+
+        maximum_delay:
+
+            The maximum delay in seconds between two runs of a test
+
+    """
+
+    def __init__(
+        self,
+        transient: int = 0,
+        other: int = 0,
+        delay: float = 0.5,
+        maximum_delay: float = 8,
+    ) -> None:
+
+        self.reruns: dict[Failure, int] = {
+            "permanent": 0,
+            "transient": transient,
+            "other": other,
+        }
+        self.delay = delay
+        self.maximum_delay = maximum_delay
+        # Maps fixture names to the failed prerequisite that requires them
+        self.failed_prerequisites: dict[str, str] = {}
+        self.logger = getLogger(__name__)
+
+    def rerun_delay(self, rerun: int) -> float:
+        """Get the delay before a rerun of a test
+
+        Args:
+
+            rerun:
+
+                The number of the rerun (starting with 1)
+
+        Returns:
+
+            The delay in seconds
+
+        Examples:
+
+            Get the delays of some reruns
+
+            >>> policy = RetryPolicy(delay=0.5, maximum_delay=3)
+            >>> [policy.rerun_delay(rerun) for rerun in range(1, 6)]
+            [0.5, 1.0, 2.0, 3, 3]
+
+        """
+
+        return min(self.delay * 2 ** (rerun - 1), self.maximum_delay)
+
+    def update_prerequisites(self, item: Item, failed: bool) -> None:
+        """Store the result of a prerequisite
+
+        Args:
+
+            item:
+
+                The test that finished
+
+            failed:
+
+                Specifies if the test failed or not
+
+        """
+
+        for marker in item.iter_markers("prerequisite"):
+            for fixture in marker.args:
+                if failed:
+                    self.failed_prerequisites[fixture] = item.nodeid
+                else:
+                    self.failed_prerequisites.pop(fixture, None)
+
+    # -- Hooks ----------------------------------------------------------------
+
+    def pytest_configure(self, config: Config) -> None:
+        """Register the marker for prerequisites
+
+        Args:
+
+            config:
+
+                The pytest configuration
+
+        """
+
+        config.addinivalue_line(
+            "markers",
+            "prerequisite(*fixtures): skip the following tests that use one "
+            "of the given fixtures, if this test fails",
+        )
+
+    @hookimpl(tryfirst=True)
+    def pytest_runtest_setup(self, item: Item) -> None:
+        """Skip tests whose prerequisite failed
+
+        Args:
+
+            item:
+
+                The test that should be set up
+
+        """
+
+        if item.get_closest_marker("prerequisite") is not None:
+            return
+
+        for fixture in getattr(item, "fixturenames", ()):
+            prerequisite = self.failed_prerequisites.get(fixture)
+            if prerequisite is not None:
+                skip(f"Prerequisite “{prerequisite}” failed")
+
+    @hookimpl(wrapper=True)
+    def pytest_runtest_makereport(
+        self, call: CallInfo[None]
+    ) -> Generator[None, TestReport, TestReport]:
+        """Classify the cause of failed test phases
+
+        Args:
+
+            call:
+
+                Information about the test phase
+
+        Returns:
+
+            The report of the test phase
+
+        """
+
+        report = yield
+        if report.failed and call.excinfo is not None:
+            report.user_properties.append(
+                ("failure", classify(call.excinfo.value))
+            )
+
+        return report
+
+    @hookimpl(tryfirst=True)
+    def pytest_runtest_protocol(
+        self, item: Item, nextitem: Item | None
+    ) -> bool:
+        """Run a test and rerun it depending on the cause of failure
+
+        Args:
+
+            item:
+
+                The test that should be executed
+
+            nextitem:
+
+                The test that will be executed afterwards
+
+        Returns:
+
+            ``True`` to stop the default implementation of the test protocol
+
+        """
+
+        ihook = item.ihook
+        rerun = 0
+        while True:
+            ihook.pytest_runtest_logstart(
+                nodeid=item.nodeid, location=item.location
+            )
+            reports = runtestprotocol(item, nextitem=nextitem, log=False)
+            failed = next(
+                (
+                    report
+                    for report in reports
+                    if report.failed and not hasattr(report, "wasxfail")
+                ),
+                None,
+            )
+            failure: Failure | None = (
+                None
+                if failed is None
+                else cast(
+                    Failure,
+                    dict(failed.user_properties).get("failure", "other"),
+                )
+            )
+
+            if failure is None or rerun >= self.reruns[failure]:
+                for report in reports:
+                    ihook.pytest_runtest_logreport(report=report)
+                ihook.pytest_runtest_logfinish(
+                    nodeid=item.nodeid, location=item.location
+                )
+                break
+
+            assert failed is not None
+            for report in reports:
+                if report is failed:
+                    report.outcome = "rerun"  # type: ignore[assignment]
+                    ihook.pytest_runtest_logreport(report=report)
+                    break
+                ihook.pytest_runtest_logreport(report=report)
+            ihook.pytest_runtest_logfinish(
+                nodeid=item.nodeid, location=item.location
+            )
+
+            rerun += 1
+            delay = self.rerun_delay(rerun)
+            self.logger.info(
+                "Rerun %d of “%s” after %s failure in %s seconds",
+                rerun,
+                item.nodeid,
+                failure,
+                delay,
+            )
+            sleep(delay)
+            self.remove_failed_fixtures(item)
+
+        self.update_prerequisites(item, failed=failed is not None)
+
+        return True
+
+    def pytest_report_teststatus(
+        self, report: TestReport
+    ) -> tuple[str, str, tuple[str, dict[str, bool]]] | None:
+        """Show reruns in the terminal output
+
+        Args:
+
+            report:
+
+                The report of a test phase
+
+        Returns:
+
+            The category, short and verbose description of reruns or
+            ``None`` for all other outcomes
+
+        """
+
+        if report.outcome == "rerun":
+            return "rerun", "R", ("RERUN", {"yellow": True})
+
+        return None
+
+    @staticmethod
+    def remove_failed_fixtures(item: Item) -> None:
+        """Tear down all fixtures before a rerun, if a fixture failed
+
+        Pytest caches the exception of a failed fixture (e.g. a failed
+        connection to the STU) until the fixture goes out of scope. Without
+        this cleanup a rerun would therefore fail with the cached exception
+        instead of setting up the fixture again.
+
+        Args:
+
+            item:
+
+                The test that will be executed again
+
+        """
+
+        fixture_info = getattr(item, "_fixtureinfo", None)
+        if fixture_info is None:
+            return
+
+        if any(
+            fixture_definition.cached_result is not None
+            and fixture_definition.cached_result[2] is not None
+            for fixture_definitions in fixture_info.name2fixturedefs.values()
+            for fixture_definition in fixture_definitions
+        ):
+            # pylint: disable=protected-access
+            item.session._setupstate.teardown_exact(None)
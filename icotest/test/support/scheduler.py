@@ -0,0 +1,437 @@
+"""Order tests to minimize reconnects and configuration changes of nodes"""
+
+# -- Imports ------------------------------------------------------------------
+
+from __future__ import annotations
+
+from collections.abc import Mapping, Sequence
+from logging import getLogger
+from typing import Any, NamedTuple
+from weakref import WeakKeyDictionary
+
+from icotronic.can import SensorConfiguration, SensorNode
+from pytest import Item, StashKey
+
+# -- Types --------------------------------------------------------------------
+
+Values = tuple[tuple[str, Any], ...]
+"""Hashable representation of configuration values"""
+
+# -- Attributes ---------------------------------------------------------------
+
+restore_key = StashKey[bool]()
+"""Key that marks the last test which requires a non-default configuration"""
+
+CONNECTION_FIXTURES = ("stu", "sensor_node", "sth")
+"""Fixtures that connect to a node (in ascending order of setup cost)"""
+
+# -- Functions ----------------------------------------------------------------
+
+
+def freeze(values: Mapping[str, Any] | None) -> Values | None:
+    """Convert configuration values into a hashable representation
+
+    Args:
+
+        values:
+
+            The configuration values or ``None`` for the default
+            configuration
+
+    Returns:
+
+        A sorted tuple of key-value pairs or ``None`` for the default
+        configuration
+
+    Examples:
+
+        Freeze an example ADC configuration
+
+        >>> freeze({"reference_voltage": 1.8, "prescaler": 2})
+        (('prescaler', 2), ('reference_voltage', 1.8))
+        >>> freeze(None) is None
+        True
+
+    """
+
+    return None if values is None else tuple(sorted(dict(values).items()))
+
+
+# -- Classes ------------------------------------------------------------------
+
+
+class Configuration(NamedTuple):
+    """Channel configuration a test requires
+
+    Attributes:
+
+        adc:
+            The ADC configuration (``None`` for the default configuration)
+
+        sensors:
+            The sensor configuration (``None`` for the default configuration)
+
+    """
+
+    adc: Values | None = None
+    sensors: Values | None = None
+
+    @classmethod
+    def of(cls, item: Item) -> Configuration:
+        """Get the configuration required by a test
+
+        Args:
+
+            item:
+
+                The test
+
+        Returns:
+
+            The configuration specified by the marker ``node_configuration``
+            of the test
+
+        """
+
+        marker = item.get_closest_marker("node_configuration")
+        if marker is None:
+            return cls()
+
+        return cls(
+            adc=freeze(marker.kwargs.get("adc")),
+            sensors=freeze(marker.kwargs.get("sensors")),
+        )
+
+    def changes(self, other: Configuration) -> int:
+        """Get the number of requests required to switch configurations
+
+        Args:
+
+            other:
+
+                The configuration that should be used afterwards
+
+        Returns:
+
+            The number of configuration parts that differ
+
+        Examples:
+
+            Compare some example configurations
+
+            >>> default = Configuration()
+            >>> adc = Configuration(adc=freeze({"reference_voltage": 1.8}))
+            >>> both = adc._replace(sensors=freeze({"first": 2}))
+            >>> default.changes(default), default.changes(adc)
+            (0, 1)
+            >>> default.changes(both), adc.changes(both)
+            (2, 1)
+
+        """
+
+        return sum(current != target for current, target in zip(self, other))
+
+
+class Requirements(NamedTuple):
+    """Node state a test requires
+
+    Attributes:
+
+        phase:
+            The position of the test group in the test run:
+
+            0. Tests that do not use a node connection (e.g. the firmware
+               upload, which restarts the node)
+            1. Prerequisites (e.g. the connection test)
+            2. Tests that use the default configuration of a pooled
+               connection
+            3. Tests that require a specific configuration
+            4. Tests that require a fresh connection, which closes the
+               pooled connections, or a disconnected sensor node
+
+        node:
+            The index of the used connection fixture in
+            ``CONNECTION_FIXTURES`` (-1, if the test does not use a node)
+
+        configuration:
+            The required channel configuration
+
+    """
+
+    phase: int
+    node: int
+    configuration: Configuration
+
+    @classmethod
+    def of(cls, item: Item) -> Requirements:
+        """Get the requirements of a test
+
+        Args:
+
+            item:
+
+                The test
+
+        Returns:
+
+            The requirements of the given test
+
+        """
+
+        fixtures = getattr(item, "fixturenames", ())
+        node = max(
+            (
+                index
+                for index, fixture in enumerate(CONNECTION_FIXTURES)
+                if fixture in fixtures
+            ),
+            default=-1,
+        )
+        configuration = Configuration.of(item)
+
+        if node < 0:
+            phase = 0
+        elif item.get_closest_marker("prerequisite") is not None:
+            phase = 1
+        elif any(
+            item.get_closest_marker(marker) is not None
+            for marker in ("fresh_connection", "disconnected_sensor_node")
+        ):
+            phase = 4
+        elif configuration != Configuration():
+            phase = 3
+        else:
+            phase = 2
+
+        return cls(phase, node, configuration)
+
+
+def configuration_order(
+    configurations: Sequence[Configuration],
+) -> dict[Configuration, int]:
+    """Order configurations to minimize the number of changes
+
+    Starting with the default configuration, the function always chooses the
+    configuration that requires the least changes next. If multiple
+    configurations require the same amount of changes, then the function
+    uses the configuration that was specified first.
+
+    Args:
+
+        configurations:
+
+            The configurations in the order of the source code
+
+    Returns:
+
+        A dictionary that maps every configuration to its position
+
+    Examples:
+
+        Order some example configurations
+
+        >>> low = freeze({"reference_voltage": 1.8})
+        >>> first, second = freeze({"first": 2}), freeze({"first": 7})
+        >>> configurations = [Configuration(low, first),
+        ...                   Configuration(None, second),
+        ...                   Configuration(low, second)]
+        >>> order = configuration_order(configurations)
+        >>> [order[configuration] for configuration in configurations]
+        [2, 0, 1]
+
+        The new order requires three instead of five configuration changes
+
+        >>> ordered = sorted(configurations, key=order.__getitem__)
+        >>> sum(before.changes(after) for before, after in zip(
+        ...     [Configuration()] + ordered, ordered))
+        3
+
+    """
+
+    remaining = list(dict.fromkeys(configurations))
+    current = Configuration()
+    order: dict[Configuration, int] = {}
+    while remaining:
+        current = min(remaining, key=current.changes)
+        remaining.remove(current)
+        order[current] = len(order)
+
+    return order
+
+
+def schedule(items: Sequence[Item]) -> list[Item]:
+    """Order tests to minimize reconnects and configuration changes
+
+    The function keeps the order of the source code for tests with the same
+    requirements (see ``Requirements``). It marks the last test that
+    requires a specific configuration, so the ``sth`` fixture restores the
+    default configuration only once after this test.
+
+    Args:
+
+        items:
+
+            The collected tests
+
+    Returns:
+
+        The tests in the order they should be executed
+
+    """
+
+    requirements = {item: Requirements.of(item) for item in items}
+    order = configuration_order(
+        [requirement.configuration for requirement in requirements.values()]
+    )
+    scheduled = sorted(
+        items,
+        key=lambda item: (
+            requirements[item].phase,
+            requirements[item].node,
+            order[requirements[item].configuration],
+        ),
+    )
+
+    configured = [item for item in scheduled if requirements[item].phase == 3]
+    if configured:
+        configured[-1].stash[restore_key] = True
+
+    changes = sum(
+        before.changes(after)
+        for before, after in zip(
+            [Configuration()]
+            + [requirements[item].configuration for item in configured],
+            [requirements[item].configuration for item in configured]
+            + [Configuration()],
+        )
+    )
+    getLogger(__name__).info(
+        "Scheduled %d tests (%d configuration changes)", len(items), changes
+    )
+
+    return scheduled
+
+
+class NodeConfigurator:
+    """Change the channel configuration of sensor nodes only if required
+
+    The configurator remembers the current configuration of every node.
+    Before it changes a configuration for the first time, it reads the
+    original configuration of the node, which it uses as default
+    configuration.
+
+    """
+
+    def __init__(self) -> None:
+
+        self.current: WeakKeyDictionary[SensorNode, Configuration] = (
+            WeakKeyDictionary()
+        )
+        self.original: WeakKeyDictionary[SensorNode, Configuration] = (
+            WeakKeyDictionary()
+        )
+
+    async def apply(
+        self,
+        node: SensorNode,
+        configuration: Configuration,
+        target: SensorNode | None = None,
+    ) -> None:
+        """Change the configuration of a node, if it differs
+
+        Args:
+
+            node:
+
+                The node whose configuration should be changed
+
+            configuration:
+
+                The required configuration; configuration parts that are
+                ``None`` use the original configuration of the node
+
+            target:
+
+                The object used to change the configuration (e.g. a node that
+                records the configuration); ``None`` means ``node``
+
+        Examples:
+
+            Import required library code
+
+            >>> from asyncio import run
+            >>> from icotest.test.support.simulation import SimulatedNode
+
+            Change the ADC configuration of a simulated node
+
+            >>> async def configure(node: SimulatedNode) -> list[float]:
+            ...     configurator = NodeConfigurator()
+            ...     low = Configuration(adc=freeze({"reference_voltage": 1.8}))
+            ...     references = []
+            ...     for configuration in (low, low, Configuration()):
+            ...         await configurator.apply(node, configuration)
+            ...         adc = await node.get_adc_configuration()
+            ...         references.append(adc.reference_voltage)
+            ...     return references
+            >>> run(configure(SimulatedNode()))
+            [1.8, 1.8, 3.3]
+
+        """
+
+        target = node if target is None else target
+        original = self.original.get(node)
+        current = self.current.get(node, original)
+        if original is None and configuration == Configuration():
+            return  # The node still uses its original configuration
+
+        logger = getLogger(__name__)
+        if original is None:
+            original = Configuration(
+                adc=freeze(await node.get_adc_configuration()),
+                sensors=(
+                    freeze(await node.get_sensor_configuration())
+                    if configuration.sensors is not None
+                    else None
+                ),
+            )
+            self.original[node] = original
+            current = original
+            logger.info("Original configuration: %s", original)
+
+        assert current is not None
+        adc = configuration.adc or original.adc
+        if adc != current.adc and adc is not None:
+            await target.set_adc_configuration(**dict(adc))
+        sensors = configuration.sensors or original.sensors
+        if sensors != current.sensors and sensors is not None:
+            if original.sensors is None:
+                original = original._replace(
+                    sensors=freeze(await node.get_sensor_configuration())
+                )
+                self.original[node] = original
+            await target.set_sensor_configuration(
+                SensorConfiguration(**dict(sensors))
+            )
+
+        self.current[node] = Configuration(adc, sensors)
+
+    async def restore(
+        self, node: SensorNode, target: SensorNode | None = None
+    ) -> None:
+        """Restore the original configuration of a node
+
+        Args:
+
+            node:
+
+                The node whose configuration should be restored
+
+            target:
+
+                The object used to change the configuration; ``None`` means
+                ``node``
+
+        """
+
+        await self.apply(node, Configuration(), target)
+        getLogger(__name__).info("Restored original configuration")
@@ -2,65 +2,107 @@
 
 # -- Imports ------------------------------------------------------------------
 
+from collections.abc import Callable, Sequence
+from logging import getLogger
+from typing import Any
+
 from dynaconf.utils.boxing import DynaBox
 from icotronic.can import SensorNode, StreamingConfiguration
-from icotronic.measurement import MeasurementData
+from netaddr import EUI
+import numpy as np
 
-from icotest.test.support.node import check_write_read_eeprom
+from icotest.config import StreamingLimits
+from icotest.test.support.mac import convert_mac_base64
+from icotest.test.support.streaming import StreamIntegrity, StreamingCollector
 
 # -- Functions ----------------------------------------------------------------
 
 
-async def check_eeprom_name(node: SensorNode, settings: DynaBox):
-    """Test if reading and writing the name into the EEPROM works
+def eeprom_name(
+    settings: DynaBox, mac_address: EUI | None = None
+) -> dict[str, Any]:
+    """Get the expected name of a sensor node in the EEPROM
 
     Args:
 
-        node:
-
-            The sensor node that should be checked
-
         settings:
 
             The settings object that contains the sensor node setting
 
-    """
+        mac_address:
+
+            The MAC address of the sensor node; if you specify this value,
+            then the expected name is the Base64 encoded MAC address instead
+            of the configured name
 
-    await check_write_read_eeprom(node, "name", settings.name)
+    Returns:
 
+        A dictionary that contains the expected name
 
-async def check_eeprom_bluetooth_times(node: SensorNode, settings: DynaBox):
-    """Test if reading and writing the Bluetooth times works
+    Examples:
 
-    Args:
+        Import required library code
+
+        >>> from types import SimpleNamespace
+
+        Get the expected name with and without MAC address
+
+        >>> settings = SimpleNamespace(name="Test-STH")
+        >>> eeprom_name(settings)
+        {'name': 'Test-STH'}
+        >>> eeprom_name(settings, EUI("08-6B-D7-01-DE-81"))
+        {'name': 'CGvXAd6B'}
+
+    """
+
+    return {
+        "name": (
+            settings.name
+            if mac_address is None
+            else convert_mac_base64(mac_address)
+        )
+    }
 
-        node:
 
-            The sensor node that should be checked
+def eeprom_bluetooth_times(settings: DynaBox) -> dict[str, Any]:
+    """Get the expected Bluetooth times of a sensor node in the EEPROM
+
+    Args:
 
         settings:
 
             The settings object that contains the sensor node setting
 
+    Returns:
+
+        A dictionary that maps the name of every Bluetooth time to its
+        expected value
+
     """
 
     bluetooth = settings.bluetooth
 
-    await check_write_read_eeprom(
-        node, "advertisement time 1", bluetooth.advertisement_time_1
-    )
-    await check_write_read_eeprom(node, "sleep time 1", bluetooth.sleep_time_1)
-    await check_write_read_eeprom(
-        node, "advertisement time 2", bluetooth.advertisement_time_2
-    )
-    await check_write_read_eeprom(node, "sleep time 2", bluetooth.sleep_time_2)
+    return {
+        "advertisement time 1": bluetooth.advertisement_time_1,
+        "sleep time 1": bluetooth.sleep_time_1,
+        "advertisement time 2": bluetooth.advertisement_time_2,
+        "sleep time 2": bluetooth.sleep_time_2,
+    }
 
 
 async def read_streaming_data(
-    node: SensorNode, config: StreamingConfiguration, length: int
-) -> MeasurementData:
+    node: SensorNode,
+    config: StreamingConfiguration,
+    length: int,
+    stop: Callable[[np.ndarray], bool] | None = None,
+    monitors: Sequence[Callable[[np.ndarray], object]] = (),
+) -> StreamingCollector:
     """Collect a certain number of streaming data (messages)
 
+    The function stores the streaming data directly in preallocated NumPy
+    arrays. Use ``StreamingCollector.channel`` to access the values of a
+    certain channel.
+
     Args:
 
         node:
@@ -73,20 +115,85 @@ async def read_streaming_data(
 
         length:
 
-            The amount of streaming data stored in the returned measurement
+            The (maximum) amount of streaming data stored in the returned
+            measurement
+
+        stop:
+
+            An optional function that receives the values collected so far
+            (one row per channel) after every message and returns ``True``,
+            if the function should stop collecting data before it stored
+            ``length`` messages (e.g. ``EarlyStopping``)
+
+        monitors:
+
+            Functions that receive the values collected so far (one row per
+            channel) after every message e.g. to analyze the data while it is
+            still collected (``WelchSpectrum``)
 
     Returns:
 
-        A measurement storing ``length`` streaming messages
+        A collector storing up to ``length`` streaming messages
 
     """
 
-    measurement_data = MeasurementData(config)
+    collector = StreamingCollector(config, messages=length)
     async with node.open_data_stream(config) as stream:
 
         async for data, _ in stream:
-            measurement_data.append(data)
-            if len(measurement_data) >= length:
+            collector.append(data)
+            for monitor in monitors:
+                monitor(collector.values)
+            if collector.full:
                 break
+            if stop is not None and stop(collector.values):
+                break
+
+    return collector
+
+
+def check_stream_integrity(
+    collector: StreamingCollector,
+    limits: StreamingLimits,
+    record_property: Callable[[str, Any], None] | None = None,
+) -> StreamIntegrity:
+    """Test that a data stream did not lose too many messages
+
+    Args:
+
+        collector:
+
+            The collected streaming data
+
+        limits:
+
+            The allowed message loss and minimum sample rate
+
+        record_property:
+
+            A function (e.g. the fixture ``record_property``) that stores the
+            stream information for the test report
+
+    Returns:
+
+        The information about the data stream
+
+    """
+
+    integrity = collector.integrity()
+    getLogger(__name__).info("Stream: %s", integrity)
+    if record_property is not None:
+        record_property("stream", integrity.metrics())
+
+    assert integrity.loss <= limits.loss, (
+        f"Lost {integrity.lost} of {integrity.messages + integrity.lost} "
+        f"streaming messages ({integrity.loss * 100:.2f} %), which is more "
+        f"than the allowed maximum of {limits.loss * 100:.2f} %"
+    )
+    assert integrity.sample_rate >= limits.sample_rate, (
+        f"Effective sample rate of {integrity.sample_rate:.0f} values/s is "
+        f"lower than the expected minimum of {limits.sample_rate:.0f} "
+        "values/s"
+    )
 
-    return measurement_data
+    return integrity
@@ -0,0 +1,218 @@
+"""Simulate the streaming behavior of a sensor node without hardware"""
+
+# -- Imports ------------------------------------------------------------------
+
+from __future__ import annotations
+
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from math import sqrt
+from typing import Any
+
+from icotronic.can import StreamingConfiguration
+from icotronic.can.adc import ADCConfiguration
+from icotronic.can.streaming import StreamingData
+from icotronic.measurement.constants import ADC_MAX_VALUE
+from semantic_version import Version
+
+import numpy as np
+
+# -- Classes ------------------------------------------------------------------
+
+
+class SimulatedNode:
+    """Sensor node that streams noise based on its ADC configuration
+
+    The simulation uses a simple model of the sensor node:
+
+    - The ADC sample rate follows from the ADC configuration
+      (``ADCConfiguration.sample_rate``); all enabled channels share this
+      sample rate.
+    - The node can transmit at most ``maximum_rate`` values per second. If
+      the ADC produces more values, the node drops the excess messages.
+    - The values contain white noise, which gets smaller with a higher
+      oversampling rate and larger with a lower reference voltage.
+
+    The simulated node does not wait between messages, which means a
+    measurement only takes as long as creating the data.
+
+    Args:
+
+        noise:
+
+            The standard deviation of the values in ADC steps for an
+            oversampling rate of 64 and a reference voltage of 3.3 V
+
+        maximum_rate:
+
+            The maximum number of values per second the node can transmit
+
+        firmware_version:
+
+            The firmware version reported by the node
+
+        seed:
+
+            The seed of the random number generator
+
+    Examples:
+
+        Import required library code
+
+        >>> from asyncio import run
+
+        Collect the values of a simulated node
+
+        >>> async def stream(node: SimulatedNode, **adc: Any):
+        ...     await node.set_adc_configuration(**adc)
+        ...     async with node.open_data_stream(
+        ...             StreamingConfiguration(first=True)) as stream:
+        ...         messages = []
+        ...         async for data, lost in stream:
+        ...             messages.append(data)
+        ...             if len(messages) >= 1000:
+        ...                 break
+        ...     return messages
+
+        Check the timing and noise of the default ADC configuration
+
+        >>> messages = run(stream(SimulatedNode(noise=20), prescaler=2,
+        ...                       acquisition_time=8, oversampling_rate=64))
+        >>> duration = messages[-1].timestamp - messages[0].timestamp
+        >>> round(999 * 3 / duration)
+        9524
+        >>> values = [value for data in messages for value in data.values]
+        >>> round(float(np.std(values)))
+        20
+
+        The node loses messages, if the ADC is faster than the transmission
+
+        >>> messages = run(stream(SimulatedNode(maximum_rate=5000),
+        ...                       oversampling_rate=32))
+        >>> counters = np.array([data.counter for data in messages])
+        >>> lost = int(((np.diff(counters) - 1) % 256).sum())
+        >>> round(lost / (lost + len(messages)), 1)
+        0.7
+
+    """
+
+    def __init__(
+        self,
+        noise: float = 10,
+        maximum_rate: float = 10_000,
+        firmware_version: str = "0.0.0-simulation",
+        seed: int | None = 0,
+    ) -> None:
+
+        self.noise = noise
+        self.maximum_rate = maximum_rate
+        self.firmware_version = Version(firmware_version)
+        self.adc_configuration = ADCConfiguration()
+        self.rng = np.random.default_rng(seed)
+
+    async def get_firmware_version(self) -> Version:
+        """Get the (simulated) firmware version
+
+        Returns:
+
+            The firmware version of the simulated node
+
+        """
+
+        return self.firmware_version
+
+    async def get_adc_configuration(self) -> ADCConfiguration:
+        """Get the current ADC configuration
+
+        Returns:
+
+            The ADC configuration of the simulated node
+
+        """
+
+        return self.adc_configuration
+
+    async def set_adc_configuration(self, **configuration: Any) -> None:
+        """Change the ADC configuration
+
+        Args:
+
+            **configuration:
+
+                The ADC configuration values (see
+                ``SensorNode.set_adc_configuration``)
+
+        """
+
+        self.adc_configuration = ADCConfiguration(**configuration)
+
+    def standard_deviation(self) -> float:
+        """Get the noise of the current ADC configuration
+
+        Returns:
+
+            The standard deviation of the values in ADC steps
+
+        """
+
+        adc = self.adc_configuration
+        return (
+            self.noise
+            * sqrt(64 / adc.oversampling_rate)
+            * 3.3
+            / adc.reference_voltage
+        )
+
+    @asynccontextmanager
+    async def open_data_stream(
+        self, channels: StreamingConfiguration, **_: Any
+    ) -> AsyncIterator[AsyncIterator[tuple[StreamingData, int]]]:
+        """Open a simulated data stream
+
+        Args:
+
+            channels:
+
+                Specifies which measurement channels should be enabled
+
+        Yields:
+
+            AsyncIterator[tuple[StreamingData, int]]:
+                An iterator over the streaming data and the number of lost
+                messages
+
+        """
+
+        values_per_message = channels.data_length()
+        sample_rate = self.adc_configuration.sample_rate()
+        interval = values_per_message / sample_rate
+        # Probability that the node is able to transmit a message
+        transmitted = min(1, self.maximum_rate / sample_rate)
+        deviation = self.standard_deviation()
+        block = 1000
+
+        async def stream() -> AsyncIterator[tuple[StreamingData, int]]:
+            message = 0
+            while True:
+                values = np.clip(
+                    self.rng.normal(
+                        ADC_MAX_VALUE / 2,
+                        deviation,
+                        (block, values_per_message),
+                    ).round(),
+                    0,
+                    ADC_MAX_VALUE,
+                )
+                sent = self.rng.random(block) < transmitted
+                for index in np.flatnonzero(sent):
+                    yield (
+                        StreamingData(
+                            values=values[index].tolist(),
+                            counter=(message + int(index)) % 256,
+                            timestamp=(message + int(index)) * interval,
+                        ),
+                        0,
+                    )
+                message += block
+
+        yield stream()
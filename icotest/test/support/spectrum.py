@@ -0,0 +1,265 @@
+"""Spectral analysis of acceleration data"""
+
+# -- Imports ------------------------------------------------------------------
+
+from __future__ import annotations
+
+from typing import NamedTuple
+
+from icotronic.measurement.constants import ADC_MAX_VALUE
+
+import numpy as np
+
+# -- Classes ------------------------------------------------------------------
+
+
+class Spur(NamedTuple):
+    """Narrow peak in the power spectral density
+
+    Attributes:
+
+        channel:
+            The index of the channel that contains the spur
+
+        frequency:
+            The frequency of the spur in Hz
+
+        level:
+            The level of the spur above the noise floor in dB
+
+    """
+
+    channel: int
+    frequency: float
+    level: float
+
+
+class WelchSpectrum:
+    """Estimate the power spectral density of multiple channels (Welch)
+
+    The estimator splits the data into segments (overlapping by 50 %),
+    applies a Hann window to every segment and averages the power spectra of
+    all segments. Since the object processes every segment as soon as it is
+    complete, you can use it to analyze data while it is still collected
+    (e.g. as monitor of ``read_streaming_data``).
+
+    Args:
+
+        channels:
+
+            The number of channels
+
+        segment_length:
+
+            The number of values of a segment
+
+    Examples:
+
+        Analyze white noise
+
+        >>> rng = np.random.default_rng(1)
+        >>> values = rng.normal(32768, 100, (2, 4096))
+        >>> spectrum = WelchSpectrum(channels=2, segment_length=256)
+
+        Add the values in multiple blocks
+
+        >>> for end in range(1000, 4097, 1000):
+        ...     spectrum(values[:, :end])
+        False
+        False
+        False
+        False
+        >>> spectrum.segments
+        30
+
+        The noise in the whole frequency range matches the overall noise
+
+        >>> noise = spectrum.band_noise(1000, 0, 500)
+        >>> bool(np.allclose(noise, 20 * np.log10(100 / (ADC_MAX_VALUE / 2)),
+        ...                  atol=0.5))
+        True
+
+        White noise does not contain spurs
+
+        >>> spectrum.spurs(1000, threshold=15)
+        []
+
+        Detect a sinusoidal signal (mains hum)
+
+        >>> time = np.arange(4096) / 1000
+        >>> hum = values + 100 * np.sin(2 * np.pi * 50 * time)
+        >>> spectrum = WelchSpectrum(channels=2, segment_length=256)
+        >>> spectrum(hum)
+        False
+        >>> [(spur.channel, round(spur.frequency))
+        ...  for spur in spectrum.spurs(1000, threshold=15)]
+        [(0, 51), (1, 51)]
+
+    """
+
+    def __init__(self, channels: int, segment_length: int = 512) -> None:
+
+        self.segment_length = segment_length
+        self.step = segment_length // 2
+        self.window = np.hanning(segment_length)
+        self.power = np.zeros((channels, segment_length // 2 + 1))
+        self.segments = 0
+        self.position = 0
+
+    def __call__(self, values: np.ndarray) -> bool:
+        """Process all complete segments of the given values
+
+        Args:
+
+            values:
+
+                All values collected so far (one row per channel)
+
+        Returns:
+
+            Always ``False``, which means the estimator never stops a
+            measurement
+
+        """
+
+        values = np.atleast_2d(values)
+        while values.shape[1] - self.position >= self.segment_length:
+            segment = values[
+                :, self.position : self.position + self.segment_length
+            ]
+            segment = segment - segment.mean(axis=1, keepdims=True)
+            self.power += np.square(
+                np.abs(np.fft.rfft(segment * self.window, axis=1))
+            )
+            self.segments += 1
+            self.position += self.step
+
+        return False
+
+    def frequencies(self, sample_rate: float) -> np.ndarray:
+        """Get the frequencies of the power spectral density
+
+        Args:
+
+            sample_rate:
+
+                The sample rate of a single channel in Hz
+
+        Returns:
+
+            The frequency of every value of the power spectral density in Hz
+
+        """
+
+        return np.fft.rfftfreq(self.segment_length, 1 / sample_rate)
+
+    def psd(self, sample_rate: float) -> np.ndarray:
+        """Get the (one-sided) power spectral density
+
+        Args:
+
+            sample_rate:
+
+                The sample rate of a single channel in Hz
+
+        Returns:
+
+            The power spectral density of every channel in (ADC steps)²/Hz
+
+        Raises:
+
+            ValueError:
+
+                If the estimator did not process a complete segment yet
+
+        """
+
+        if self.segments <= 0:
+            raise ValueError(
+                "Unable to calculate power spectral density without a "
+                f"complete segment ({self.segment_length} values)"
+            )
+
+        scale = 1 / (sample_rate * np.square(self.window).sum())
+        psd = self.power / self.segments * scale
+        # Add the power of the negative frequencies (except for the DC and
+        # Nyquist frequency)
+        last = -1 if self.segment_length % 2 == 0 else None
+        psd[:, 1:last] *= 2
+        return psd
+
+    def band_noise(
+        self, sample_rate: float, minimum: float, maximum: float
+    ) -> np.ndarray:
+        """Get the noise in a frequency band
+
+        Args:
+
+            sample_rate:
+
+                The sample rate of a single channel in Hz
+
+            minimum:
+
+                The lower limit of the frequency band in Hz
+
+            maximum:
+
+                The upper limit of the frequency band in Hz
+
+        Returns:
+
+            The ratio of the RMS noise in the frequency band to the maximum
+            measurement value (half the ADC range) in dB for every channel
+
+        """
+
+        frequencies = self.frequencies(sample_rate)
+        band = (minimum <= frequencies) & (frequencies <= maximum)
+        resolution = sample_rate / self.segment_length
+        power = self.psd(sample_rate)[:, band].sum(axis=1) * resolution
+        with np.errstate(divide="ignore"):
+            return 10 * np.log10(power / (ADC_MAX_VALUE / 2) ** 2)
+
+    def spurs(self, sample_rate: float, threshold: float) -> list[Spur]:
+        """Find narrow peaks in the power spectral density
+
+        Args:
+
+            sample_rate:
+
+                The sample rate of a single channel in Hz
+
+            threshold:
+
+                The minimum level above the noise floor (median of the power
+                spectral density) of a spur in dB
+
+        Returns:
+
+            The spurs of all channels
+
+        """
+
+        psd = self.psd(sample_rate)
+        frequencies = self.frequencies(sample_rate)
+        floor = np.median(psd, axis=1, keepdims=True)
+        with np.errstate(divide="ignore"):
+            level = 10 * np.log10(psd / floor)
+
+        # Ignore the DC value and the leakage of the DC value into the
+        # next frequency bin
+        inner = level[:, 2:-1]
+        peaks = (
+            (inner > threshold)
+            & (inner >= level[:, 1:-2])
+            & (inner >= level[:, 3:])
+        )
+        return [
+            Spur(
+                channel=int(channel),
+                frequency=float(frequencies[index + 2]),
+                level=float(inner[channel, index]),
+            )
+            for channel, index in zip(*np.nonzero(peaks))
+        ]
@@ -2,14 +2,45 @@
 
 # -- Imports ------------------------------------------------------------------
 
+from collections.abc import Callable, Sequence
 from logging import getLogger
-from icotronic.can import STH
+from math import ceil
+from typing import Any
+
+from icotronic.can import STH, StreamingConfiguration
+from icotronic.measurement.constants import ADC_MAX_VALUE
+import numpy as np
 
 from icotest.config import settings
+from icotest.test.support.analysis import EarlyStopping
+from icotest.test.support.sensor_node import read_streaming_data
+from icotest.test.support.streaming import StreamingCollector
 
 # -- Functions ----------------------------------------------------------------
 
 
+def eeprom_acceleration_calibration() -> dict[str, Any]:
+    """Get the expected acceleration slope and offset values of the STH
+
+    Returns:
+
+        A dictionary that maps the name of the slope and offset value of
+        every axis to its expected value (based on the configured
+        acceleration sensor)
+
+    """
+
+    acceleration_max = settings.acceleration_sensor().acceleration.maximum
+    acceleration_slope = acceleration_max / ADC_MAX_VALUE
+    acceleration_offset = -(acceleration_max / 2)
+
+    values: dict[str, Any] = {}
+    for axis in ("x", "y", "z"):
+        values[f"{axis} axis acceleration slope"] = acceleration_slope
+        values[f"{axis} axis acceleration offset"] = acceleration_offset
+    return values
+
+
 async def read_self_test_voltages(sth: STH) -> tuple[float, float]:
     """Read acceleration voltages before, at and after self test
 
@@ -58,3 +89,96 @@ async def read_self_test_voltages(sth: STH) -> tuple[float, float]:
     voltage_diff_before_after = abs(voltage_before_test - voltage_after_test)
 
     return (voltage_diff_abs * 1000, voltage_diff_before_after * 1000)
+
+
+def early_stopping(limits: Sequence[float]) -> EarlyStopping | None:
+    """Get the early stopping criterion for the acceleration noise tests
+
+    Args:
+
+        limits:
+
+            The maximum allowed noise ratio in dB for every channel
+
+    Returns:
+
+        An early stopping criterion based on the configuration or ``None``,
+        if the adaptive acquisition is disabled
+
+    """
+
+    adaptive = settings.sth.adaptive_acquisition
+    if not adaptive.enabled:
+        return None
+
+    return EarlyStopping(
+        limits, block_size=adaptive.block_size, confidence=adaptive.confidence
+    )
+
+
+async def read_acceleration_axes(
+    sth: STH,
+    number_values: int,
+    sequential: bool = False,
+    stop: Callable[[np.ndarray], bool] | None = None,
+) -> tuple[np.ndarray, list[StreamingCollector]]:
+    """Collect acceleration values for all three measurement channels
+
+    Args:
+
+        sth:
+
+            The STH where the measurement should take place
+
+        number_values:
+
+            The minimum number of values that should be collected for every
+            channel, unless ``stop`` ends the measurement early
+
+        sequential:
+
+            Use a separate single channel stream for one channel after
+            another instead of a single stream for all three channels
+
+        stop:
+
+            An optional function that decides if the measurement can be
+            stopped early (only supported for a single stream)
+
+    Returns:
+
+        A tuple containing
+
+        - a two dimensional array that contains one row of (raw) values for
+          the first, second and third channel and
+
+        - the collectors of all used data streams
+
+    """
+
+    logger = getLogger(__name__)
+    channels = ("first", "second", "third")
+
+    if not sequential:
+        # Every message of a three channel stream contains one value for
+        # each channel
+        config = StreamingConfiguration(first=True, second=True, third=True)
+        logger.info("Collecting data for all channels: %s", config)
+        collector = await read_streaming_data(sth, config, number_values, stop)
+        return collector.values, [collector]
+
+    values = []
+    collectors = []
+    for channel in channels:
+        config = StreamingConfiguration(
+            **{name: name == channel for name in channels}
+        )
+        logger.info("Collecting data for channel “%s”: %s", channel, config)
+        # Every message of a single channel stream contains three values
+        collector = await read_streaming_data(
+            sth, config, ceil(number_values / 3)
+        )
+        values.append(collector.channel(channel))
+        collectors.append(collector)
+
+    return np.vstack(values), collectors
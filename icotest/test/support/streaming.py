@@ -0,0 +1,445 @@
+"""Store streaming data of sensor nodes in NumPy arrays"""
+
+# -- Imports ------------------------------------------------------------------
+
+from typing import Any, NamedTuple
+
+from icotronic.can import StreamingConfiguration
+from icotronic.can.streaming import StreamingData
+
+import numpy as np
+
+# -- Attributes ---------------------------------------------------------------
+
+INTERVAL_EDGES = (0, 1, 2, 5, 10, 20, 50, 100, float("inf"))
+"""Bin edges (in ms) of the histogram of the time between two messages"""
+
+# -- Classes ------------------------------------------------------------------
+
+
+class StreamIntegrity(NamedTuple):
+    """Information about lost messages and timing of a data stream
+
+    Attributes:
+
+        messages:
+            The number of received streaming messages
+
+        lost:
+            The number of lost streaming messages (based on the message
+            counters)
+
+        sample_rate:
+            The effective number of values per channel and second
+
+        intervals:
+            The number of intervals between two received messages for every
+            bin of the histogram (see ``INTERVAL_EDGES``)
+
+        median_interval:
+            The median time between two received messages in ms
+
+        maximum_interval:
+            The maximum time between two received messages in ms
+
+    Examples:
+
+        Show the textual representation of stream information
+
+        >>> StreamIntegrity(messages=99, lost=1, sample_rate=9000.5,
+        ...                 intervals=(0, 98, 0, 0, 0, 0, 0, 0),
+        ...                 median_interval=0.95, maximum_interval=1.5)
+        ... # doctest: +NORMALIZE_WHITESPACE
+        99 messages, 1 lost (1.00 %), 9000 values/s, interval: 0.950 ms
+        (maximum: 1.500 ms)
+
+    """
+
+    messages: int
+    lost: int
+    sample_rate: float
+    intervals: tuple[int, ...]
+    median_interval: float
+    maximum_interval: float
+
+    def __repr__(self) -> str:
+        """Get the textual representation of the stream information
+
+        Returns:
+
+            A string containing the most important stream information
+
+        """
+
+        return (
+            f"{self.messages} messages, {self.lost} lost "
+            f"({self.loss * 100:.2f} %), {self.sample_rate:.0f} values/s, "
+            f"interval: {self.median_interval:.3f} ms "
+            f"(maximum: {self.maximum_interval:.3f} ms)"
+        )
+
+    @property
+    def loss(self) -> float:
+        """Get the ratio of lost messages
+
+        Returns:
+
+            The number of lost messages divided by the number of sent
+            messages
+
+        """
+
+        total = self.messages + self.lost
+        return self.lost / total if total > 0 else 0
+
+    def metrics(self) -> dict[str, Any]:
+        """Get the stream information as JSON compatible dictionary
+
+        Returns:
+
+            A dictionary that contains the stream information
+
+        """
+
+        return {
+            "messages": self.messages,
+            "lost": self.lost,
+            "loss": self.loss,
+            "sample rate": self.sample_rate,
+            "median interval": self.median_interval,
+            "maximum interval": self.maximum_interval,
+            "intervals": {
+                f"{lower:g} – {upper:g} ms": count
+                for lower, upper, count in zip(
+                    INTERVAL_EDGES, INTERVAL_EDGES[1:], self.intervals
+                )
+            },
+        }
+
+
+class StreamingCollector:
+    """Collect streaming data in preallocated NumPy arrays
+
+    In contrast to ``MeasurementData`` the collector does not store Python
+    objects for every message or sample. Instead it writes the values of
+    every enabled channel directly into a row of a two dimensional array and
+    the message counters and timestamps (in µs) into parallel ``int64``
+    arrays.
+
+    Args:
+
+        configuration:
+
+            The streaming configuration used to collect the data
+
+        messages:
+
+            The maximum number of streaming messages the collector can store
+
+    Examples:
+
+        Collect data for a single channel (3 values per message)
+
+        >>> collector = StreamingCollector(StreamingConfiguration(first=True),
+        ...                                messages=2)
+        >>> collector.append(StreamingData(values=[1, 2, 3], counter=10,
+        ...                                timestamp=1.5))
+        >>> collector.append(StreamingData(values=[4, 5, 6], counter=11,
+        ...                                timestamp=1.75))
+        >>> collector.full
+        True
+        >>> collector.channel("first")
+        array([1., 2., 3., 4., 5., 6.])
+        >>> collector.counters
+        array([10, 11])
+        >>> collector.timestamps
+        array([1500000, 1750000])
+        >>> collector.sample_rate()
+        12.0
+
+        Collect data for three channels (1 value per channel and message)
+
+        >>> collector = StreamingCollector(
+        ...     StreamingConfiguration(first=True, second=True, third=True),
+        ...     messages=10)
+        >>> collector.append(StreamingData(values=[1, 2, 3], counter=0,
+        ...                                timestamp=0))
+        >>> collector.append(StreamingData(values=[4, 5, 6], counter=1,
+        ...                                timestamp=0))
+        >>> collector.values
+        array([[1., 4.],
+               [2., 5.],
+               [3., 6.]])
+        >>> collector.channel("third")
+        array([3., 6.])
+
+        The returned data does not copy the collected values
+
+        >>> np.shares_memory(collector.channel("second"), collector.values)
+        True
+
+    """
+
+    def __init__(
+        self, configuration: StreamingConfiguration, messages: int
+    ) -> None:
+
+        self.configuration = configuration
+        self.channels = [
+            channel
+            for channel in ("first", "second", "third")
+            if getattr(configuration, channel)
+        ]
+        self.samples_per_message = (
+            configuration.data_length() // configuration.enabled_channels()
+        )
+        self._values = np.empty(
+            (len(self.channels), messages * self.samples_per_message)
+        )
+        self._counters = np.empty(messages, dtype=np.int64)
+        self._timestamps = np.empty(messages, dtype=np.int64)
+        self.length = 0
+
+    def __len__(self) -> int:
+        """Get the number of collected streaming messages
+
+        Returns:
+
+            The amount of streaming messages stored in the collector
+
+        """
+
+        return self.length
+
+    @property
+    def full(self) -> bool:
+        """Check if the collector can not store any more messages
+
+        Returns:
+
+            ``True``, if the collector is full, ``False`` otherwise
+
+        """
+
+        return self.length >= len(self._counters)
+
+    def grow(self) -> None:
+        """Double the number of messages the collector can store
+
+        Views of the collected data returned before the call do not reflect
+        messages added afterwards.
+
+        Examples:
+
+            Store more messages than specified initially
+
+            >>> collector = StreamingCollector(
+            ...     StreamingConfiguration(first=True, second=True),
+            ...     messages=1)
+            >>> collector.append(StreamingData(values=[1, 2], counter=0,
+            ...                                timestamp=0))
+            >>> collector.full
+            True
+            >>> collector.grow()
+            >>> collector.append(StreamingData(values=[3, 4], counter=1,
+            ...                                timestamp=0.001))
+            >>> collector.values
+            array([[1., 3.],
+                   [2., 4.]])
+            >>> collector.counters
+            array([0, 1])
+
+        """
+
+        messages = max(2 * len(self._counters), 1)
+        values = np.empty(
+            (len(self.channels), messages * self.samples_per_message)
+        )
+        values[:, : self._values.shape[1]] = self._values
+        self._values = values
+        self._counters = np.resize(self._counters, messages)
+        self._timestamps = np.resize(self._timestamps, messages)
+
+    def append(self, data: StreamingData) -> None:
+        """Add the data of a streaming message
+
+        Args:
+
+            data:
+
+                The streaming data that should be added to the collector
+
+        Raises:
+
+            IndexError:
+
+                If the collector is already full
+
+        """
+
+        if self.full:
+            raise IndexError("Streaming collector is full")
+
+        index = self.length
+        samples = self.samples_per_message
+        start = index * samples
+        # The values of a message contain either multiple values for a single
+        # channel or a single value for every enabled channel
+        self._values[:, start : start + samples] = np.reshape(
+            data.values[: samples * len(self.channels)],
+            (samples, len(self.channels)),
+        ).T
+        self._counters[index] = data.counter
+        self._timestamps[index] = round(data.timestamp * 1_000_000)
+        self.length = index + 1
+
+    @property
+    def values(self) -> np.ndarray:
+        """Get the collected values of all enabled channels
+
+        Returns:
+
+            A view with one row of values for every enabled channel
+
+        """
+
+        return self._values[:, : self.length * self.samples_per_message]
+
+    @property
+    def counters(self) -> np.ndarray:
+        """Get the message counters of the collected streaming messages
+
+        Returns:
+
+            A view containing the message counter of every message
+
+        """
+
+        return self._counters[: self.length]
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        """Get the timestamps of the collected streaming messages
+
+        Returns:
+
+            A view containing the timestamp of every message in µs
+
+        """
+
+        return self._timestamps[: self.length]
+
+    def sample_rate(self) -> float:
+        """Estimate the sample rate of a single channel
+
+        The estimate is based on the timestamps of the first and last
+        collected message.
+
+        Returns:
+
+            The number of values per channel and second or ``0``, if the
+            timestamps of the first and last message do not differ
+
+        Raises:
+
+            ValueError:
+
+                If the collector contains less than two messages
+
+        Examples:
+
+            Messages with the same timestamp do not provide a sample rate
+
+            >>> collector = StreamingCollector(
+            ...     StreamingConfiguration(first=True), messages=2)
+            >>> for counter in (0, 1):
+            ...     collector.append(StreamingData(values=[1, 2, 3],
+            ...                      counter=counter, timestamp=0.5))
+            >>> collector.sample_rate()
+            0.0
+            >>> collector.integrity().sample_rate
+            0.0
+
+        """
+
+        if self.length < 2:
+            raise ValueError(
+                "Unable to calculate sample rate using less than two messages"
+            )
+
+        duration = float(self.timestamps[-1] - self.timestamps[0]) / 1_000_000
+        if duration <= 0:
+            return 0.0
+
+        return (self.length - 1) * self.samples_per_message / duration
+
+    def integrity(self) -> StreamIntegrity:
+        """Get information about lost messages and the timing of the stream
+
+        Returns:
+
+            Information about the collected streaming messages
+
+        Examples:
+
+            Detect lost messages (the message counter has 8 bits)
+
+            >>> collector = StreamingCollector(
+            ...     StreamingConfiguration(first=True), messages=4)
+            >>> for counter, timestamp in ((254, 0), (255, 0.001),
+            ...                            (2, 0.004), (3, 0.005)):
+            ...     collector.append(StreamingData(values=[1, 2, 3],
+            ...                      counter=counter, timestamp=timestamp))
+            >>> integrity = collector.integrity()
+            >>> integrity.lost
+            2
+            >>> integrity.sample_rate
+            1800.0
+            >>> integrity.intervals
+            (0, 2, 1, 0, 0, 0, 0, 0)
+
+        """
+
+        counters = self.counters
+        lost = int(((np.diff(counters) - 1) % 256).sum())
+        intervals = np.diff(self.timestamps) / 1000
+        histogram, _ = np.histogram(intervals, bins=INTERVAL_EDGES)
+
+        return StreamIntegrity(
+            messages=self.length,
+            lost=lost,
+            sample_rate=self.sample_rate() if self.length >= 2 else 0,
+            intervals=tuple(int(count) for count in histogram),
+            median_interval=(
+                float(np.median(intervals)) if len(intervals) > 0 else 0
+            ),
+            maximum_interval=(
+                float(intervals.max()) if len(intervals) > 0 else 0
+            ),
+        )
+
+    def channel(self, name: str) -> np.ndarray:
+        """Get the collected values of a single channel
+
+        Args:
+
+            name:
+
+                The name of the channel (``first``, ``second`` or ``third``)
+
+        Returns:
+
+            A view containing the values of the given channel
+
+        Raises:
+
+            ValueError:
+
+                If the given channel is not enabled
+
+        """
+
+        if name not in self.channels:
+            raise ValueError(f"Channel “{name}” is not enabled")
+
+        return self.values[self.channels.index(name)]
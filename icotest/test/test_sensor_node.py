@@ -2,51 +2,56 @@
 
 # -- Imports ------------------------------------------------------------------
 
-from asyncio import Event, TaskGroup, to_thread
+from asyncio import Event, TaskGroup
 from logging import getLogger
 
 from icotronic.can import SensorNode, StreamingConfiguration, STU
+from netaddr import EUI
+from pytest import mark
 
-from icotest.cli.commander import Commander
-from icotest.config import settings
+from icotest.config import limits, settings
 from icotest.test.support.common import check_power_usage
 from icotest.test.support.mac import convert_mac_base64
+from icotest.test.support.eeprom import check_eeprom_values
 from icotest.test.support.node import (
     check_connection,
     check_firmware_upload,
-    check_eeprom_product_data,
-    check_eeprom_statistics,
-    check_eeprom_status,
+    eeprom_product_data,
+    eeprom_statistics,
+    eeprom_status,
+    NodeSnapshot,
 )
 from icotest.test.support.sensor_node import (
-    check_eeprom_name,
-    check_eeprom_bluetooth_times,
+    eeprom_name,
+    eeprom_bluetooth_times,
 )
+from icotest.test.support.power import PowerTrace
 
 # -- Functions ----------------------------------------------------------------
 
 
+@mark.commander
+@mark.usefixtures("idle_debug_adapter")
 async def test_firmware_upload():
     """Upload firmware"""
 
     await check_firmware_upload(settings.sensor_node)
 
 
-async def test_connection(sensor_node: SensorNode):
+@mark.prerequisite("sensor_node", "sth")
+async def test_connection(sensor_node: SensorNode, record_property):
     """Test if connection to sensor node is possible"""
 
-    await check_connection(sensor_node)
+    readiness = await check_connection(sensor_node)
+    record_property("readiness", readiness.metrics())
 
 
-async def test_supply_voltage(sensor_node: SensorNode):
+async def test_supply_voltage(sensor_node_status: NodeSnapshot):
     """Test if battery voltage is within expected bounds"""
 
-    supply_voltage = await sensor_node.get_supply_voltage()
-    expected_voltage = settings.sensor_node.supply.voltage.average
-    tolerance_voltage = settings.sensor_node.supply.voltage.tolerance
-
-    expected_minimum_voltage = expected_voltage - tolerance_voltage
-    expected_maximum_voltage = expected_voltage + tolerance_voltage
+    supply_voltage = sensor_node_status.values["supply voltage"]
+    expected_minimum_voltage = limits.supply_voltage.minimum
+    expected_maximum_voltage = limits.supply_voltage.maximum
 
     assert supply_voltage >= expected_minimum_voltage, (
         f"Supply voltage of {supply_voltage:.3f} V is lower "
@@ -56,41 +61,38 @@ async def test_supply_voltage(sensor_node: SensorNode):
     assert supply_voltage <= expected_maximum_voltage, (
         f"Supply voltage of {supply_voltage:.3f} V is "
         "greater than expected maximum voltage of "
-        f"{expected_minimum_voltage:.3f} V"
+        f"{expected_maximum_voltage:.3f} V"
     )
 
 
+@mark.disconnected_sensor_node
 async def test_power_usage_disconnected(
     stu: STU,  # pylint: disable=unused-argument
+    power_trace: PowerTrace,
 ) -> None:
     """Check power usage in disconnected state"""
 
-    commander = Commander()
-    commander.enable_debug_mode()
-    power_usage_mw = commander.read_power_usage()
-    getLogger(__name__).info("Disconnected power usage: %s mW", power_usage_mw)
+    power_usage = await power_trace.measure("disconnected")
+    getLogger(__name__).info("Disconnected power usage: %s", power_usage)
 
-    await check_power_usage(
-        power_usage_mw, settings.sensor_node.power.disconnected
-    )
+    await check_power_usage(power_usage.mean, limits.power.disconnected)
 
 
 async def test_power_usage_connected(
     sensor_node: SensorNode,  # pylint: disable=unused-argument
+    power_trace: PowerTrace,
 ) -> None:
     """Check power usage in connected state"""
 
-    commander = Commander()
-    commander.enable_debug_mode()
-    power_usage_mw = commander.read_power_usage()
-    getLogger(__name__).info("Connected power usage: %s mW", power_usage_mw)
+    power_usage = await power_trace.measure("connected")
+    getLogger(__name__).info("Connected power usage: %s", power_usage)
 
-    await check_power_usage(
-        power_usage_mw, settings.sensor_node.power.connected
-    )
+    await check_power_usage(power_usage.mean, limits.power.connected)
 
 
-async def test_power_usage_streaming(sensor_node: SensorNode):
+async def test_power_usage_streaming(
+    sensor_node: SensorNode, power_trace: PowerTrace
+):
     """Test power usage of sensor node while streaming"""
 
     async def stream_data(started_streaming: Event) -> None:
@@ -101,9 +103,6 @@ async def test_power_usage_streaming(sensor_node: SensorNode):
                 if not started_streaming.is_set():
                     started_streaming.set()
 
-    def read_power_usage() -> float:
-        return Commander().read_power_usage()
-
     started_streaming = Event()
 
     async with TaskGroup() as task_group:
@@ -111,32 +110,50 @@ async def test_power_usage_streaming(sensor_node: SensorNode):
             stream_data(started_streaming)
         )
         await started_streaming.wait()
-        read_power_task = task_group.create_task(to_thread(read_power_usage))
-        power_usage_mw = await read_power_task
-        getLogger(__name__).info(
-            "Streaming power usage: %s mW", power_usage_mw
-        )
+        power_usage = await power_trace.measure("streaming")
+        getLogger(__name__).info("Streaming power usage: %s", power_usage)
         stream_data_task.cancel()
 
-    await check_power_usage(
-        power_usage_mw, settings.sensor_node.power.streaming
-    )
+    await check_power_usage(power_usage.mean, limits.power.streaming)
 
 
-async def test_eeprom(sensor_node: SensorNode):
+async def test_eeprom(
+    sensor_node: SensorNode,
+    sensor_node_identifier: str | EUI,
+    record_property,
+):
     "Test if reading and writing of EEPROM values works"
 
-    await check_eeprom_name(sensor_node, settings.sensor_node)
-    await check_eeprom_product_data(sensor_node, settings.sensor_node)
-    await check_eeprom_statistics(sensor_node, settings.sensor_node)
-    await check_eeprom_status(sensor_node)
-    await check_eeprom_bluetooth_times(sensor_node, settings.sensor_node)
+    # In station mode we identify the sensor node via its MAC address, which
+    # means we can already store its final (MAC based) name
+    mac_address = (
+        sensor_node_identifier
+        if isinstance(sensor_node_identifier, EUI)
+        else None
+    )
+    update = await check_eeprom_values(
+        sensor_node,
+        {
+            **eeprom_name(settings.sensor_node, mac_address),
+            **await eeprom_product_data(sensor_node, settings.sensor_node),
+            **eeprom_statistics(settings.sensor_node),
+            **eeprom_status(),
+            **eeprom_bluetooth_times(settings.sensor_node),
+        },
+        read_before_write=settings.sensor_node.eeprom.read_before_write,
+    )
+    record_property("eeprom", update.metrics())
 
 
-async def test_set_base64name(sensor_node: SensorNode, capsys, json_metadata):
+async def test_set_base64name(
+    sensor_node: SensorNode,
+    sensor_node_status: NodeSnapshot,
+    capsys,
+    json_metadata,
+):
     """Set name to Base64 encoded MAC address of sensor node"""
 
-    mac_address = await sensor_node.get_mac_address()
+    mac_address = sensor_node_status.values["MAC address"]
     getLogger().info("MAC address: %s", mac_address)
     name = convert_mac_base64(mac_address)
     with capsys.disabled():
@@ -12,20 +12,37 @@ from logging import getLogger
 from math import ceil
 
 from icotronic.can import STH, StreamingConfiguration
-from icotronic.measurement.constants import ADC_MAX_VALUE
-from icotronic.measurement import convert_raw_to_g, ratio_noise_max
-
-from icotest.config import settings
-from icotest.test.support.node import check_write_read_eeprom_close
-from icotest.test.support.sensor_node import read_streaming_data
-from icotest.test.support.sth import read_self_test_voltages
+from pytest import mark
+
+from icotest.config import limits, settings
+from icotest.test.support.analysis import Conversion, analyze
+from icotest.test.support.eeprom import check_eeprom_values
+from icotest.test.support.sensor_node import (
+    check_stream_integrity,
+    read_streaming_data,
+)
+from icotest.test.support.spectrum import WelchSpectrum
+from icotest.test.support.sth import (
+    early_stopping,
+    eeprom_acceleration_calibration,
+    read_acceleration_axes,
+    read_self_test_voltages,
+)
 from icotronic.can import Connection, SensorConfiguration
 from icotronic.can.adc import ADCConfiguration
 
-from statistics import mean
-from math import exp2
 import numpy as np
 
+# -- Attributes ---------------------------------------------------------------
+
+TRIPLE_AXIS_ADC_CONFIGURATION = {
+    "prescaler": 2,
+    "acquisition_time": 8,
+    "oversampling_rate": 64,
+    "reference_voltage": 1.8,
+}
+"""ADC configuration of the triple axis accelerometer and backpack test"""
+
 # -- Functions ----------------------------------------------------------------
 
 
@@ -36,13 +53,11 @@ async def test_acceleration_sensor_self_test(sth: STH):
         await read_self_test_voltages(sth)
     )
 
-    sensor = settings.acceleration_sensor()
+    acceleration_limits = limits.acceleration
 
-    voltage_diff_expected = sensor.self_test.voltage.difference
-    voltage_diff_tolerance = sensor.self_test.voltage.tolerance
-
-    voltage_diff_minimum = voltage_diff_expected - voltage_diff_tolerance
-    voltage_diff_maximum = voltage_diff_expected + voltage_diff_tolerance
+    voltage_diff_tolerance = acceleration_limits.self_test_drift
+    voltage_diff_minimum = acceleration_limits.self_test_voltage.minimum
+    voltage_diff_maximum = acceleration_limits.self_test_voltage.maximum
 
     assert voltage_diff_before_after <= voltage_diff_tolerance, (
         "Measured voltage difference between voltage before and after "
@@ -51,7 +66,7 @@ async def test_acceleration_sensor_self_test(sth: STH):
     )
     possible_failure_reason = (
         "\n\nPossible Reason:\n\n• Acceleration sensor config value "
-        f"“{settings.sth.acceleration_sensor.sensor}” is incorrect"
+        f"“{acceleration_limits.sensor}” is incorrect"
     )
 
     assert voltage_diff_minimum <= voltage_diff_abs, (
@@ -71,22 +86,15 @@ async def test_acceleration_single_value(sth: STH):
 
     stream_data = await sth.get_streaming_data_single()
     sensor = settings.acceleration_sensor()
-    acceleration = convert_raw_to_g(
-        stream_data.values[0], sensor.acceleration.maximum
-    )
+    conversion = Conversion.from_maximum(sensor.acceleration.maximum)
+    acceleration = conversion(stream_data.values[0])
 
     logger = getLogger(__file__)
     logger.info("Measured acceleration value: %.2f g", acceleration)
 
     # We expect a stationary acceleration between -g₀ and g₀ (g₀ = 9.807 m/s²)
-    expected_acceleration = 0
-    tolerance_acceleration = sensor.acceleration.tolerance
-    expected_minimum_acceleration = (
-        expected_acceleration - tolerance_acceleration
-    )
-    expected_maximum_acceleration = (
-        expected_acceleration + tolerance_acceleration
-    )
+    expected_minimum_acceleration = limits.acceleration.acceleration.minimum
+    expected_maximum_acceleration = limits.acceleration.acceleration.maximum
 
     assert expected_minimum_acceleration <= acceleration, (
         f"Measured acceleration {acceleration:.3f} g is lower "
@@ -100,27 +108,45 @@ async def test_acceleration_single_value(sth: STH):
     )
 
 
-async def test_acceleration_noise(sth: STH):
+async def test_acceleration_noise(sth: STH, record_property):
     """Test ratio of noise to maximal possible measurement value"""
 
     number_values = 10_000
     # We want `number_values` values which means we need to collect data from
     # `number_values/3` messages, if we use a single channel
     number_streaming_messages = ceil(number_values / 3)
-    measurement_data = await read_streaming_data(
+    # Stop early, if the adaptive acquisition is enabled and the result is
+    # already clear
+    stop = early_stopping([limits.acceleration.noise_ratio])
+    # Calculate the power spectral density while collecting the data
+    spectrum = WelchSpectrum(channels=1)
+    collector = await read_streaming_data(
         sth,
         StreamingConfiguration(first=True),
         length=number_streaming_messages,
+        # The spectral checks require at least one complete segment, even if
+        # the block size of the adaptive acquisition is smaller
+        stop=(
+            None
+            if stop is None
+            else lambda values: spectrum.segments > 0 and stop(values)
+        ),
+        monitors=[spectrum],
     )
+    check_stream_integrity(collector, limits.streaming, record_property)
 
-    values = measurement_data.values()
-    assert number_values <= len(values) <= number_values + 2
+    values = collector.channel("first")
+    if stop is None:
+        assert number_values <= len(values) <= number_values + 2
     acceleration = values[:number_values]
-    assert len(acceleration) == number_values
+    getLogger(__name__).info("Analyzing %d values", len(acceleration))
 
-    ratio_noise_maximum = ratio_noise_max(acceleration)
     sensor = settings.acceleration_sensor()
-    maximum_ratio_allowed = sensor.acceleration.ratio_noise_to_max_value
+    (statistics,) = analyze(
+        acceleration, [Conversion.from_maximum(sensor.acceleration.maximum)]
+    )
+    ratio_noise_maximum = statistics.noise_ratio
+    maximum_ratio_allowed = limits.acceleration.noise_ratio
     getLogger(__name__).info("SNR: %f [dB]", ratio_noise_maximum,)
 
     assert ratio_noise_maximum <= maximum_ratio_allowed, (
@@ -129,13 +155,48 @@ async def test_acceleration_noise(sth: STH):
         f"of {maximum_ratio_allowed} dB"
     )
 
-    mean = convert_raw_to_g((sum(acceleration) / len(acceleration)), 100.0)
-    getLogger(__name__).info("SNR: %s [dB] , mean: %.2f g", ratio_noise_maximum, mean)
+    getLogger(__name__).info(
+        "SNR: %s [dB] , mean: %.2f g", ratio_noise_maximum, statistics.mean
+    )
+
+    sample_rate = collector.sample_rate()
+    getLogger(__name__).info(
+        "Sample rate: %.0f Hz, PSD segments: %d",
+        sample_rate,
+        spectrum.segments,
+    )
+
+    for band in limits.acceleration.bands:
+        (band_noise,) = spectrum.band_noise(
+            sample_rate, band.minimum, band.maximum
+        )
+        getLogger(__name__).info(
+            "Noise %g – %g Hz: %.2f dB", band.minimum, band.maximum, band_noise
+        )
+        assert band_noise <= band.noise_ratio, (
+            "The ratio noise to possible maximum measured value of "
+            f"{band_noise:.2f} dB in the frequency band {band.minimum:g} – "
+            f"{band.maximum:g} Hz is higher than the maximum allowed level of "
+            f"{band.noise_ratio:.2f} dB"
+        )
+
+    spurs = spectrum.spurs(sample_rate, limits.acceleration.spur_threshold)
+    assert not spurs, (
+        "Found narrow peaks in the power spectral density higher than "
+        f"{limits.acceleration.spur_threshold:.2f} dB above the noise floor: "
+        + ", ".join(
+            f"{spur.frequency:.1f} Hz ({spur.level:.2f} dB)" for spur in spurs
+        )
+    )
 
 
 
 
-async def test_acceleration_3a_alt(sth: STH):
+@mark.node_configuration(
+    adc=TRIPLE_AXIS_ADC_CONFIGURATION,
+    sensors=SensorConfiguration(first=2, second=3, third=4),
+)
+async def test_acceleration_3a_alt(sth: STH, record_property):
     """Test the triple axis accelerometer reading"""
 
     # configure all of those using the config file
@@ -147,51 +208,44 @@ async def test_acceleration_3a_alt(sth: STH):
     #test_acc_tollerance = np.array([0.5, 0.5, 0.5])
     test_acc_noise = np.array([50.0, 50.0, 50.0])
 
-
-    await sth.set_adc_configuration(
-        prescaler=2,
-        acquisition_time=8,
-        oversampling_rate=64,
-        reference_voltage=1.8,
-    )
-
-    #set the correct channels
-    await sth.set_sensor_configuration(
-       SensorConfiguration(first=2,second=3,third=4)
-    )
+    record_property("adc configuration", TRIPLE_AXIS_ADC_CONFIGURATION)
 
 
-    acc_bias = []
-    acc_noise = []
     #hown long should the recording sample be
     number_values = 10_000
 
-    # We want `number_values` values which means we need to collect data from
-    # `number_values/3` messages, if we use a single channel
-    number_streaming_messages = ceil(number_values / 3)
-
-    for channel in ("first", "second", "third"):
-        if channel == "first":
-            config = StreamingConfiguration(first=True)
-        else :
-            config = StreamingConfiguration(first=False, **{channel: True})
-        getLogger(__name__).info("🎛️ Config: %s", config)
-        measurement_data = await read_streaming_data(sth, config, length=number_streaming_messages)
-
-        # this block strips the meta data since we seem to be allways getting 3xN array
-        all_values =  measurement_data.first().data + measurement_data.second().data + measurement_data.third().data
-        acceleration = [datapoint.value for datapoint in all_values]
+    # Collect the data of all axes in a single stream, unless the config
+    # requests one single channel stream per axis
+    triple_axis = settings.sth.triple_axis
+    sequential = triple_axis.acquisition == "sequential"
+    stop = None if sequential else early_stopping(list(-test_acc_noise))
+    axes, collectors = await read_acceleration_axes(
+        sth, number_values, sequential, stop
+    )
+    # Store the throughput of the stream(s) for the used ADC configuration
+    for collector in collectors:
+        check_stream_integrity(collector, limits.streaming, record_property)
 
-        acceleration_g =  (mean(acceleration)+400-exp2(15))*1.3733e-3
-        acceleration_noise = ratio_noise_max(acceleration)
+    conversion = Conversion(
+        zero_point=triple_axis.zero_point, sensitivity=triple_axis.sensitivity
+    )
+    statistics = analyze(axes, [conversion] * len(axes))
 
+    for channel, channel_statistics in zip(
+        ("first", "second", "third"), statistics
+    ):
         getLogger(__name__).info(
-            "🫣 Channel “%s” mean: %.2f = %.2f g @ SNR: %.2f dB" , channel, mean(acceleration), acceleration_g, acceleration_noise
+            "🫣 Channel “%s” mean: %.2f g @ SNR: %.2f dB (drift: %.3f g)",
+            channel,
+            channel_statistics.mean,
+            channel_statistics.noise_ratio,
+            channel_statistics.drift,
         )
 
-        #put in into the list for analysis
-        acc_bias.append(acceleration_g)
-        acc_noise.append(acceleration_noise)
+    acc_bias = [channel_statistics.mean for channel_statistics in statistics]
+    acc_noise = [
+        channel_statistics.noise_ratio for channel_statistics in statistics
+    ]
 
 
     #store the results into the json file
@@ -219,20 +273,17 @@ async def test_acceleration_3a_alt(sth: STH):
 
 
 
-async def test_BaP_torr_accelleration(sth: STH):
+# The backpack test used to run directly after the triple axis test and
+# therefore uses the same ADC configuration
+@mark.node_configuration(
+    adc=TRIPLE_AXIS_ADC_CONFIGURATION,
+    sensors=SensorConfiguration(first=7, second=8, third=9),
+)
+async def test_BaP_torr_accelleration(sth: STH, record_property):
     """Test the triple axis accelerometer reading"""
 
-    test_acc_tollerance_g = 2.5
-    test_noise_limit_db = -85
-
-    #set the correct channels to address Backpack
-    await sth.set_sensor_configuration(
-       SensorConfiguration(first=7,second=8,third=9)
-    )
-
-
-    acc_bias = []
-    acc_noise = []
+    backpack = settings.sth.backpack
+    test_acc_tollerance_g = backpack.tolerance
 
     #hown long should the recording sample be
     number_values = 10_000
@@ -243,25 +294,24 @@ async def test_BaP_torr_accelleration(sth: STH):
 
     # setup the stream to collect the samples from all the three channels
     config = StreamingConfiguration(first=True, second=True, third=True)
-    measurement_data = await read_streaming_data(sth, config, length=number_streaming_messages)
-
-    acceleration_x_raw = np.array([datapoint.value for datapoint in measurement_data.first()])
-    acceleration_torr_raw = np.array([datapoint.value for datapoint in measurement_data.second()])
-    acceleration_y_raw = np.array([datapoint.value for datapoint in measurement_data.third()])
-
-    # this block strips the meta data since we seem to be allways getting 3xN array
-    acceleration_x = (acceleration_x_raw / 65535 - 0.5)*200
-    # the combination sensors add up which results in an inherent gain of two
-    acceleration_y = (acceleration_y_raw / 65535 - 0.5) * 100
-    acceleration_torr = (acceleration_torr_raw / 65535 - 0.5)*100
+    stop = early_stopping(backpack.ratio_noise_to_max_value)
+    collector = await read_streaming_data(sth, config, length=number_streaming_messages, stop=stop)
+    check_stream_integrity(collector, limits.streaming, record_property)
+
+    # The first channel measures the x axis, the second one torr and the
+    # third one the y axis
+    statistics_x, statistics_torr, statistics_y = analyze(
+        collector.values,
+        [Conversion.from_maximum(maximum) for maximum in backpack.maximum],
+    )
 
-    acc_bias_x = mean(acceleration_x)
-    acc_bias_y = mean(acceleration_y)
-    acc_bias_torr = mean(acceleration_torr)
+    acc_bias_x = statistics_x.mean
+    acc_bias_y = statistics_y.mean
+    acc_bias_torr = statistics_torr.mean
 
-    acceleration_noise_x = ratio_noise_max(acceleration_x)
-    acceleration_noise_y = ratio_noise_max(acceleration_y)
-    acceleration_noise_torr = ratio_noise_max(acceleration_torr)
+    acceleration_noise_x = statistics_x.noise_ratio
+    acceleration_noise_y = statistics_y.noise_ratio
+    acceleration_noise_torr = statistics_torr.noise_ratio
 
     getLogger(__name__).info(
         "Channel X,Y mean: %.2f g, %.2f g @ SNR: %.2f, %.2f dB" , acc_bias_x, acc_bias_y, acceleration_noise_x, acceleration_noise_y
@@ -279,27 +329,26 @@ async def test_BaP_torr_accelleration(sth: STH):
         f"the measured values are X: {acc_bias_x:.3f} Y: {acc_bias_y:.3f} torr: {acc_bias_torr:.3f} g > {test_acc_tollerance_g:.3f} "
     )
 
-    assert max(acceleration_noise_x,acceleration_noise_y,acceleration_noise_torr) < test_noise_limit_db, (
-        f"Accelerometer noise error! Over the limit of {test_noise_limit_db:.3f} dB "
-        f"the measured values are x: {acceleration_noise_x:.3f} y: {acceleration_noise_y:.3f} torr: {acceleration_noise_torr:.3f} dB"
-    )
+    for name, noise, test_noise_limit_db in zip(
+        ("x", "torr", "y"),
+        (acceleration_noise_x, acceleration_noise_torr, acceleration_noise_y),
+        backpack.ratio_noise_to_max_value,
+    ):
+        assert noise < test_noise_limit_db, (
+            f"Accelerometer noise error! Over the limit of {test_noise_limit_db:.3f} dB "
+            f"the measured values are x: {acceleration_noise_x:.3f} y: {acceleration_noise_y:.3f} torr: {acceleration_noise_torr:.3f} dB "
+            f"(channel {name})"
+        )
 
 
 
 
-async def test_eeprom(sth: STH):
+async def test_eeprom(sth: STH, record_property):
     """Test if reading and writing STH EEPROM data works"""
 
-    sensor = settings.acceleration_sensor()
-    acceleration_max = sensor.acceleration.maximum
-
-    acceleration_slope = acceleration_max / ADC_MAX_VALUE
-    acceleration_offset = -(acceleration_max / 2)
-
-    for axis in ("x", "y", "z"):
-        await check_write_read_eeprom_close(
-            sth, f"{axis} axis acceleration slope", acceleration_slope
-        )
-        await check_write_read_eeprom_close(
-            sth, f"{axis} axis acceleration offset", acceleration_offset
-        )
+    update = await check_eeprom_values(
+        sth,
+        eeprom_acceleration_calibration(),
+        read_before_write=settings.sensor_node.eeprom.read_before_write,
+    )
+    record_property("eeprom", update.metrics())
@@ -3,34 +3,47 @@
 # -- Imports ------------------------------------------------------------------
 
 from icotronic.can import STU
+from pytest import mark
 
 from icotest.config import settings
+from icotest.test.support.eeprom import check_eeprom_values
 from icotest.test.support.node import (
     check_firmware_upload,
     check_connection,
-    check_eeprom_product_data,
-    check_eeprom_statistics,
-    check_eeprom_status,
+    eeprom_product_data,
+    eeprom_statistics,
+    eeprom_status,
 )
 
 # -- Functions ----------------------------------------------------------------
 
 
+@mark.commander
+@mark.usefixtures("idle_debug_adapter")
 async def test_firmware_upload():
     """Upload firmware"""
 
     await check_firmware_upload(settings.stu)
 
 
-async def test_connection(stu: STU):
+@mark.prerequisite("stu")
+async def test_connection(stu: STU, record_property):
     """Test if connection to STU is possible"""
 
-    await check_connection(stu)
+    readiness = await check_connection(stu)
+    record_property("readiness", readiness.metrics())
 
 
-async def test_eeprom(stu: STU):
+async def test_eeprom(stu: STU, record_property):
     "Test if reading and writing of EEPROM values works"
 
-    await check_eeprom_product_data(stu, settings.stu)
-    await check_eeprom_statistics(stu, settings.stu)
-    await check_eeprom_status(stu)
+    update = await check_eeprom_values(
+        stu,
+        {
+            **await eeprom_product_data(stu, settings.stu),
+            **eeprom_statistics(settings.stu),
+            **eeprom_status(),
+        },
+        read_before_write=settings.stu.eeprom.read_before_write,
+    )
+    record_property("eeprom", update.metrics())